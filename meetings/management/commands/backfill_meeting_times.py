@@ -0,0 +1,36 @@
+import logging
+from django.core.management.base import BaseCommand
+from meetings.models import Meeting
+from meetings.utils.schedule import parse_interval
+
+logger = logging.getLogger('log')
+
+
+class Command(BaseCommand):
+    help = 'Fill Meeting.start_at/end_at from the date, start and end strings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        meetings = Meeting.objects.filter(start_at__isnull=True).only('id', 'date', 'start', 'end')
+        updated, failed, batch = 0, 0, []
+        for meeting in meetings.iterator():
+            try:
+                meeting.start_at, meeting.end_at = parse_interval(meeting.date, meeting.start, meeting.end)
+            except ValueError:
+                logger.error('meeting {}: invalid time {} {}-{}'.format(meeting.id, meeting.date, meeting.start,
+                                                                       meeting.end))
+                failed += 1
+                continue
+            batch.append(meeting)
+            if len(batch) >= batch_size:
+                Meeting.objects.bulk_update(batch, ['start_at', 'end_at'])
+                updated += len(batch)
+                batch = []
+        if batch:
+            Meeting.objects.bulk_update(batch, ['start_at', 'end_at'])
+            updated += len(batch)
+        logger.info('backfill meeting times: {} updated, {} failed'.format(updated, failed))
+        self.stdout.write('{} updated, {} failed'.format(updated, failed))
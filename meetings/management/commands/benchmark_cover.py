@@ -0,0 +1,61 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from multiprocessing.dummy import Pool as ThreadPool
+from django.core.management.base import BaseCommand, CommandError
+from meetings.utils.cover_render import COVER_BACKGROUND, FontNotFound, cover_renderer
+from meetings.utils.html_template import cover_content
+
+
+def render_with_wkhtmltoimage(workdir, index, args):
+    """原有方式：写入html后调用wkhtmltoimage截图"""
+    html_path = os.path.join(workdir, '{}.html'.format(index))
+    with open(html_path, 'w') as f:
+        f.write(cover_content(*args))
+    subprocess.run(['wkhtmltoimage', '--enable-local-file-access', '--quiet', html_path,
+                    os.path.join(workdir, '{}.png'.format(index))], check=True)
+
+
+def render_in_process(workdir, index, args):
+    cover_renderer.save(os.path.join(workdir, '{}.png'.format(index)), *args)
+
+
+class Command(BaseCommand):
+    help = 'Compare covers per second of the in-process renderer and wkhtmltoimage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=50, help='number of covers to render')
+        parser.add_argument('--workers', type=int, default=1, help='threads rendering covers')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        covers = [('openGauss SIG例会 {}'.format(index), 'Infra', '2021-01-01', '10:00', '11:00')
+                  for index in range(count)]
+        renderers = [('pillow', render_in_process)]
+        if shutil.which('wkhtmltoimage'):
+            renderers.append(('wkhtmltoimage', render_with_wkhtmltoimage))
+        else:
+            self.stdout.write('wkhtmltoimage not found, skipped')
+        # 预先加载背景图及字体，不计入耗时
+        try:
+            cover_renderer.load()
+        except FontNotFound as e:
+            raise CommandError(e)
+        for name, render in renderers:
+            workdir = tempfile.mkdtemp()
+            try:
+                shutil.copy(COVER_BACKGROUND, workdir)
+                pool = ThreadPool(options['workers'])
+                t0 = time.perf_counter()
+                try:
+                    pool.map(lambda x: render(workdir, x[0], x[1]), enumerate(covers))
+                finally:
+                    pool.close()
+                    pool.join()
+                elapsed = time.perf_counter() - t0
+            finally:
+                shutil.rmtree(workdir)
+            self.stdout.write('{}: {} covers in {:.3f}s, {:.1f} covers/s'.format(
+                name, count, elapsed, count / elapsed))
@@ -0,0 +1,48 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from meetings.send_email import build_message
+from meetings.utils.mail_render import render_calendar, render_invite
+
+logger = logging.getLogger('log')
+
+
+class Command(BaseCommand):
+    help = 'Render meeting invites and report the per-message cost of the body, the ICS part and the full message'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000, help='number of invites to render')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        meetings = [{
+            'mid': str(800000000 + index),
+            'topic': 'benchmark meeting {}'.format(index),
+            'date': '2021-01-01',
+            'start': '{:02d}:00'.format(8 + index % 12),
+            'end': '{:02d}:30'.format(8 + index % 12),
+            'join_url': 'https://zoom.us/j/{}'.format(800000000 + index),
+            'sig_name': 'Infra',
+            'toaddrs': 'a@example.com,b@example.com',
+            'platform': 'zoom',
+            'etherpad': 'https://etherpad.opengauss.org/p/benchmark',
+            'summary': 'summary <{}>'.format(index) if index % 2 else '',
+            'sequence': index % 3
+        } for index in range(count)]
+        stages = [
+            ('body', lambda m: render_invite(m, 'cloud' if int(m['mid']) % 3 == 0 else None).as_string()),
+            ('calendar', lambda m: render_calendar(m, 'REQUEST', m['toaddrs'], m['topic']).as_string()),
+            ('message', lambda m: build_message(m, 'cloud')[2].as_string()),
+        ]
+        # build_message会输出收件人日志，计时期间屏蔽
+        logger.disabled = True
+        try:
+            for name, render in stages:
+                t0 = time.perf_counter()
+                for meeting in meetings:
+                    render(meeting)
+                elapsed = time.perf_counter() - t0
+                self.stdout.write('{}: {} renders in {:.3f}s, {:.1f}us per message'.format(
+                    name, count, elapsed, elapsed / count * 1000000))
+        finally:
+            logger.disabled = False
@@ -0,0 +1,127 @@
+import datetime
+import logging
+import random
+import time
+from django.core.management.base import BaseCommand
+from meetings.models import Meeting, Video, Record, User, Group
+from meetings.utils.schedule import MAX_DURATION, get_search_window, parse_interval
+
+logger = logging.getLogger('log')
+
+BENCH_PREFIX = 'bench'
+BENCH_SIGS = ['bench-sig-{}'.format(x) for x in range(50)]
+BENCH_HOSTS = ['bench-host-{}@example.com'.format(x) for x in range(10)]
+
+
+class Command(BaseCommand):
+    help = 'Seed benchmark meetings and report EXPLAIN plans and p50/p99 timings of the hot queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000, help='number of meetings to seed')
+        parser.add_argument('--repeat', type=int, default=200, help='executions per query')
+        parser.add_argument('--cleanup', action='store_true', help='remove seeded rows and exit')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            Record.objects.filter(mid__startswith=BENCH_PREFIX).delete()
+            Video.objects.filter(mid__startswith=BENCH_PREFIX).delete()
+            Meeting.objects.filter(mid__startswith=BENCH_PREFIX).delete()
+            User.objects.filter(gid=0, gitee_id=BENCH_PREFIX).delete()
+            Group.objects.filter(name=BENCH_PREFIX).delete()
+            self.stdout.write('benchmark data removed')
+            return
+        self.seed(options['count'])
+        for name, make_queryset in self.queries(options['count']):
+            self.stdout.write('== {}'.format(name))
+            self.stdout.write(make_queryset().explain())
+            timings = []
+            for _ in range(options['repeat']):
+                queryset = make_queryset()
+                t0 = time.perf_counter()
+                list(queryset)
+                timings.append((time.perf_counter() - t0) * 1000)
+            timings.sort()
+            p50 = timings[int(len(timings) * 0.5)]
+            p99 = timings[min(int(len(timings) * 0.99), len(timings) - 1)]
+            self.stdout.write('p50: {:.3f}ms, p99: {:.3f}ms'.format(p50, p99))
+            logger.info('benchmark {}: p50 {:.3f}ms, p99 {:.3f}ms'.format(name, p50, p99))
+
+    def seed(self, count):
+        existing = Meeting.objects.filter(mid__startswith=BENCH_PREFIX).count()
+        if existing >= count:
+            return
+        user, _ = User.objects.get_or_create(gid=0, gitee_id=BENCH_PREFIX,
+                                             defaults={'name': BENCH_PREFIX, 'avatar': '', 'email': ''})
+        group, _ = Group.objects.get_or_create(name=BENCH_PREFIX, defaults={'members': '[]'})
+        today = datetime.date.today()
+        meetings, videos, records = [], [], []
+        for index in range(existing, count):
+            mid = '{}{}'.format(BENCH_PREFIX, index)
+            hour = random.randint(8, 20)
+            minute = random.choice(['00', '30'])
+            date = (today + datetime.timedelta(days=random.randint(-365, 14))).strftime('%Y-%m-%d')
+            start = '{:02d}:{}'.format(hour, minute)
+            end = '{:02d}:{}'.format(hour + 1, minute)
+            start_at, end_at = parse_interval(date, start, end)
+            meetings.append(Meeting(
+                topic='benchmark {}'.format(index),
+                group_name=random.choice(BENCH_SIGS),
+                sponsor=BENCH_PREFIX,
+                date=date,
+                start=start,
+                end=end,
+                start_at=start_at,
+                end_at=end_at,
+                host_id=random.choice(BENCH_HOSTS),
+                mid=mid,
+                is_delete=1 if index % 10 == 0 else 0,
+                user=user,
+                group=group))
+            if index % 5 == 0:
+                videos.append(Video(mid=mid, topic='benchmark', group_name=BENCH_SIGS[0]))
+                records.append(Record(mid=mid, platform='obs', url=''))
+                records.append(Record(mid=mid, platform='bilibili', url=''))
+            if len(meetings) >= 5000:
+                self.flush(meetings, videos, records)
+        self.flush(meetings, videos, records)
+        self.stdout.write('seeded {} meetings'.format(count - existing))
+
+    @staticmethod
+    def flush(meetings, videos, records):
+        Meeting.objects.bulk_create(meetings)
+        Video.objects.bulk_create(videos)
+        Record.objects.bulk_create(records)
+        del meetings[:], videos[:], records[:]
+
+    @staticmethod
+    def queries(count):
+        def conflict_check(host_id=None):
+            start_at = datetime.datetime.combine(
+                datetime.date.today() + datetime.timedelta(days=random.randint(-30, 14)), datetime.time(10))
+            search_start, search_end = get_search_window(start_at, start_at + datetime.timedelta(hours=1))
+            meetings = Meeting.objects.filter(is_delete=0, start_at__gt=search_start - MAX_DURATION,
+                                              start_at__lt=search_end, end_at__gt=search_start)
+            if host_id:
+                meetings = meetings.filter(host_id=host_id)
+            return meetings.values('host_id')
+
+        def random_mid():
+            return '{}{}'.format(BENCH_PREFIX, random.randint(0, count - 1))
+
+        def window():
+            now = datetime.datetime.now()
+            return (now - datetime.timedelta(days=30)).strftime('%Y-%m-%d'), \
+                (now + datetime.timedelta(days=14)).strftime('%Y-%m-%d')
+
+        return [
+            ('create conflict check', lambda: conflict_check()),
+            ('update conflict check', lambda: conflict_check(random.choice(BENCH_HOSTS))),
+            ('calendar window', lambda: Meeting.objects.filter(
+                is_delete=0, date__gte=window()[0], date__lte=window()[1])),
+            ('calendar window by sig', lambda: Meeting.objects.filter(
+                is_delete=0, group_name=random.choice(BENCH_SIGS), date__gte=window()[0],
+                date__lte=window()[1])),
+            ('meeting by mid', lambda: Meeting.objects.filter(mid=random_mid(), is_delete=0)),
+            ('video by mid', lambda: Video.objects.filter(mid=random_mid())),
+            ('record by mid and platform', lambda: Record.objects.filter(mid=random_mid(), platform='bilibili')),
+        ]
@@ -5,6 +5,7 @@ from bilibili_api.user import get_videos_g
 from django.conf import settings
 from django.core.management.base import BaseCommand
 from meetings.models import Record
+from meetings.utils.calendar_builder import invalidate_calendar
 from obs import ObsClient
 
 logger = logging.getLogger('log')
@@ -50,5 +51,6 @@ class Command(BaseCommand):
                 else:
                     bili_url = 'https://www.bilibili.com/{}'.format(metadata_dict['bvid'])
                     Record.objects.filter(mid=mid, platform='bilibili').update(url=bili_url)
+                    invalidate_calendar()
                     logger.info('meeting {}: B站已过审，刷新播放地址'.format(mid))
 
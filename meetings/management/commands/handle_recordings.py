@@ -1,533 +1,690 @@
 import datetime
+import json
 import logging
 import os
-import requests
-import stat
+import shutil
 import tempfile
-import wget
+import threading
+from collections import namedtuple
+from django.db import transaction
 from django.db.models import Q
 from django.conf import settings
 from obs import ObsClient
-from django.core.management.base import BaseCommand
-from meetings.models import Meeting, Video, Record
-from multiprocessing.dummy import Pool as ThreadPool
-from meetings.utils.html_template import cover_content
-from meetings.utils.welink_apis import getParticipants, listRecordings, downloadHWCloudRecording, getDetailDownloadUrl
-from meetings.utils.zoom_apis import getOauthToken
+from django.core.management.base import BaseCommand, CommandError
+from meetings.models import Meeting, Video, Record, RecordingJob
+from meetings.utils import downloader, http_client, participants, recording_jobs
+from meetings.utils.calendar_builder import invalidate_calendar
+from meetings.utils.cover_render import FontNotFound, cover_renderer
+from meetings.utils.obs_index import ObsObjectIndex
+from meetings.utils.obs_stream import stream_upload
+from meetings.utils.pipeline import Pipeline, Stage
+from meetings.utils.schedule import parse_interval
+from meetings.utils.welink_apis import listRecordings as listWelinkRecordings, downloadHWCloudRecording, \
+    getDetailDownloadUrl
+from meetings.utils.zoom_apis import listRecordings as listZoomRecordings
 
 logger = logging.getLogger('log')
 
+# 小于该大小的录像视为无效录像
+MIN_RECORDING_SIZE = 1024 * 1024 * 10
+# 查询最近几天的录像
+RECORDING_DAYS = 7
+
+# WeLink的一段录像，start/end为北京时间
+WelinkSegment = namedtuple('WelinkSegment', ['conf_id', 'conf_uuid', 'start', 'end'])
+
 
 class Command(BaseCommand):
+    help = 'Download recent meeting recordings, upload them to OBS with covers and update the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--discover-workers', type=int, default=4, help='threads querying recordings')
+        parser.add_argument('--download-workers', type=int, default=2, help='concurrent downloads')
+        parser.add_argument('--cover-workers', type=int, default=2, help='concurrent cover renderings')
+        parser.add_argument('--upload-workers', type=int, default=2, help='concurrent OBS uploads')
+        parser.add_argument('--update-workers', type=int, default=1, help='threads updating the database')
+        parser.add_argument('--transfer-mode', choices=['stream', 'staged'], default=settings.RECORDING_TRANSFER_MODE,
+                            help='stream Zoom recordings into OBS multipart uploads, or stage them on local disk')
+
     def handle(self, *args, **options):
+        # 缺少字体时所有封面都会失败，在处理录像之前退出
+        try:
+            cover_renderer.load()
+        except FontNotFound as e:
+            raise CommandError(e)
         meeting_ids = Video.objects.all().values_list('mid', flat=True)
         past_meetings = Meeting.objects.filter(is_delete=0).filter(
-            Q(date__gt=str(datetime.datetime.now() - datetime.timedelta(days=7))) &
+            Q(date__gt=str(datetime.datetime.now() - datetime.timedelta(days=RECORDING_DAYS))) &
             Q(date__lte=datetime.datetime.now().strftime('%Y-%m-%d')))
         recent_mids = [x for x in meeting_ids if x in list(past_meetings.values_list('mid', flat=True))]
         logger.info('meeting_ids: {}'.format(list(meeting_ids)))
         logger.info('mids of past_meetings: {}'.format(list(past_meetings.values_list('mid', flat=True))))
         logger.info('recent_mids: {}'.format(recent_mids))
-        pool = ThreadPool()
-        pool.map(run, recent_mids)
-        pool.close()
-        pool.join()
+        # 跳过录像已全部发布的会议，之前中断的任务不受7天的时间范围限制
+        finished_mids = recording_jobs.finished_mids(recent_mids)
+        pending_mids = [x for x in recent_mids if x not in finished_mids]
+        pending_mids += sorted(recording_jobs.unfinished_mids() - set(pending_mids))
+        logger.info('pending_mids: {}'.format(pending_mids))
+        ctx = RecordingContext.create(options['transfer_mode'])
+        if not ctx:
+            return
+        pipeline = Pipeline([
+            Stage('discover', lambda mid: discover(ctx, mid), options['discover_workers']),
+            Stage('download', tracked(lambda recording: download(ctx, recording)), options['download_workers']),
+            Stage('cover', tracked(generate_cover), options['cover_workers']),
+            Stage('upload', tracked(lambda recording: upload(ctx, recording)), options['upload_workers']),
+            Stage('update', tracked(update_database, final=True), options['update_workers']),
+        ])
+        for stats in pipeline.run(pending_mids):
+            logger.info('{stage}: {workers} workers, {processed} processed, {errors} errors, avg {avg:.3f}s, '
+                        'max {max:.3f}s, {throughput:.3f}/s'.format(**stats))
+        for endpoint, metric in sorted(http_client.get_metrics().items()):
+            logger.info('{}: {} calls, {} errors, avg {:.3f}s, max {:.3f}s'.format(
+                endpoint, metric['count'], metric['errors'], metric['avg'], metric['max']))
         logger.info('All done')
 
 
-def get_recordings(mid):
+class RecordingContext(object):
+    """一次运行中各阶段共享的OBS客户端及配置"""
+
+    def __init__(self, obs_client, bucketName, endpoint, transfer_mode='staged'):
+        self.obs_client = obs_client
+        self.bucketName = bucketName
+        self.endpoint = endpoint
+        self.transfer_mode = transfer_mode
+        self.object_index = ObsObjectIndex(obs_client, bucketName)
+        self.zoom_recordings = ZoomRecordingIndex()
+        self.welink_recordings = WelinkRecordingIndex()
+
+    @classmethod
+    def create(cls, transfer_mode='staged'):
+        access_key_id = settings.DEFAULT_CONF.get('ACCESS_KEY_ID', '')
+        secret_access_key = settings.DEFAULT_CONF.get('SECRET_ACCESS_KEY', '')
+        endpoint = settings.DEFAULT_CONF.get('OBS_ENDPOINT', '')
+        bucketName = settings.DEFAULT_CONF.get('OBS_BUCKETNAME', '')
+        if not (access_key_id and secret_access_key and endpoint and bucketName):
+            logger.error('losing required arguments for ObsClient')
+            return
+        obs_client = ObsClient(access_key_id=access_key_id,
+                               secret_access_key=secret_access_key,
+                               server='https://%s' % endpoint)
+        return cls(obs_client, bucketName, endpoint, transfer_mode)
+
+    def get_object_size(self, object_key):
+        """
+        查询OBS中对象的大小
+        :return: 对象的大小，对象不存在时返回None
+        """
+        return self.object_index.get_size(object_key)
+
+    def get_download_url(self, object_key):
+        return 'https://{}.{}/{}?response-content-disposition=attachment'.format(self.bucketName, self.endpoint,
+                                                                                 object_key)
+
+
+class ZoomRecordingIndex(object):
+    """每个host的Zoom录像在一次运行中只查询一次：host_id -> {mid: [录像]}"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.host_locks = {}
+        self.hosts = {}
+
+    def get(self, host_id):
+        """
+        :return: {mid: [录像]}，查询失败时返回空字典
+        """
+        with self.lock:
+            host_lock = self.host_locks.setdefault(host_id, threading.Lock())
+        with host_lock:
+            if host_id not in self.hosts:
+                start_date = (datetime.datetime.now() - datetime.timedelta(days=RECORDING_DAYS)).strftime("%Y-%m-%d")
+                status, meetings = listZoomRecordings(host_id, start_date)
+                recordings = {}
+                if status == 200:
+                    for meeting in meetings:
+                        recordings.setdefault(str(meeting['id']), []).append(meeting)
+                    logger.info('host {}: {} recordings of {} meetings'.format(host_id, len(meetings),
+                                                                               len(recordings)))
+                self.hosts[host_id] = recordings
+            return self.hosts[host_id]
+
+
+class WelinkRecordingIndex(object):
+    """每个host的WeLink录像在一次运行中只查询一次：host_id -> {confID: [WelinkSegment]}，各会议的录像按开始时间排序"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.host_locks = {}
+        self.hosts = {}
+
+    def get(self, host_id):
+        """
+        :return: {confID: [WelinkSegment]}，查询失败时返回空字典
+        """
+        with self.lock:
+            host_lock = self.host_locks.setdefault(host_id, threading.Lock())
+        with host_lock:
+            if host_id not in self.hosts:
+                status, recordings = listWelinkRecordings(host_id, RECORDING_DAYS)
+                segments = {}
+                if status != 200:
+                    logger.error('Fail to get welink recordings of {}'.format(host_id))
+                else:
+                    for recording in recordings['data']:
+                        start = datetime.datetime.strptime(recording['startTime'], '%Y-%m-%d %H:%M') + \
+                            datetime.timedelta(hours=8)
+                        end = start + datetime.timedelta(seconds=recording['rcdTime'])
+                        segments.setdefault(recording['confID'], []).append(
+                            WelinkSegment(recording['confID'], recording['confUUID'], start, end))
+                    for conf_segments in segments.values():
+                        conf_segments.sort(key=lambda x: x.start)
+                    logger.info('host {}: {} welink recordings of {} meetings'.format(
+                        host_id, len(recordings['data']), len(segments)))
+                self.hosts[host_id] = segments
+            return self.hosts[host_id]
+
+    def segments(self, host_id, mid, start_at, end_at):
+        """
+        :return: 与会议时段有重叠的录像，按开始时间排序
+        """
+        # 与原先按分钟比较的结果保持一致
+        return [x for x in self.get(host_id).get(mid, [])
+                if x.end.replace(second=0) >= start_at and x.start <= end_at]
+
+
+class Recording(object):
+    """一个待处理的录像文件，在流水线的各阶段之间传递"""
+
+    def __init__(self, mid, platform, target_name, group_name, month):
+        self.mid = mid
+        self.platform = platform
+        self.target_name = target_name
+        self.group_name = group_name
+        self.object_key = 'opengauss/{}/{}/{}/{}'.format(group_name, month, mid, target_name)
+        # 每个录像文件使用单独的临时目录，并行处理时互不干扰
+        self.workdir = os.path.join(tempfile.gettempdir(), 'recordings', os.path.splitext(target_name)[0])
+        self.filename = os.path.join(self.workdir, target_name)
+        self.cover_file = self.filename.replace('.mp4', '.png')
+        # WeLink多段录像的序号及会议各段录像的confUUID
+        self.order = None
+        self.conf_uuids = None
+        self.topic = None
+        self.agenda = None
+        self.community = None
+        # metadata中的录像起止时间
+        self.record_start = None
+        self.record_end = None
+        # Video表中的录像起止时间
+        self.video_start = None
+        self.video_end = None
+        # 封面上的日期及起止时间
+        self.cover_date = None
+        self.cover_start = None
+        self.cover_end = None
+        self.total_size = None
+        self.source_url = None
+        self.token = None
+        self.download_url = None
+        self.attenders = None
+        # 视频及封面是否已上传至OBS，流式传输时视频在下载阶段已上传
+        self.uploaded = False
+        self.cover_uploaded = False
+        self.job_id = None
+        # 同一会议的各段录像共享的MeetingContext
+        self.meeting = None
+
+    def __str__(self):
+        return self.target_name
+
+    def to_payload(self):
+        return {k: v for k, v in vars(self).items() if k not in ('uploaded', 'cover_uploaded', 'job_id', 'meeting')}
+
+    @classmethod
+    def from_job(cls, job):
+        """从录像任务中保存的信息恢复"""
+        recording = cls.__new__(cls)
+        recording.__dict__.update(json.loads(job.payload))
+        recording.uploaded = job.status >= recording_jobs.UPLOADED
+        recording.cover_uploaded = job.status >= recording_jobs.COVER_DONE
+        recording.job_id = job.id
+        return recording
+
+
+class MeetingContext(object):
     """
-    查询一个host下昨日至今日(默认)的所有录像
-    :param mid: 会议ID
-    :return: the json-encoded content of a response or none
+    一个会议的各段录像共享的信息，各段录像在流水线中并行处理
+    参会人只查询一次，所有录像处理结束后合并更新一次数据库
+    同一录像任务只保留一个，remaining与实际处理的录像数一致
     """
-    host_id = Meeting.objects.get(mid=mid).host_id
-    url = 'https://api.zoom.us/v2/users/{}/recordings'.format(host_id)
-    token = getOauthToken()
-    headers = {
-        'authorization': 'Bearer {}'.format(token)
-    }
-    params = {
-        'from': (datetime.datetime.now() - datetime.timedelta(days=7)).strftime("%Y-%m-%d"),
-        'page_size': 50
+
+    def __init__(self, mid, platform, recordings):
+        self.recordings = []
+        job_ids = set()
+        for recording in recordings:
+            if recording.job_id in job_ids:
+                logger.error('meeting {}: {}重复，已忽略'.format(mid, recording.target_name))
+                continue
+            job_ids.add(recording.job_id)
+            self.recordings.append(recording)
+        recordings = self.recordings
+        self.mid = mid
+        self.platform = platform
+        self.lock = threading.Lock()
+        self.conf_uuids = next((x.conf_uuids for x in recordings if x.conf_uuids), None)
+        self.attenders = next((x.attenders for x in recordings if x.attenders is not None), None)
+        self.remaining = len(recordings)
+        self.finished = []
+        # 已结束的录像任务，每段录像只结束一次
+        self.done = set()
+        for recording in recordings:
+            recording.meeting = self
+
+    def get_attenders(self):
+        with self.lock:
+            if self.attenders is None:
+                status, res = participants.get_participants(self.mid, conf_uuids=self.conf_uuids)
+                if status == 200:
+                    self.attenders = res['participants']
+                else:
+                    logger.error('meeting {}: get participants {} {}'.format(self.mid, status, res))
+            return self.attenders
+
+    def is_done(self, recording):
+        with self.lock:
+            return recording.job_id in self.done
+
+    def finish(self, recording, ok):
+        """
+        一段录像处理结束，重复调用时忽略
+        :param ok: 是否处理成功
+        :return: 会议的所有录像都已结束时返回处理成功的录像列表，否则返回None
+        """
+        with self.lock:
+            if recording.job_id in self.done:
+                logger.error('meeting {}: {}已结束'.format(self.mid, recording.target_name))
+                return
+            self.done.add(recording.job_id)
+            if ok:
+                self.finished.append(recording)
+            self.remaining -= 1
+            if self.remaining == 0:
+                return sorted(self.finished, key=lambda x: x.order or 0)
+
+
+def tracked(func, final=False):
+    """
+    阶段出现异常或处理失败时记录到录像任务
+    :param final: 是否为最后一个阶段，最后一个阶段不向后传递任务
+    """
+    def wrapper(recording):
+        try:
+            results = func(recording)
+        except Exception as e:
+            recording_jobs.fail(recording.job_id, repr(e))
+            # 最后一个阶段可能在结束录像、更新数据库后才出错
+            if not recording.meeting.is_done(recording):
+                finish(recording, False)
+            raise
+        if not results and not final:
+            finish(recording, False)
+        return results
+    return wrapper
+
+
+def finish(recording, ok):
+    finished = recording.meeting.finish(recording, ok)
+    if finished is not None:
+        update_meeting(recording.mid, finished)
+
+
+def set_status(recording, status):
+    recording_jobs.update(recording.job_id, status, recording.to_payload())
+
+
+def fail(recording, message):
+    logger.error('meeting {}: {}'.format(recording.mid, message))
+    recording_jobs.fail(recording.job_id, message)
+
+
+def discover(ctx, mid):
+    """
+    查询会议的录像，视频已上传的任务从保存的状态继续
+    :return: 需要处理的Recording列表
+    """
+    logger.info('meeting {}: 开始处理'.format(mid))
+    jobs = {job.object_key: job for job in RecordingJob.objects.filter(mid=mid)}
+    recordings = []
+    # 视频均已上传时无需重新查询会议平台
+    if not jobs or any(job.status < recording_jobs.UPLOADED for job in jobs.values()):
+        platform = Meeting.objects.get(mid=mid).mplatform
+        if platform == 'zoom':
+            recordings = discover_zoom_recordings(ctx, mid) or []
+        elif platform == 'welink':
+            recordings = discover_welink_recordings(ctx, mid) or []
+    pending = []
+    for recording in recordings:
+        job = jobs.get(recording.object_key)
+        if job and job.status >= recording_jobs.UPLOADED:
+            continue
+        if recording.uploaded and not job:
+            # OBS中已有完整的对象且不是由录像任务上传的，与之前一样不再处理，记为已发布避免重复查询
+            logger.info('meeting {}: {}已存在，跳过'.format(mid, recording.target_name))
+            jobs[recording.object_key] = recording_jobs.track(mid, recording.platform, recording.object_key,
+                                                              recording.to_payload(), recording_jobs.PUBLISHED)
+            continue
+        status = recording_jobs.UPLOADED if recording.uploaded else recording_jobs.DISCOVERED
+        job = recording_jobs.track(mid, recording.platform, recording.object_key, recording.to_payload(), status)
+        if recording.uploaded and job.status < recording_jobs.UPLOADED:
+            recording_jobs.update(job.id, recording_jobs.UPLOADED)
+            job.status = recording_jobs.UPLOADED
+        jobs[job.object_key] = job
+        recording.job_id = job.id
+        pending.append((job, recording))
+    # 本次查询到的录像已在pending中，只恢复之前运行中视频已上传的任务
+    queued = {job.object_key for job, _ in pending}
+    discovered = [recording.object_key for recording in recordings]
+    for job in jobs.values():
+        if job.object_key in queued:
+            continue
+        if recording_jobs.UPLOADED <= job.status < recording_jobs.PUBLISHED:
+            pending.append((job, Recording.from_job(job)))
+        elif job.status < recording_jobs.UPLOADED and job.object_key not in discovered and \
+                not recording_jobs.is_exhausted(job):
+            # 未找到的录像同样计入处理次数，避免每次运行都重新查询
+            recording_jobs.start(job)
+            recording_jobs.fail(job.id, '会议平台中未找到该录像')
+    results = []
+    for job, recording in pending:
+        if recording_jobs.is_exhausted(job):
+            logger.error('meeting {}: {}已处理{}次，不再重试'.format(mid, recording.target_name, job.attempts))
+            continue
+        results.append(recording)
+    if not results:
+        return results
+    results = MeetingContext(mid, results[0].platform, results).recordings
+    for recording in results:
+        recording_jobs.start(jobs[recording.object_key])
+    return results
+
+
+def download(ctx, recording):
+    """下载录像并校验大小"""
+    if recording.uploaded:
+        return [recording]
+    recording_jobs.update(recording.job_id, recording_jobs.DOWNLOADING)
+    os.makedirs(recording.workdir, exist_ok=True)
+    if recording.platform == 'zoom' and ctx.transfer_mode == 'stream':
+        checkpoint_file = os.path.join(recording.workdir, 'stream.checkpoint')
+        if stream_recording(ctx, recording, checkpoint_file):
+            return [recording]
+        if os.path.exists(checkpoint_file):
+            fail(recording, '流式传输中断，下次运行时从断点继续')
+            return
+        logger.info('meeting {}: 流式传输失败，改为下载至本地后上传'.format(recording.mid))
+    if recording.platform == 'zoom':
+        download_recordings(recording.source_url, recording.filename, recording.total_size)
+    else:
+        downloadHWCloudRecording(recording.token, recording.filename, recording.source_url)
+    if not os.path.exists(recording.filename):
+        fail(recording, '下载{}失败'.format(recording.target_name))
+        return
+    download_file_size = os.path.getsize(recording.filename)
+    logger.info('meeting {}: 下载的文件大小为{}'.format(recording.mid, download_file_size))
+    if recording.platform == 'zoom':
+        # 若下载录像的大小和total_size不相等，则删除刚下载的文件
+        if download_file_size != recording.total_size:
+            fail(recording, '下载的文件大小与录像大小{}不一致'.format(recording.total_size))
+            shutil.rmtree(recording.workdir)
+            return
+    else:
+        # WeLink只有下载后才知道录像的大小
+        recording.total_size = download_file_size
+        object_size = ctx.get_object_size(recording.object_key)
+        if object_size is not None and object_size >= download_file_size:
+            logger.info('meeting {}: OBS存储服务中已存在该对象且无需替换'.format(recording.mid))
+            recording.uploaded = True
+            set_status(recording, recording_jobs.UPLOADED)
+    return [recording]
+
+
+def stream_recording(ctx, recording, checkpoint_file):
+    """
+    将Zoom录像边下载边分段上传至OBS
+    :param checkpoint_file: 分段上传的断点文件
+    :return: 上传成功返回True
+    """
+    mid = recording.mid
+    try:
+        recording.attenders = recording.meeting.get_attenders()
+        r = http_client.get(recording.source_url, allow_redirects=False)
+        url = r.headers['location']
+        recording.uploaded = stream_upload(ctx.obs_client, ctx.bucketName, recording.object_key, url,
+                                           recording.total_size, checkpoint_file, metadata=get_metadata(recording))
+    except Exception as e:
+        logger.error('meeting {}: 流式传输出错 {}'.format(mid, e))
+        return False
+    if recording.uploaded:
+        logger.info('meeting {}: OBS视频上传成功'.format(mid))
+        ctx.object_index.add(recording.object_key, recording.total_size)
+        set_status(recording, recording_jobs.UPLOADED)
+    return recording.uploaded
+
+
+def get_metadata(recording):
+    return {
+        "meeting_id": recording.mid,
+        "meeting_topic": recording.topic,
+        "community": recording.community,
+        "sig": recording.group_name,
+        "agenda": recording.agenda,
+        "record_start": recording.record_start,
+        "record_end": recording.record_end,
+        "download_url": recording.download_url,
+        "total_size": recording.total_size,
+        "attenders": recording.attenders
     }
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code != 200:
-        logger.error('get recordings: {} {}'.format(response.status_code, response.json()['message']))
+
+
+def upload(ctx, recording):
+    """上传录像及封面至OBS"""
+    mid = recording.mid
+    if recording.attenders is None:
+        recording.attenders = recording.meeting.get_attenders()
+    if not recording.uploaded:
+        # 断点续传上传文件
+        res = ctx.obs_client.uploadFile(bucketName=ctx.bucketName, objectKey=recording.object_key,
+                                        uploadFile=recording.filename, taskNum=10, enableCheckpoint=True,
+                                        metadata=get_metadata(recording))
+        if res['status'] != 200:
+            fail(recording, 'fail to upload file! {}'.format(res['status']))
+            return
+        recording.uploaded = True
+        ctx.object_index.add(recording.object_key, recording.total_size)
+        set_status(recording, recording_jobs.UPLOADED)
+        logger.info('meeting {}: OBS视频上传成功'.format(mid))
+    if recording.cover_uploaded:
+        return [recording]
+    # 上传封面
+    res2 = upload_cover(recording.cover_file, ctx.obs_client, ctx.bucketName,
+                        recording.object_key.replace('.mp4', '.png'))
+    if res2['status'] != 200:
+        fail(recording, 'fail to upload cover! {}'.format(res2['status']))
         return
-    mids = [x['id'] for x in response.json()['meetings']]
-    if mids.count(int(mid)) == 0:
-        logger.info('meeting {}: no recordings yet'.format(mid))
+    recording.cover_uploaded = True
+    set_status(recording, recording_jobs.COVER_DONE)
+    logger.info('meeting {}: OBS封面上传成功'.format(mid))
+    return [recording]
+
+
+def update_database(recording):
+    """一段录像处理完成，会议的所有录像都结束后更新数据库"""
+    finish(recording, True)
+
+
+def update_meeting(mid, recordings):
+    """
+    合并更新会议的Video、Record及录像任务，并移除临时文件
+    :param recordings: 处理成功的录像
+    """
+    if not recordings:
+        logger.info('meeting {}: 没有处理成功的录像'.format(mid))
         return
-    if mids.count(int(mid)) == 1:
-        record = list(filter(lambda x: x if x['id'] == int(mid) else None, response.json()['meetings']))[0]
-        return record
-    if mids.count(int(mid)) > 1:
-        records = list(filter(lambda x: x if x['id'] == int(mid) else None, response.json()['meetings']))
-        max_size = max([x['total_size'] for x in records])
-        record = list(filter(lambda x: x if x['total_size'] == max_size else None, response.json()['meetings']))[0]
-        return record
+    # WeLink多段录像只记录第一段
+    first = next((x for x in recordings if x.order in (None, 1)), None)
+    with transaction.atomic():
+        if first:
+            Video.objects.filter(mid=mid).update(start=first.video_start,
+                                                 end=first.video_end,
+                                                 total_size=first.total_size,
+                                                 attenders=first.attenders,
+                                                 download_url=first.download_url)
+            url = first.download_url.split('?')[0]
+            if Record.objects.filter(mid=mid, platform='obs'):
+                Record.objects.filter(mid=mid, platform='obs').update(url=url, thumbnail=url.replace('.mp4', '.png'))
+            else:
+                Record.objects.create(mid=mid, platform='obs', url=url, thumbnail=url.replace('.mp4', '.png'))
+        recording_jobs.publish([x.job_id for x in recordings])
+    if first:
+        invalidate_calendar()
+        logger.info('meeting {}: 更新数据库'.format(mid))
+    # 删除临时文件
+    for recording in recordings:
+        if os.path.isdir(recording.workdir):
+            shutil.rmtree(recording.workdir)
+        logger.info('meeting {}: 移除临时目录{}'.format(mid, recording.workdir))
 
 
-def get_participants(mid):
+def get_recordings(ctx, mid):
     """
-    查询一个会议的所有参会者
+    从会议所属host的录像索引中查询会议的录像
     :param mid: 会议ID
-    :return: the json-encoded content of a response or none
+    :return: 会议的录像，有多条时返回总大小最大的一条，没有录像时返回None
     """
-    url = 'https://api.zoom.us/v2/past_meetings/{}/participants'.format(mid)
-    token = getOauthToken()
-    headers = {
-        'authorization': 'Bearer {}'.format(token)
-    }
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        logger.error('mid: {}, get participants {} {}'.format(mid, response.status_code, response.json()['message']))
+    host_id = Meeting.objects.get(mid=mid).host_id
+    records = ctx.zoom_recordings.get(host_id).get(str(mid))
+    if not records:
+        logger.info('meeting {}: no recordings yet'.format(mid))
         return
-    return response.json()['participants']
+    return max(records, key=lambda x: x['total_size'])
 
 
-def download_recordings(zoom_download_url, mid):
+def download_recordings(zoom_download_url, filename, total_size=None):
     """
     下载录像视频
     :param zoom_download_url: zoom提供的下载地址
-    :param mid: 会议ID
-    :return: 下载的文件名
+    :param filename: 本地保存的文件名
+    :param total_size: 录像文件的大小
+    :return: 下载的统计信息，下载失败时返回None
     """
-    tmpdir = tempfile.gettempdir()
-    target_name = mid + '.mp4'
-    # 判断/tmp/下有无target_name,如果存在则删掉再下载
-    if target_name in os.listdir(tmpdir):
-        os.remove(os.path.join(tmpdir, target_name))
-    r = requests.get(url=zoom_download_url, allow_redirects=False)
+    r = http_client.get(zoom_download_url, allow_redirects=False)
     url = r.headers['location']
-    filename = wget.download(url, out=os.path.join(tmpdir, target_name))
-    return filename
+    return downloader.download(url, filename, total_size=total_size)
 
 
-def generate_cover(mid, topic, group_name, date, filename, start_time, end_time):
+def generate_cover(recording):
     """生成封面"""
-    html_path = filename.replace('.mp4', '.html')
-    image_path = filename.replace('.mp4', '.png')
-    content = cover_content(topic, group_name, date, start_time, end_time)
-    flags = os.O_CREAT | os.O_WRONLY
-    modes = stat.S_IWUSR
-    with os.fdopen(os.open(html_path, flags, modes), 'w') as f:
-        f.write(content)
-    os.system("cp meetings/images/cover.png {}".format(os.path.dirname(filename)))
-    os.system("wkhtmltoimage --enable-local-file-access {} {}".format(html_path, image_path))
-    logger.info("meeting {}: 生成封面".format(mid))
-    os.remove(os.path.join(os.path.dirname(filename), 'cover.png'))
-
-
-def upload_cover(filename, obs_client, bucketName, cover_path):
+    if recording.cover_uploaded:
+        return [recording]
+    os.makedirs(recording.workdir, exist_ok=True)
+    cover_renderer.save(recording.cover_file, recording.topic, recording.group_name, recording.cover_date,
+                        recording.cover_start, recording.cover_end)
+    logger.info("meeting {}: 生成封面".format(recording.mid))
+    return [recording]
+
+
+def upload_cover(cover_file, obs_client, bucketName, cover_path):
     """OBS上传封面"""
     res = obs_client.uploadFile(bucketName=bucketName, objectKey=cover_path,
-                                uploadFile=filename.replace('.mp4', '.png'),
+                                uploadFile=cover_file,
                                 taskNum=10, enableCheckpoint=True)
     return res
 
 
-def download_upload_recordings(start, end, zoom_download_url, mid, total_size, video, endpoint, object_key,
-                               group_name,
-                               obs_client):
-    """
-    下载、上传录像及后续操作
-    :param start: 录像开始时间
-    :param end: 录像结束时间
-    :param zoom_download_url: zoom录像下载地址
-    :param mid: 会议ID
-    :param total_size: 文件大小
-    :param video: Video的实例
-    :param endpoint: OBS终端节点
-    :param object_key: 文件在OBS上的位置
-    :param group_name: sig组名
-    :param obs_client: ObsClient的实例
-    :return:
-    """
-    # 下载录像
-    filename = download_recordings(zoom_download_url, str(mid))
-    print()
-    logger.info('meeting {}: 从ZOOM下载视频，本地保存为{}'.format(mid, filename))
-    try:
-        # 若下载录像的大小和total_size相等，则继续
-        download_file_size = os.path.getsize(filename)
-        logger.info('meeting {}: 下载的文件大小为{}'.format(mid, download_file_size))
-        if download_file_size == total_size:
-            topic = video.topic
-            agenda = video.agenda
-            community = video.community
-            bucketName = settings.DEFAULT_CONF.get('OBS_BUCKETNAME', '')
-            if not bucketName:
-                logger.error('mid: {}, bucketName required'.format(mid))
-                return
-            download_url = 'https://{}.{}/{}?response-content-disposition=attachment'.format(bucketName,
-                                                                                             endpoint,
-                                                                                             object_key)
-            attenders = get_participants(mid)
-            # 生成metadata
-            metadata = {
-                "meeting_id": mid,
-                "meeting_topic": topic,
-                "community": community,
-                "sig": group_name,
-                "agenda": agenda,
-                "record_start": start,
-                "record_end": end,
-                "download_url": download_url,
-                "total_size": download_file_size,
-                "attenders": attenders
-            }
-            # 上传视频
-            try:
-                # 断点续传上传文件
-                res = obs_client.uploadFile(bucketName=bucketName, objectKey=object_key, uploadFile=filename,
-                                            taskNum=10, enableCheckpoint=True, metadata=metadata)
-                try:
-                    if res['status'] == 200:
-                        logger.info('meeting {}: OBS视频上传成功'.format(mid, filename))
-                        # 生成封面
-                        date = (datetime.datetime.strptime(start.replace('T', ' ').replace('Z', ''),
-                                                           "%Y-%m-%d %H:%M:%S") + datetime.timedelta(
-                            hours=8)).strftime('%Y-%m-%d')
-                        start_time = (datetime.datetime.strptime(start.replace('T', ' ').replace('Z', ''),
-                                                                 "%Y-%m-%d %H:%M:%S") + datetime.timedelta(
-                            hours=8)).strftime('%H:%M')
-                        end_time = (datetime.datetime.strptime(end.replace('T', ' ').replace('Z', ''),
-                                                               "%Y-%m-%d %H:%M:%S") + datetime.timedelta(
-                            hours=8)).strftime('%H:%M')
-                        generate_cover(mid, topic, group_name, date, filename, start_time, end_time)
-                        # 上传封面
-                        cover_path = res['body']['key'].replace('.mp4', '.png')
-                        res2 = upload_cover(filename, obs_client, bucketName, cover_path)
-                        if res2['status'] == 200:
-                            logger.info('meeting {}: OBS封面上传成功'.format(mid))
-                            try:
-                                Video.objects.filter(mid=mid).update(start=start,
-                                                                     end=end,
-                                                                     total_size=total_size,
-                                                                     attenders=attenders,
-                                                                     download_url=download_url)
-                                url = download_url.split('?')[0]
-                                if Record.objects.filter(mid=mid, platform='obs'):
-                                    Record.objects.filter(mid=mid, platform='obs').update(
-                                        url=url, thumbnail=url.replace('.mp4', '.png'))
-                                else:
-                                    Record.objects.create(mid=mid, platform='obs', url=url,
-                                                          thumbnail=url.replace('.mp4', '.png'))
-                                logger.info('meeting {}: 更新数据库'.format(mid))
-                                # 删除临时文件
-                                os.remove(filename)
-                                logger.info('meeting {}: 移除临时文件{}'.format(mid, filename))
-                                os.remove(filename.replace('.mp4', '.html'))
-                                logger.info(
-                                    'meeting {}: 移除临时文件{}'.format(mid, filename.replace('.mp4', '.html')))
-                                os.remove(filename.replace('.mp4', '.png'))
-                                logger.info(
-                                    'meeting {}: 移除临时文件{}'.format(mid, filename.replace('.mp4', '.png')))
-                                return topic, filename
-                            except Exception as e4:
-                                logger.error('meeting {}: fail to update database! {}'.format(mid, e4))
-                except KeyError as e3:
-                    logger.error('meeting {}: fail to upload file! {}'.format(mid, e3))
-            except Exception as e2:
-                logger.error('meeting {}: upload file error! {}'.format(mid, e2))
-        else:
-            # 否则，删除刚下载的文件
-            os.remove(filename)
-    except FileNotFoundError as e1:
-        logger.error(e1)
-
-
-def handle_zoom_recordings(mid):
+def discover_zoom_recordings(ctx, mid):
     video = Video.objects.get(mid=mid)
     # 查询会议的录像信息
-    recordings = get_recordings(mid)
-    if recordings:
-        recordings_list = list(
-            filter(lambda x: x if x['file_extension'] == 'MP4' else None, recordings['recording_files']))
-        if len(recordings_list) == 0:
-            logger.info('meeting {}: 正在录制中'.format(mid))
-            return
-        if len(recordings_list) > 1:
-            max_size = max([x['file_size'] for x in recordings_list])
-            for recording in recordings_list:
-                if recording['file_size'] != max_size:
-                    recordings_list.remove(recording)
-        total_size = recordings_list[0]['file_size']
-        logger.info('meeting {}: 录像文件的总大小为{}'.format(mid, total_size))
-        # 如果文件过小，则视为无效录像
-        if total_size < 1024 * 1024 * 10:
-            logger.info('meeting {}: 文件过小，不予操作'.format(mid))
-        else:
-            # 连接obs服务，实例化ObsClient
-            access_key_id = settings.DEFAULT_CONF.get('ACCESS_KEY_ID', '')
-            secret_access_key = settings.DEFAULT_CONF.get('SECRET_ACCESS_KEY', '')
-            endpoint = settings.DEFAULT_CONF.get('OBS_ENDPOINT', '')
-            bucketName = settings.DEFAULT_CONF.get('OBS_BUCKETNAME', '')
-            if not (access_key_id and secret_access_key and endpoint and bucketName):
-                logger.error('losing required arguments for ObsClient')
-                return
-            try:
-                obs_client = ObsClient(access_key_id=access_key_id,
-                                       secret_access_key=secret_access_key,
-                                       server='https://%s' % endpoint)
-                objs = obs_client.listObjects(bucketName=bucketName)
-                # 预备文件上传路径
-                start = recordings_list[0]['recording_start']
-                month = datetime.datetime.strptime(start.replace('T', ' ').replace('Z', ''),
-                                                   "%Y-%m-%d %H:%M:%S").strftime("%b").lower()
-                group_name = video.group_name
-                video_name = mid + '.mp4'
-                object_key = 'opengauss/{}/{}/{}/{}'.format(group_name, month, mid, video_name)
-                logger.info('meeting {}: object_key is {}'.format(mid, object_key))
-                # 收集录像信息待用
-                end = recordings_list[0]['recording_end']
-                zoom_download_url = recordings_list[0]['download_url']
-                if not objs['body']['contents']:
-                    logger.info('meeting {}: OBS无存储对象，开始下载视频'.format(mid))
-                    download_upload_recordings(start, end, zoom_download_url, mid, total_size, video,
-                                               endpoint, object_key,
-                                               group_name, obs_client)
-                else:
-                    key_size_map = {x['key']: x['size'] for x in objs['body']['contents']}
-                    if object_key not in key_size_map.keys():
-                        logger.info('meeting {}: OBS存储服务中无此对象，开始下载视频'.format(mid))
-                        download_upload_recordings(start, end, zoom_download_url, mid, total_size, video,
-                                                   endpoint, object_key,
-                                                   group_name, obs_client)
-                    elif object_key in key_size_map.keys() and key_size_map[object_key] >= total_size:
-                        logger.info('meeting {}: OBS存储服务中已存在该对象且无需替换'.format(mid))
-                    else:
-                        logger.info('meeting {}: OBS存储服务中该对象需要替换，开始下载视频'.format(mid))
-                        download_upload_recordings(start, end, zoom_download_url, mid, total_size, video,
-                                                   endpoint,
-                                                   object_key, group_name, obs_client)
-            except Exception as e:
-                logger.error(e)
-
-
-def get_welink_meeting_participants(mid):
-    _, participants = getParticipants(mid)
-    if 'participants' in participants.keys():
-        return participants['participants']
-    else:
-        return participants
-
-
-def get_available_recordings(mid, host_id, start_time, end_time):
-    status, recordings = listRecordings(host_id)
-    if status != 200:
-        logger.info('Fail to get welink recordings')
-        return []
-    available_recordings = []
-    if recordings['count'] == 0:
-        return []
-    recordings_data = recordings['data']
-    start_order_set = set()
-    for recording in recordings_data:
-        confID = recording['confID']
-        startTime = (datetime.datetime.strptime(recording['startTime'], '%Y-%m-%d %H:%M') +
-                     datetime.timedelta(hours=8)).strftime('%Y-%m-%d %H:%M')
-        rcdTime = recording['rcdTime']
-        if confID != mid:
-            continue
-        endTime = (datetime.datetime.strptime(startTime, '%Y-%m-%d %H:%M') + datetime.timedelta(seconds=rcdTime)). \
-            strftime('%Y-%m-%d %H:%M')
-        if endTime < start_time or startTime > end_time:
-            continue
-        start_order_set.add(startTime)
-    for st in sorted(list(start_order_set)):
-        for recording in recordings_data:
-            confID = recording['confID']
-            startTime = (datetime.datetime.strptime(recording['startTime'], '%Y-%m-%d %H:%M') +
-                         datetime.timedelta(hours=8)).strftime('%Y-%m-%d %H:%M')
-            rcdTime = recording['rcdTime']
-            if confID != mid:
-                continue
-            endTime = (datetime.datetime.strptime(startTime, '%Y-%m-%d %H:%M') + datetime.timedelta(seconds=rcdTime)). \
-                strftime('%Y-%m-%d %H:%M')
-            if endTime < start_time or startTime > end_time:
-                continue
-            if startTime == st:
-                available_recordings.append(recording)
-    return available_recordings
-
-
-def download_upload_welink_recordings(start, end, mid, filename, object_key, endpoint, group_name, obs_client):
-    download_file_size = os.path.getsize(filename)
-    video = Video.objects.get(mid=mid)
-    topic = video.topic
-    if '-' in filename:
-        order_number = int(filename.split('-')[-1].split('.')[0])
-        topic = (video.topic + '-{}'.format(order_number))
-    agenda = video.agenda
-    community = video.community
-    bucketName = settings.DEFAULT_CONF.get('OBS_BUCKETNAME', '')
-    if not bucketName:
-        logger.error('mid: {}, bucketName required'.format(mid))
+    recordings = get_recordings(ctx, mid)
+    if not recordings:
         return
-    download_url = 'https://{}.{}/{}?response-content-disposition=attachment'.format(bucketName, endpoint, object_key)
-    attenders = get_welink_meeting_participants(mid)
-    metadata = {
-        "meeting_id": mid,
-        "meeting_topic": topic,
-        "community": community,
-        "sig": group_name,
-        "agenda": agenda,
-        "record_start": start,
-        "record_end": end,
-        "download_url": download_url,
-        "total_size": download_file_size,
-        "attenders": attenders
-    }
-    try:
-        # 断点续传上传文件
-        res = obs_client.uploadFile(bucketName=bucketName, objectKey=object_key, uploadFile=filename,
-                                    taskNum=10, enableCheckpoint=True, metadata=metadata)
-        try:
-            if res['status'] == 200:
-                logger.info('meeting {}: OBS视频上传成功'.format(mid, filename))
-                # 生成封面
-                meeting = Meeting.objects.get(mid=mid)
-                date = meeting.date
-                start = meeting.start
-                end = meeting.end
-                generate_cover(mid, topic, group_name, date, filename, start, end)
-                # 上传封面
-                cover_path = res['body']['key'].replace('.mp4', '.png')
-                res2 = upload_cover(filename, obs_client, bucketName, cover_path)
-                if res2['status'] == 200:
-                    logger.info('meeting {}: OBS封面上传成功'.format(mid))
-                    try:
-                        if '-' not in filename or '-1' in filename:
-                            Video.objects.filter(mid=mid).update(start=start,
-                                                                 end=end,
-                                                                 total_size=download_file_size,
-                                                                 attenders=attenders,
-                                                                 download_url=download_url)
-                            url = download_url.split('?')[0]
-                            if Record.objects.filter(mid=mid, platform='obs'):
-                                Record.objects.filter(mid=mid, platform='obs').update(
-                                    url=url, thumbnail=url.replace('.mp4', '.png'))
-                            else:
-                                Record.objects.create(mid=mid, platform='obs', url=url,
-                                                      thumbnail=url.replace('.mp4', '.png'))
-                        logger.info('meeting {}: 更新数据库'.format(mid))
-                        # 删除临时文件
-                        os.remove(filename)
-                        logger.info('meeting {}: 移除临时文件{}'.format(mid, filename))
-                        os.remove(filename.replace('.mp4', '.html'))
-                        logger.info(
-                            'meeting {}: 移除临时文件{}'.format(mid, filename.replace('.mp4', '.html')))
-                        os.remove(filename.replace('.mp4', '.png'))
-                        logger.info(
-                            'meeting {}: 移除临时文件{}'.format(mid, filename.replace('.mp4', '.png')))
-                        return topic, filename
-                    except Exception as e4:
-                        logger.error('meeting {}: fail to update database! {}'.format(mid, e4))
-        except KeyError as e3:
-            logger.error('meeting {}: fail to upload file! {}'.format(mid, e3))
-    except Exception as e2:
-        logger.error('meeting {}: upload file error! {}'.format(mid, e2))
-
-
-def after_download_recording(target_filename, start, end, mid, target_name):
-    if os.path.exists(target_filename):
-        total_size = os.path.getsize(target_filename)
-        # 连接obs服务，实例化ObsClient
-        access_key_id = settings.DEFAULT_CONF.get('ACCESS_KEY_ID', '')
-        secret_access_key = settings.DEFAULT_CONF.get('SECRET_ACCESS_KEY', '')
-        endpoint = settings.DEFAULT_CONF.get('OBS_ENDPOINT', '')
-        bucketName = settings.DEFAULT_CONF.get('OBS_BUCKETNAME', '')
-        if not (access_key_id and secret_access_key and endpoint and bucketName):
-            logger.error('losing required arguments for ObsClient')
-            return
-        try:
-            obs_client = ObsClient(access_key_id=access_key_id,
-                                   secret_access_key=secret_access_key,
-                                   server='https://%s' % endpoint)
-            objs = obs_client.listObjects(bucketName=bucketName)
-            # 预备文件上传路径
-            date = Meeting.objects.get(mid=mid).date
-            start_time = date + 'T' + start + ':00Z'
-            end_time = date + 'T' + end + ':00Z'
-            month = datetime.datetime.strptime(start_time.replace('T', ' ').replace('Z', ''),
-                                               "%Y-%m-%d %H:%M:%S").strftime("%b").lower()
-            video = Video.objects.get(mid=mid)
-            group_name = video.group_name
-            object_key = 'opengauss/{}/{}/{}/{}'.format(group_name, month, mid, target_name)
-            logger.info('meeting {}: object_key is {}'.format(mid, object_key))
-            # 收集录像信息待用
-            if not objs['body']['contents']:
-                logger.info('meeting {}: OBS无存储对象，开始下载视频'.format(mid))
-                download_upload_welink_recordings(start_time, end_time, mid, target_filename,
-                                                  object_key, endpoint, group_name, obs_client)
-            else:
-                key_size_map = {x['key']: x['size'] for x in objs['body']['contents']}
-                if object_key not in key_size_map.keys():
-                    logger.info('meeting {}: OBS存储服务中无此对象，开始下载视频'.format(mid))
-                    download_upload_welink_recordings(start_time, end_time, mid, target_filename,
-                                                      object_key, endpoint, group_name, obs_client)
-                elif object_key in key_size_map.keys() and key_size_map[object_key] >= total_size:
-                    logger.info('meeting {}: OBS存储服务中已存在该对象且无需替换'.format(mid))
-                else:
-                    logger.info('meeting {}: OBS存储服务中该对象需要替换，开始下载视频'.format(mid))
-                    download_upload_welink_recordings(start_time, end_time, mid, target_filename,
-                                                      object_key, endpoint, group_name, obs_client)
-        except Exception as e:
-            logger.error(e)
+    recordings_list = [x for x in recordings['recording_files'] if x['file_extension'] == 'MP4']
+    if len(recordings_list) == 0:
+        logger.info('meeting {}: 正在录制中'.format(mid))
+        return
+    recording_file = max(recordings_list, key=lambda x: x['file_size'])
+    total_size = recording_file['file_size']
+    logger.info('meeting {}: 录像文件的总大小为{}'.format(mid, total_size))
+    # 如果文件过小，则视为无效录像
+    if total_size < MIN_RECORDING_SIZE:
+        logger.info('meeting {}: 文件过小，不予操作'.format(mid))
+        return
+    start = recording_file['recording_start']
+    end = recording_file['recording_end']
+    start_at = datetime.datetime.strptime(start, '%Y-%m-%dT%H:%M:%SZ')
+    end_at = datetime.datetime.strptime(end, '%Y-%m-%dT%H:%M:%SZ')
+    recording = Recording(mid, 'zoom', mid + '.mp4', video.group_name, start_at.strftime('%b').lower())
+    logger.info('meeting {}: object_key is {}'.format(mid, recording.object_key))
+    recording.topic = video.topic
+    recording.agenda = video.agenda
+    recording.community = video.community
+    recording.record_start = recording.video_start = start
+    recording.record_end = recording.video_end = end
+    recording.cover_date = (start_at + datetime.timedelta(hours=8)).strftime('%Y-%m-%d')
+    recording.cover_start = (start_at + datetime.timedelta(hours=8)).strftime('%H:%M')
+    recording.cover_end = (end_at + datetime.timedelta(hours=8)).strftime('%H:%M')
+    recording.total_size = total_size
+    recording.source_url = recording_file['download_url']
+    recording.download_url = ctx.get_download_url(recording.object_key)
+    object_size = ctx.get_object_size(recording.object_key)
+    if object_size is not None and object_size >= total_size:
+        logger.info('meeting {}: OBS存储服务中已存在该对象且无需替换'.format(mid))
+        recording.uploaded = True
+    else:
+        logger.info('meeting {}: OBS存储服务中无此对象或需要替换，开始下载视频'.format(mid))
+    return [recording]
 
 
-def handle_welink_recordings(mid):
+def discover_welink_recordings(ctx, mid):
     meeting = Meeting.objects.get(mid=mid)
+    video = Video.objects.get(mid=mid)
     date = meeting.date
     start = meeting.start
     end = meeting.end
-    start_time = date + ' ' + start
-    end_time = date + ' ' + end
     host_id = meeting.host_id
-    available_recordings = get_available_recordings(mid, host_id, start_time, end_time)
+    start_at, end_at = parse_interval(date, start, end)
+    available_recordings = ctx.welink_recordings.segments(host_id, mid, start_at, end_at)
     if not available_recordings:
         logger.info('meeting {}: 无可用录像'.format(mid))
-    else:
-        waiting_download_recordings = []
-        for available_recording in available_recordings:
-            confUUID = available_recording['confUUID']
-            status, res = getDetailDownloadUrl(confUUID, host_id)
-            record_urls = res['recordUrls'][0]['urls']
-            for record_url in record_urls:
-                if record_url['fileType'] == 'Hd':
-                    waiting_download_recordings.append(record_url)
-        tmpdir = tempfile.gettempdir()
+        return
+    conf_uuids = list(dict.fromkeys(x.conf_uuid for x in available_recordings))
+    waiting_download_recordings = []
+    for available_recording in available_recordings:
+        status, res = getDetailDownloadUrl(available_recording.conf_uuid, host_id)
+        record_urls = res['recordUrls'][0]['urls']
+        for record_url in record_urls:
+            if record_url['fileType'] == 'Hd':
+                waiting_download_recordings.append(record_url)
+    month = datetime.datetime.strptime(date, '%Y-%m-%d').strftime('%b').lower()
+    recordings = []
+    for index, waiting_download_recording in enumerate(waiting_download_recordings):
         if len(waiting_download_recordings) == 1:
-            target_name = mid + '.mp4'
-            target_filename = os.path.join(tmpdir, target_name)
-            token = waiting_download_recordings[0]['token']
-            download_url = waiting_download_recordings[0]['url']
-            downloadHWCloudRecording(token, target_filename, download_url)
-            after_download_recording(target_filename, start, end, mid, target_name)
-            return
-        for index, waiting_download_recording in enumerate(waiting_download_recordings):
-            marked_number = index + 1
-            target_name = mid + '-{}.mp4'.format(marked_number)
-            target_filename = os.path.join(tmpdir, target_name)
-            token = waiting_download_recording['token']
-            download_url = waiting_download_recording['url']
-            downloadHWCloudRecording(token, target_filename, download_url)
-            after_download_recording(target_filename, start, end, mid, target_name)
-
-
-def run(mid):
-    """
-    查询Video根据total_size判断是否需要执行后续操作（下载、上传、保存数据）
-    :param mid: 会议ID
-    :return:
-    """
-    logger.info('meeting {}: 开始处理'.format(mid))
-    platform = Meeting.objects.get(mid=mid).mplatform
-    if platform == 'zoom':
-        handle_zoom_recordings(mid)
-    elif platform == 'welink':
-        handle_welink_recordings(mid)
-
+            recording = Recording(mid, 'welink', mid + '.mp4', video.group_name, month)
+            recording.topic = video.topic
+        else:
+            recording = Recording(mid, 'welink', mid + '-{}.mp4'.format(index + 1), video.group_name, month)
+            recording.order = index + 1
+            recording.topic = video.topic + '-{}'.format(recording.order)
+        logger.info('meeting {}: object_key is {}'.format(mid, recording.object_key))
+        recording.agenda = video.agenda
+        recording.community = video.community
+        recording.conf_uuids = conf_uuids
+        recording.record_start = date + 'T' + start + ':00Z'
+        recording.record_end = date + 'T' + end + ':00Z'
+        recording.video_start = recording.cover_start = start
+        recording.video_end = recording.cover_end = end
+        recording.cover_date = date
+        recording.source_url = waiting_download_recording['url']
+        recording.token = waiting_download_recording['token']
+        recording.download_url = ctx.get_download_url(recording.object_key)
+        recordings.append(recording)
+    return recordings
@@ -0,0 +1,28 @@
+import ast
+import logging
+from django.core.management.base import BaseCommand
+from meetings.models import Group
+from meetings.utils.sigs import set_group_members
+
+logger = logging.getLogger('log')
+
+
+class Command(BaseCommand):
+    help = 'Fill the GroupMember table from the stringified member lists in Group.members'
+
+    def handle(self, *args, **options):
+        members, names, failed = {}, {}, 0
+        for group_id, name, group_members in Group.objects.values_list('id', 'name', 'members'):
+            try:
+                members[group_id] = ast.literal_eval(group_members) if group_members else []
+            except (ValueError, SyntaxError):
+                logger.error('sig {}: invalid members {}'.format(name, group_members))
+                failed += 1
+                continue
+            names[group_id] = name
+        changes = set_group_members(members)
+        for group_id, (added, removed) in changes.items():
+            logger.info('sig {}: {} members added, {} removed'.format(names[group_id], len(added), len(removed)))
+        added_total = sum(len(added) for added, _ in changes.values())
+        logger.info('migrate group members: {} members added, {} sigs failed'.format(added_total, failed))
+        self.stdout.write('{} members added, {} sigs failed'.format(added_total, failed))
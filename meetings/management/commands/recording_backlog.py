@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from meetings.models import RecordingJob
+from meetings.utils import recording_jobs
+
+
+class Command(BaseCommand):
+    help = 'Report the recording jobs handle_recordings has not finished yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list', action='store_true', help='list every unfinished job')
+        parser.add_argument('--exhausted', action='store_true',
+                            help='only list jobs that reached RECORDING_JOB_MAX_ATTEMPTS')
+
+    def handle(self, *args, **options):
+        backlog = recording_jobs.backlog()
+        for status, count in backlog['status'].items():
+            self.stdout.write('{}: {}'.format(status, count))
+        self.stdout.write('exhausted (>= {} attempts): {}'.format(settings.RECORDING_JOB_MAX_ATTEMPTS,
+                                                                   backlog['exhausted']))
+        if backlog['oldest']:
+            self.stdout.write('oldest unfinished job created at {}'.format(backlog['oldest']))
+        if not (options['list'] or options['exhausted']):
+            return
+        jobs = RecordingJob.objects.exclude(status=recording_jobs.PUBLISHED).order_by('create_time')
+        if options['exhausted']:
+            jobs = jobs.filter(attempts__gte=settings.RECORDING_JOB_MAX_ATTEMPTS)
+        for job in jobs:
+            self.stdout.write('{} {} {} attempts={} updated={} error={}'.format(
+                job.mid, job.object_key, recording_jobs.STATUS_NAMES[job.status], job.attempts, job.update_time,
+                job.last_error))
@@ -0,0 +1,31 @@
+import logging
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from meetings.utils import mail_outbox
+
+logger = logging.getLogger('log')
+
+
+class Command(BaseCommand):
+    help = 'Send queued meeting emails from the mail outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.MAIL_OUTBOX_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='keep polling the outbox instead of exiting')
+        parser.add_argument('--interval', type=float, default=5, help='seconds to wait when the outbox is empty')
+
+    def handle(self, *args, **options):
+        total_sent, total_failed = 0, 0
+        while True:
+            batch = mail_outbox.claim(options['batch_size'])
+            if batch:
+                sent, failed = mail_outbox.deliver(batch)
+                total_sent += sent
+                total_failed += failed
+                logger.info('outbox batch: {} sent, {} failed'.format(sent, failed))
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        logger.info('outbox drained: {} sent, {} failed'.format(total_sent, total_failed))
@@ -1,56 +1,163 @@
 import logging
 import os
+import re
+import shutil
 import stat
+import subprocess
+import time
 import yaml
 from meetings.models import Group
-from django.core.management.base import BaseCommand
+from meetings.utils import maillist
+from meetings.utils.sigs import SIGS_PATH, set_group_members
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 
 logger = logging.getLogger('log')
 
+TC_REPO = 'https://gitee.com/opengauss/tc.git'
+TC_BRANCH = 'master'
+TC_DIR = 'meetings/tc'
+# 最后一次成功同步的tc提交，同步成功后才更新
+SYNCED_REF = 'refs/sync/synced'
+
+
+def git(*args):
+    try:
+        return subprocess.run(['git', '-C', TC_DIR] + list(args), check=True, stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, universal_newlines=True).stdout.strip()
+    except subprocess.CalledProcessError as e:
+        raise CommandError('git {} failed: {}'.format(' '.join(args), e.stderr.strip()))
+
+
+def read_sponsors(path):
+    with open(path, 'r') as f:
+        owners = yaml.safe_load(f)
+    sponsors = []
+    for maintainer in owners['maintainers']:
+        sponsors.append(maintainer)
+    for committer in owners['committers']:
+        sponsors.append(committer)
+    return sponsors
+
+
 class Command(BaseCommand):
+    help = 'Sync SIGs and their members from the tc repository'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='re-clone the tc repository and re-read every OWNERS file')
+
     def handle(self, *args, **options):
-        os.system('test -d meetings/tc && rm -rf meetings/tc')
-        os.system('cd meetings; git clone https://gitee.com/opengauss/tc.git')
-        with open('meetings/tc/sigs.yaml', 'r') as f:
+        t0 = time.time()
+        changed_files = None if options['full'] else self.fetch()
+        if changed_files is None:
+            self.clone()
+        elif not changed_files and os.path.exists(SIGS_PATH):
+            self.stdout.write('tc is up to date, finished in {:.2f}s'.format(time.time() - t0))
+            return
+        with open(os.path.join(TC_DIR, 'sigs.yaml'), 'r') as f:
             content = yaml.safe_load(f)
-        sigs = []
-        for sig in content['sigs']:
-            sig_name = sig['name']
-            sig['sponsors'] = []
-            with open('meetings/tc/sigs/{}/OWNERS'.format(sig_name), 'r') as f:
-                owners = yaml.safe_load(f)
-            for maintainer in owners['maintainers']:
-                sig['sponsors'].append(maintainer)
-            for committer in owners['committers']:
-                sig['sponsors'].append(committer)
-            if Group.objects.filter(name=sig_name):
-                Group.objects.filter(name=sig_name).update(members=sig['sponsors'])
-                logger.info('Update sig: {}'.format(sig_name))
-                logger.info({'sig': sig_name, 'members': sig['sponsors']})
-            else:
-                Group.objects.create(name=sig_name, members=sig['sponsors'])
-                logger.info('Create sig: {}'.format(sig_name))
-                logger.info({'sig': sig_name, 'members': sig['sponsors']})
-            del sig['repositories']
-            sigs.append(sig)
-        with open('meetings/tc/OWNERS', 'r') as f:
-            owners = yaml.safe_load(f)
-        sig = {}
-        sig['name'] = 'TC'
-        sig['sponsors'] = []
-        for maintainer in owners['maintainers']:
-            sig['sponsors'].append(maintainer)
-        for commiiter in owners['committers']:
-            sig['sponsors'].append(commiiter)
-        sigs.append(sig)
-        if not Group.objects.filter(name='TC'):
-            Group.objects.create(name='TC', members=sig['sponsors'])
-            logger.info('Create sig: TC')
+        sig_names = [sig['name'] for sig in content['sigs']]
+        sigs = {}
+        if changed_files is not None and os.path.exists(SIGS_PATH):
+            with open(SIGS_PATH, 'r') as f:
+                sigs = {sig['name']: sig for sig in yaml.safe_load(f)}
+        # 只重新读取有变化的OWNERS，sigs.yaml变化时重新读取所有sig组
+        if changed_files is None or 'sigs.yaml' in changed_files:
+            targets = set(sig_names + ['TC'])
         else:
-            Group.objects.filter(name='TC').update(members=sig['sponsors'])
-            logger.info('Update sig: TC')
-        flags = os.O_CREAT | os.O_WRONLY
-        modes = stat.S_IWUSR
-        with os.fdopen(os.open('share/openGauss_sigs.yaml', flags, modes), 'w') as f:
+            targets = set()
+            for path in changed_files:
+                match = re.match(r'^sigs/([^/]+)/OWNERS$', path)
+                if match and match.group(1) in sig_names:
+                    targets.add(match.group(1))
+            if 'OWNERS' in changed_files:
+                targets.add('TC')
+            targets.update(name for name in sig_names + ['TC'] if name not in sigs)
+        for sig in content['sigs']:
+            if sig['name'] in targets:
+                sig.pop('repositories', None)
+                sig['sponsors'] = read_sponsors(os.path.join(TC_DIR, 'sigs', sig['name'], 'OWNERS'))
+                sigs[sig['name']] = sig
+        if 'TC' in targets:
+            sigs['TC'] = {'name': 'TC', 'sponsors': read_sponsors(os.path.join(TC_DIR, 'OWNERS'))}
+        # 重新读取了所有sig组时，同时移除已不在sigs.yaml中的sig组的成员
+        changes = self.apply({name: sigs[name]['sponsors'] for name in targets},
+                             prune=changed_files is None or 'sigs.yaml' in changed_files)
+        self.dump([sigs[name] for name in sig_names + ['TC']])
+        # tc仓库中同时维护了sig组的邮件列表映射，写入本地副本后各进程在文件变化时重新加载
+        maillist_path = os.path.join(TC_DIR, 'maillist_mapping.yaml')
+        if os.path.exists(maillist_path) and (changed_files is None or 'maillist_mapping.yaml' in changed_files):
+            with open(maillist_path, 'r') as f:
+                maillist.publish(f.read())
+        git('update-ref', SYNCED_REF, 'HEAD')
+        for sig_name, (added, removed) in sorted(changes.items()):
+            logger.info({'sig': sig_name, 'added': sorted(added), 'removed': sorted(removed)})
+            self.stdout.write('{}: +{} -{}'.format(sig_name, sorted(added), sorted(removed)))
+        elapsed = time.time() - t0
+        logger.info('sync sigs: {} sigs read, {} sigs changed in {:.2f}s'.format(len(targets), len(changes), elapsed))
+        self.stdout.write('{} sigs read, {} sigs changed, finished in {:.2f}s'.format(
+            len(targets), len(changes), elapsed))
+
+    @staticmethod
+    def clone():
+        if os.path.isdir(TC_DIR):
+            shutil.rmtree(TC_DIR)
+        try:
+            subprocess.run(['git', 'clone', '-b', TC_BRANCH, TC_REPO, TC_DIR], check=True, stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE, universal_newlines=True)
+        except subprocess.CalledProcessError as e:
+            raise CommandError('git clone failed: {}'.format(e.stderr.strip()))
+
+    @staticmethod
+    def fetch():
+        """
+        拉取tc仓库的新提交，与最后一次成功同步的提交比较
+        上次同步失败时SYNCED_REF不会前进，下次运行仍会处理这些变化
+        :return: 有变化的文件列表，本地没有可用的仓库时返回None
+        """
+        if not os.path.isdir(os.path.join(TC_DIR, '.git')):
+            return None
+        try:
+            old_head = git('rev-parse', '--verify', SYNCED_REF)
+        except CommandError:
+            old_head = git('rev-parse', 'HEAD')
+        git('fetch', 'origin', TC_BRANCH)
+        new_head = git('rev-parse', 'FETCH_HEAD')
+        if old_head == new_head:
+            return []
+        changed_files = git('diff', '--name-only', old_head, new_head).splitlines()
+        git('reset', '--hard', new_head)
+        logger.info('tc updated {}..{}: {} files changed'.format(old_head[:8], new_head[:8], len(changed_files)))
+        return changed_files
+
+    @staticmethod
+    def apply(members, prune=False):
+        """
+        更新sig组及成员
+        :param members: {sig组名称: 成员列表}
+        :param prune: members包含全部sig组时为True，同时清空不在其中的sig组的成员
+        :return: {sig组名称: (新增的成员集合, 移除的成员集合)}
+        """
+        with transaction.atomic():
+            groups = dict(Group.objects.filter(name__in=list(members.keys())).values_list('name', 'id'))
+            for name in members.keys():
+                if name not in groups:
+                    groups[name] = Group.objects.create(name=name, members=members[name]).id
+                    logger.info('Create sig: {}'.format(name))
+            changes = set_group_members({groups[name]: sponsors for name, sponsors in members.items()}, prune)
+            names = dict(Group.objects.filter(id__in=list(changes.keys())).values_list('id', 'name'))
+            for group_id in changes.keys():
+                Group.objects.filter(id=group_id).update(members=members.get(names[group_id], []))
+        return {names[group_id]: change for group_id, change in changes.items()}
+
+    @staticmethod
+    def dump(sigs):
+        # 先写临时文件再替换，读取方不会读到写了一半的文件
+        flags = os.O_CREAT | os.O_WRONLY | os.O_TRUNC
+        modes = stat.S_IWUSR | stat.S_IRUSR
+        tmp_path = SIGS_PATH + '.tmp'
+        with os.fdopen(os.open(tmp_path, flags, modes), 'w') as f:
             yaml.dump(sigs, f, default_flow_style=False)
+        os.replace(tmp_path, SIGS_PATH)
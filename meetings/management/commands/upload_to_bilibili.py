@@ -9,6 +9,8 @@ from django.conf import settings
 from django.core.management import BaseCommand
 from obs import ObsClient
 from meetings.models import Record
+from meetings.utils.calendar_builder import invalidate_calendar
+from meetings.utils.obs_index import ObsObjectIndex
 
 logger = logging.getLogger('log')
 
@@ -26,14 +28,13 @@ class Command(BaseCommand):
         obs_client = ObsClient(access_key_id=access_key_id,
                                secret_access_key=secret_access_key,
                                server='https://%s' % endpoint)
-        objs = obs_client.listObjects(bucketName=bucketName)['body']['contents']
+        # 分页列出所有录像，避免遗漏第一页之后的对象
+        objs = ObsObjectIndex(obs_client, bucketName).load('opengauss/')
         # 遍历
         if len(objs) == 0:
             logger.info('OBS中无对象')
             return
-        for obj in objs:
-            # 获取对象的地址
-            object_key = obj['key']
+        for object_key in sorted(objs.keys()):
             if not object_key.endswith('.mp4'):
                 continue
             # 获取对象的metadata
@@ -79,6 +80,7 @@ class Command(BaseCommand):
                                     try:
                                         if not Record.objects.filter(mid=mid, platform='bilibili'):
                                             Record.objects.create(mid=mid, platform='bilibili')
+                                            invalidate_calendar()
                                     except Exception as e:
                                         logger.error(e)
                                     # 修改metadata
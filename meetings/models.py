@@ -13,11 +13,23 @@ class User(models.Model):
 
 
 class Group(models.Model):
-    name = models.CharField(verbose_name='sig组名称', max_length=50)
+    name = models.CharField(verbose_name='sig组名称', max_length=50, db_index=True)
     members = models.TextField(verbose_name='sig组成员')
     create_time = models.DateTimeField(verbose_name='创建时间', auto_now_add=True, null=True, blank=True)
 
 
+class GroupMember(models.Model):
+    """sig组成员表"""
+    group = models.ForeignKey(Group, on_delete=models.CASCADE)
+    gitee_id = models.CharField(verbose_name='GiteeID', max_length=50)
+
+    class Meta:
+        unique_together = ('group', 'gitee_id')
+        indexes = [
+            models.Index(fields=['gitee_id', 'group'], name='member_gitee_group_idx'),
+        ]
+
+
 class Meeting(models.Model):
     """会议表"""
     topic = models.CharField(verbose_name='会议主题', max_length=128)
@@ -28,12 +40,14 @@ class Meeting(models.Model):
     date = models.CharField(verbose_name='会议日期', max_length=30)
     start = models.CharField(verbose_name='会议开始时间', max_length=30)
     end = models.CharField(verbose_name='会议结束时间', max_length=30)
+    start_at = models.DateTimeField(verbose_name='会议开始时刻', null=True, blank=True)
+    end_at = models.DateTimeField(verbose_name='会议结束时刻', null=True, blank=True)
     duration = models.IntegerField(verbose_name='会议时长', null=True, blank=True)
     agenda = models.TextField(verbose_name='议程', default='', null=True, blank=True)
     etherpad = models.CharField(verbose_name='etherpad', max_length=255, null=True, blank=True)
     emaillist = models.TextField(verbose_name='邮件列表', null=True, blank=True)
     host_id = models.EmailField(verbose_name='host_id', null=True, blank=True)
-    mid = models.CharField(verbose_name='会议id', max_length=20)
+    mid = models.CharField(verbose_name='会议id', max_length=20, unique=True)
     timezone = models.CharField(verbose_name='时区', max_length=50, null=True, blank=True)
     password = models.CharField(verbose_name='密码', max_length=128, null=True, blank=True)
     start_url = models.TextField(verbose_name='开启会议url', null=True, blank=True)
@@ -45,6 +59,104 @@ class Meeting(models.Model):
     mplatform = models.CharField(verbose_name='第三方会议平台', max_length=20, null=True, blank=True, default='zoom')
     sequence = models.IntegerField(verbose_name='序列号', default=0)
 
+    def save(self, *args, **kwargs):
+        # 未指定起止时刻时由日期及起止时间计算，冲突检测只按起止时刻查询
+        if (self.start_at is None or self.end_at is None) and self.date and self.start and self.end:
+            from meetings.utils.schedule import parse_interval
+            try:
+                self.start_at, self.end_at = parse_interval(self.date, self.start, self.end)
+            except ValueError:
+                pass
+        super(Meeting, self).save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_delete', 'start_at', 'end_at'], name='meeting_conflict_idx'),
+            models.Index(fields=['is_delete', 'date'], name='meeting_date_idx'),
+            models.Index(fields=['host_id', 'is_delete', 'start_at'], name='meeting_host_idx'),
+            models.Index(fields=['group_name', 'is_delete', 'date'], name='meeting_group_idx'),
+        ]
+
+
+class Host(models.Model):
+    """会议平台账号表，预定会议时作为行锁对象"""
+    platform = models.CharField(verbose_name='第三方会议平台', max_length=20)
+    host_id = models.CharField(verbose_name='host_id', max_length=128, unique=True)
+
+
+class HostReservation(models.Model):
+    """host时段预留表"""
+    host_id = models.CharField(verbose_name='host_id', max_length=128)
+    start_at = models.DateTimeField(verbose_name='预留开始时刻')
+    end_at = models.DateTimeField(verbose_name='预留结束时刻')
+    mid = models.CharField(verbose_name='会议id', max_length=20, null=True, blank=True)
+    create_time = models.DateTimeField(verbose_name='创建时间', auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['host_id', 'start_at'], name='reservation_host_idx'),
+        ]
+
+
+class MailOutbox(models.Model):
+    """邮件发送队列"""
+    mid = models.CharField(verbose_name='会议id', max_length=20)
+    kind = models.CharField(verbose_name='邮件类型', max_length=20,
+                            choices=(('invite', '会议邀请'), ('cancel', '取消会议')))
+    sequence = models.IntegerField(verbose_name='序列号', default=0)
+    payload = models.TextField(verbose_name='邮件内容')
+    status = models.SmallIntegerField(verbose_name='发送状态',
+                                      choices=((0, '待发送'), (1, '发送中'), (2, '已发送'), (3, '发送失败')),
+                                      default=0)
+    attempts = models.IntegerField(verbose_name='发送次数', default=0)
+    last_error = models.TextField(verbose_name='最近一次错误', null=True, blank=True)
+    next_attempt_time = models.DateTimeField(verbose_name='下次发送时间')
+    claim_time = models.DateTimeField(verbose_name='领取时间', null=True, blank=True)
+    sent_time = models.DateTimeField(verbose_name='发送时间', null=True, blank=True)
+    create_time = models.DateTimeField(verbose_name='创建时间', auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_time'], name='outbox_status_idx'),
+            models.Index(fields=['mid', 'sequence'], name='outbox_mid_idx'),
+        ]
+
+
+class RecordingJob(models.Model):
+    """录像处理任务表，每个录像文件一条"""
+    mid = models.CharField(verbose_name='会议id', max_length=20)
+    platform = models.CharField(verbose_name='平台', max_length=20)
+    object_key = models.CharField(verbose_name='OBS对象名', max_length=255, unique=True)
+    status = models.SmallIntegerField(verbose_name='处理状态',
+                                      choices=((0, '已发现'), (1, '下载中'), (2, '视频已上传'), (3, '封面已上传'),
+                                               (4, '已发布')),
+                                      default=0)
+    attempts = models.IntegerField(verbose_name='处理次数', default=0)
+    last_error = models.TextField(verbose_name='最近一次错误', null=True, blank=True)
+    payload = models.TextField(verbose_name='录像信息')
+    create_time = models.DateTimeField(verbose_name='创建时间', auto_now_add=True)
+    update_time = models.DateTimeField(verbose_name='更新时间', null=True, blank=True)
+    finish_time = models.DateTimeField(verbose_name='发布时间', null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'attempts'], name='recording_job_status_idx'),
+            models.Index(fields=['mid', 'status'], name='recording_job_mid_idx'),
+        ]
+
+
+class Participant(models.Model):
+    """参会人表，缓存已结束会议的参会人"""
+    mid = models.CharField(verbose_name='会议id', max_length=20)
+    name = models.CharField(verbose_name='参会人', max_length=128, null=True, blank=True)
+    info = models.TextField(verbose_name='参会信息')
+    create_time = models.DateTimeField(verbose_name='创建时间', auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['mid'], name='participant_mid_idx'),
+        ]
+
 
 class Video(models.Model):
     """会议记录表"""
@@ -61,6 +173,11 @@ class Video(models.Model):
     replay_url = models.CharField(verbose_name='回放地址', max_length=255, null=True, blank=True)
     create_time = models.DateTimeField(verbose_name='创建时间', auto_now_add=True, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['mid'], name='video_mid_idx'),
+        ]
+
 
 class Record(models.Model):
     """录像表"""
@@ -68,3 +185,18 @@ class Record(models.Model):
     platform = models.CharField(verbose_name='平台', max_length=50)
     url = models.CharField(verbose_name='播放地址', max_length=255, null=True, blank=True)
     thumbnail = models.CharField(verbose_name='缩略图', max_length=255, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['mid', 'platform'], name='record_mid_platform_idx'),
+        ]
+
+
+class CalendarVersion(models.Model):
+    """日历版本表，只有一条记录，会议或录像变更后版本加1，各进程的日历缓存以版本区分"""
+    version = models.IntegerField(verbose_name='版本', default=0)
+
+
+class HostIndexVersion(models.Model):
+    """host可用性索引版本表，只有一条记录，会议的host或时间变更后版本加1，各进程据此重建索引"""
+    version = models.IntegerField(verbose_name='版本', default=0)
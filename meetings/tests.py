@@ -0,0 +1,768 @@
+import datetime
+import hashlib
+import itertools
+import os
+import random
+import shutil
+import smtplib
+import tempfile
+import threading
+import time
+import unittest
+from multiprocessing.dummy import Pool as ThreadPool
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import close_old_connections, connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from PIL import Image
+from meetings.management.commands import handle_recordings, sync_sigs
+from meetings.models import CalendarVersion, Group, GroupMember, HostReservation, MailOutbox, Meeting, Record, \
+    RecordingJob, User, Video
+from meetings.utils import cover_render, downloader, mail_outbox, maillist, obs_stream, recording_jobs
+from meetings.utils.booking import release_host, reserve_any_host
+from meetings.utils.host_index import HostAvailabilityIndex
+from meetings.utils.pipeline import Pipeline, Stage
+from meetings.utils.schedule import busy_hosts, get_search_window
+from meetings.utils.sigs import is_member
+
+# 不使用缓存，每次请求都重新生成日历
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+@override_settings(CACHES=NO_CACHE)
+class MeetingsDataTest(TestCase):
+    # sig组校验、日历版本、会议、录像、发起人头像各一次查询
+    QUERIES = 5
+
+    def setUp(self):
+        self.user = User.objects.create(gid=1, gitee_id='u', name='u', avatar='avatar', email='u@example.com')
+        self.group = Group.objects.create(name='Infra', members='[]')
+        self.count = 0
+
+    def create_meetings(self, n, user=None):
+        date = datetime.date.today()
+        for _ in range(n):
+            self.count += 1
+            mid = str(10000 + self.count)
+            Meeting.objects.create(topic='topic', sponsor='u', group_name='Infra', mid=mid, user=user or self.user,
+                                   group=self.group, date=(date + datetime.timedelta(days=self.count % 3)).
+                                   strftime('%Y-%m-%d'), start='10:00', end='11:00')
+            Record.objects.create(mid=mid, platform='obs')
+            Record.objects.create(mid=mid, platform='bilibili', url='https://bilibili.example.com/' + mid)
+
+    def get_meetings(self):
+        res = self.client.get('/meetingsdata/')
+        self.assertEqual(res.status_code, 200)
+        return [x for day in res.json()['tableData'] for x in day['timeData']]
+
+    def test_constant_queries(self):
+        self.create_meetings(2)
+        with self.assertNumQueries(self.QUERIES):
+            self.assertEqual(len(self.get_meetings()), 2)
+        self.create_meetings(20)
+        with self.assertNumQueries(self.QUERIES):
+            meetings = self.get_meetings()
+        self.assertEqual(len(meetings), 22)
+        self.assertTrue(all(x['record'] and x['video_url'] and x['url'] == 'avatar' for x in meetings))
+
+    def test_missing_user(self):
+        self.create_meetings(1)
+        with connection.constraint_checks_disabled():
+            self.create_meetings(1, User(id=self.user.id + 1))
+        meetings = {x['mid']: x for x in self.get_meetings()}
+        self.assertEqual(meetings['10001']['url'], 'avatar')
+        self.assertEqual(meetings['10002']['url'], '')
+        Meeting.objects.filter(mid='10002').delete()
+
+
+class CalendarCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(gid=1, gitee_id='u', name='u', avatar='avatar', email='u@example.com')
+        self.group = Group.objects.create(name='Infra', members='[]')
+
+    def create_meeting(self, mid):
+        Meeting.objects.create(topic='topic', sponsor='u', group_name='Infra', mid=mid, user=self.user,
+                               group=self.group, date=datetime.date.today().strftime('%Y-%m-%d'), start='10:00',
+                               end='11:00')
+
+    def get_mids(self):
+        res = self.client.get('/meetingsdata/')
+        return [x['mid'] for day in res.json()['tableData'] for x in day['timeData']]
+
+    def test_version_in_database(self):
+        self.create_meeting('10001')
+        self.assertEqual(self.get_mids(), ['10001'])
+        self.create_meeting('10002')
+        self.assertEqual(self.get_mids(), ['10001'])
+        # 其他进程更新数据库中的版本后缓存失效
+        CalendarVersion.objects.create(id=1, version=1)
+        self.assertEqual(self.get_mids(), ['10001', '10002'])
+
+
+# 各进程的缓存互不可见，版本只能通过数据库传递
+@override_settings(CACHES=NO_CACHE, OPENGAUSS_MEETING_HOSTS={'zoom': {'h1': 'host1', 'h2': 'host2'}})
+class HostIndexTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(gid=1, gitee_id='u', name='u', avatar='avatar', email='u@example.com')
+        self.group = Group.objects.create(name='Infra', members='[]')
+        self.start_at = (datetime.datetime.now() + datetime.timedelta(days=1)).replace(hour=10, minute=0, second=0,
+                                                                                       microsecond=0)
+        self.end_at = self.start_at + datetime.timedelta(hours=1)
+
+    def create_meeting(self, mid, host_id):
+        Meeting.objects.create(topic='topic', sponsor='u', group_name='Infra', mid=mid, user=self.user,
+                               group=self.group, date=self.start_at.strftime('%Y-%m-%d'), start='10:00', end='11:00',
+                               host_id=host_id)
+
+    def test_invalidate_across_instances(self):
+        # 两个索引实例模拟两个进程
+        writer, reader = HostAvailabilityIndex(), HostAvailabilityIndex()
+        self.assertEqual(reader.free_hosts('zoom', self.start_at, self.end_at), ['h1', 'h2'])
+        self.assertEqual(writer.free_hosts('zoom', self.start_at, self.end_at), ['h1', 'h2'])
+        self.create_meeting('10001', 'h1')
+        writer.add('10001', 'h1', self.start_at, self.end_at)
+        self.assertEqual(reader.free_hosts('zoom', self.start_at, self.end_at), ['h2'])
+        Meeting.objects.filter(mid='10001').update(is_delete=1)
+        writer.remove('10001')
+        self.assertEqual(reader.free_hosts('zoom', self.start_at, self.end_at), ['h1', 'h2'])
+        # 写入方的索引已是最新，无需重建
+        built_at = writer.built_at
+        self.assertEqual(writer.free_hosts('zoom', self.start_at, self.end_at), ['h1', 'h2'])
+        self.assertEqual(writer.built_at, built_at)
+
+    def test_unfilled_meeting(self):
+        self.create_meeting('10001', 'h1')
+        meeting = Meeting.objects.get(mid='10001')
+        self.assertEqual((meeting.start_at, meeting.end_at), (self.start_at, self.end_at))
+        # backfill_meeting_times执行前的历史数据
+        Meeting.objects.filter(mid='10001').update(start_at=None, end_at=None)
+        self.assertEqual(busy_hosts(self.start_at, self.end_at), {'h1'})
+        self.assertEqual(busy_hosts(self.start_at, self.end_at, exclude_mid='10001'), set())
+        later = self.end_at + datetime.timedelta(hours=1)
+        self.assertEqual(busy_hosts(later, later + datetime.timedelta(hours=1)), set())
+        self.assertEqual(HostAvailabilityIndex().free_hosts('zoom', self.start_at, self.end_at), ['h2'])
+
+
+# 并发预定依赖host行锁，SQLite不支持select_for_update
+@skipUnlessDBFeature('has_select_for_update')
+@override_settings(CACHES=NO_CACHE, OPENGAUSS_MEETING_HOSTS={'zoom': {'h1': 'host1', 'h2': 'host2', 'h3': 'host3'}})
+class BookingConcurrencyTest(TransactionTestCase):
+    BOOKINGS = 100
+    WORKERS = 20
+    # 模拟会议平台的耗时及失败率
+    LATENCY = 0.05
+    FAILURE_RATE = 0.05
+
+    def setUp(self):
+        self.user = User.objects.create(gid=1, gitee_id='u', name='u', avatar='avatar', email='u@example.com')
+        self.group = Group.objects.create(name='Infra', members='[]')
+        self.index = HostAvailabilityIndex()
+        self.counter = itertools.count(10001)
+        self.lock = threading.Lock()
+        day = datetime.datetime.combine(datetime.date.today() + datetime.timedelta(days=13), datetime.time(8))
+        # 相互重叠的时段
+        self.slots = [(day + datetime.timedelta(minutes=20 * x), day + datetime.timedelta(minutes=20 * x + 60))
+                      for x in range(4)]
+
+    def create_meeting(self, host_id):
+        """模拟会议平台创建会议"""
+        time.sleep(self.LATENCY)
+        if random.random() < self.FAILURE_RATE:
+            return 500, {}
+        with self.lock:
+            mid = str(next(self.counter))
+        return 201, {'mid': mid, 'host_id': host_id}
+
+    def book(self, _):
+        start_at, end_at = random.choice(self.slots)
+        try:
+            available_host_id = self.index.free_hosts('zoom', start_at, end_at)
+            if not available_host_id:
+                return 'conflict'
+            host_id = self.index.select_host('zoom', available_host_id)
+            candidates = [host_id] + [x for x in available_host_id if x != host_id]
+            reservation = reserve_any_host('zoom', candidates, start_at, end_at)
+            if not reservation:
+                return 'conflict'
+            status, content = self.create_meeting(reservation.host_id)
+            if status != 201:
+                release_host(reservation)
+                return 'failed'
+            Meeting.objects.create(mid=content['mid'], topic='topic', sponsor='u', group_name='Infra',
+                                   date=start_at.strftime('%Y-%m-%d'), start=start_at.strftime('%H:%M'),
+                                   end=end_at.strftime('%H:%M'), start_at=start_at, end_at=end_at,
+                                   host_id=content['host_id'], user=self.user, group=self.group)
+            release_host(reservation)
+            self.index.add(content['mid'], content['host_id'], start_at, end_at)
+            return 'booked'
+        finally:
+            close_old_connections()
+
+    def test_no_double_booking(self):
+        pool = ThreadPool(self.WORKERS)
+        try:
+            results = pool.map(self.book, range(self.BOOKINGS))
+        finally:
+            pool.close()
+            pool.join()
+        self.assertTrue(results.count('booked'))
+        self.assertFalse(HostReservation.objects.exists())
+        bookings = {}
+        for mid, host_id, start_at, end_at in Meeting.objects.values_list('mid', 'host_id', 'start_at', 'end_at'):
+            bookings.setdefault(host_id, []).append((start_at, end_at, mid))
+        for host_id, host_bookings in bookings.items():
+            host_bookings.sort()
+            for previous, current in zip(host_bookings, host_bookings[1:]):
+                self.assertLessEqual(previous[1], get_search_window(current[0], current[1])[0],
+                                     'host {} is double-booked by {} and {}'.format(host_id, previous[2], current[2]))
+
+
+class FakeSMTP(object):
+    """模拟SMTP连接，errors中依次取出每次sendmail抛出的异常"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.sent = []
+
+    def sendmail(self, sender, toaddrs, msg):
+        error = self.errors.pop(0) if self.errors else None
+        if error:
+            raise error
+        self.sent.append(toaddrs)
+
+    def quit(self):
+        pass
+
+
+@override_settings(MAIL_OUTBOX_MAX_ATTEMPTS=3, MAIL_OUTBOX_RETRY_DELAY=60, MAIL_OUTBOX_CLAIM_TIMEOUT=600)
+class MailOutboxTest(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(mail_outbox, 'build_message', lambda outbox: ('s', ['to@example.com'], mock.Mock()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def enqueue(sequence=0):
+        return mail_outbox.enqueue('invite', {'mid': '123', 'sequence': sequence}, 'cloud')
+
+    @staticmethod
+    def make_due():
+        MailOutbox.objects.update(next_attempt_time=datetime.datetime.now() - datetime.timedelta(seconds=1))
+
+    def test_retry_with_backoff(self):
+        outbox = self.enqueue()
+        delays = []
+        with mock.patch.object(mail_outbox, 'connect', side_effect=OSError('connection refused')):
+            for _ in range(3):
+                self.make_due()
+                before = datetime.datetime.now()
+                self.assertEqual(mail_outbox.deliver(mail_outbox.claim(10)), (0, 1))
+                outbox.refresh_from_db()
+                delays.append(round((outbox.next_attempt_time - before).total_seconds()))
+                # 退避时间未到时不会被再次领取
+                self.assertEqual(mail_outbox.claim(10), [])
+        self.assertEqual(delays, [60, 120, 240])
+        self.assertEqual((outbox.status, outbox.attempts), (mail_outbox.FAILED, 3))
+        self.assertIn('connection refused', outbox.last_error)
+        self.make_due()
+        self.assertEqual(mail_outbox.claim(10), [])
+
+    def test_reconnect_and_partial_failure(self):
+        for sequence in range(3):
+            self.enqueue(sequence)
+        # 第一封邮件发送时连接断开，重连后第二封邮件被拒收
+        servers = [FakeSMTP([smtplib.SMTPServerDisconnected('gone')]),
+                   FakeSMTP([None, smtplib.SMTPRecipientsRefused({})])]
+        with mock.patch.object(mail_outbox, 'connect', side_effect=servers):
+            self.assertEqual(mail_outbox.deliver(mail_outbox.claim(10)), (2, 1))
+        self.assertEqual(len(servers[1].sent), 2)
+        self.assertEqual(list(MailOutbox.objects.order_by('sequence').values_list('status', 'attempts')),
+                         [(mail_outbox.SENT, 1), (mail_outbox.PENDING, 1), (mail_outbox.SENT, 1)])
+
+    def test_reclaim_interrupted(self):
+        self.enqueue()
+        self.assertEqual(len(mail_outbox.claim(10)), 1)
+        self.assertEqual(mail_outbox.claim(10), [])
+        # 发送中超过MAIL_OUTBOX_CLAIM_TIMEOUT的邮件视为发送中断
+        MailOutbox.objects.update(claim_time=datetime.datetime.now() - datetime.timedelta(seconds=601))
+        self.assertEqual(len(mail_outbox.claim(10)), 1)
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size):
+        for index in range(0, len(self.body), 4000):
+            yield self.body[index:index + 4000]
+
+    def close(self):
+        pass
+
+
+class FakeServer(object):
+    """模拟支持Range的下载地址，fail中的分片起始位置返回503"""
+
+    def __init__(self, data, support_range=True):
+        self.data = data
+        self.support_range = support_range
+        self.fail = set()
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False, **kwargs):
+        headers = headers or {}
+        self.requests.append(headers.get('Range'))
+        if not headers.get('Range') or not self.support_range:
+            return FakeResponse(200, self.data, {'Content-Length': str(len(self.data))})
+        start, end = headers['Range'][len('bytes='):].split('-')
+        start, end = int(start), int(end) if end else len(self.data) - 1
+        if start in self.fail:
+            return FakeResponse(503)
+        return FakeResponse(206, self.data[start:end + 1],
+                            {'Content-Range': 'bytes {}-{}/{}'.format(start, end, len(self.data))})
+
+
+class DownloaderTest(TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(100003)
+        self.server = FakeServer(self.data)
+        patcher = mock.patch.object(downloader.http_client, 'get', self.server.get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir)
+        self.filename = os.path.join(self.workdir, 'recording.mp4')
+
+    def download(self, **kwargs):
+        return downloader.download('https://example.com/recording', self.filename, segment_size=10000, workers=3,
+                                   **kwargs)
+
+    def read(self):
+        with open(self.filename, 'rb') as f:
+            return f.read()
+
+    def test_parallel_segments(self):
+        stats = self.download(total_size=len(self.data), md5=hashlib.md5(self.data).hexdigest())
+        self.assertEqual(stats['size'], len(self.data))
+        self.assertEqual(self.read(), self.data)
+        self.assertEqual(os.listdir(self.workdir), ['recording.mp4'])
+        # 已下载完成的文件只探测大小，不再下载
+        self.server.requests = []
+        self.assertEqual(self.download(total_size=len(self.data))['downloaded'], 0)
+        self.assertEqual(self.server.requests, ['bytes=0-0'])
+
+    def test_resume(self):
+        self.server.fail = {30000, 70000}
+        self.assertIsNone(self.download())
+        self.assertTrue(os.path.exists(self.filename + '.part'))
+        self.assertTrue(os.path.exists(self.filename + '.state'))
+        self.server.fail = set()
+        self.server.requests = []
+        # 只重新下载失败的两个分片
+        self.assertEqual(self.download()['downloaded'], 20000)
+        self.assertEqual(sorted(self.server.requests[1:]), ['bytes=30000-39999', 'bytes=70000-79999'])
+        self.assertEqual(self.read(), self.data)
+        self.assertEqual(os.listdir(self.workdir), ['recording.mp4'])
+
+    def test_verify(self):
+        self.assertIsNone(self.download(md5='0' * 32))
+        self.assertEqual(os.listdir(self.workdir), [])
+        self.assertIsNone(self.download(total_size=len(self.data) + 1))
+
+    def test_without_range(self):
+        self.server.support_range = False
+        self.assertEqual(self.download(total_size=len(self.data))['downloaded'], len(self.data))
+        self.assertEqual(self.read(), self.data)
+
+
+def obs_response(status, body=None):
+    return {'status': status, 'body': body, 'errorMessage': 'error'}
+
+
+class FakeObsClient(object):
+    """模拟OBS分段上传，fail_part指定的分段上传时抛出异常"""
+
+    def __init__(self):
+        self.uploads = {}
+        self.objects = {}
+        self.count = 0
+        self.fail_part = None
+        self.uploaded_parts = []
+
+    def initiateMultipartUpload(self, bucketName, objectKey, metadata=None):
+        self.count += 1
+        upload_id = 'upload{}'.format(self.count)
+        self.uploads[upload_id] = {}
+        return obs_response(200, {'uploadId': upload_id})
+
+    def uploadPart(self, bucketName, objectKey, partNumber, uploadId, content=None):
+        if partNumber == self.fail_part:
+            raise ConnectionError('connection reset')
+        self.uploads[uploadId][partNumber] = content
+        self.uploaded_parts.append(partNumber)
+        return obs_response(200, {'etag': 'etag{}'.format(partNumber)})
+
+    def listParts(self, bucketName, objectKey, uploadId, partNumberMarker=None):
+        if uploadId not in self.uploads:
+            return obs_response(404)
+        parts = [{'partNumber': number, 'etag': 'etag{}'.format(number), 'size': len(content)}
+                 for number, content in self.uploads[uploadId].items()]
+        return obs_response(200, {'parts': parts, 'isTruncated': False})
+
+    def completeMultipartUpload(self, bucketName, objectKey, uploadId, request):
+        parts = self.uploads.pop(uploadId)
+        self.objects[objectKey] = b''.join(parts[x['partNum']] for x in request['parts'])
+        return obs_response(200)
+
+    def abortMultipartUpload(self, bucketName, objectKey, uploadId):
+        self.uploads.pop(uploadId, None)
+        return obs_response(204)
+
+
+class StreamUploadTest(TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(25007)
+        self.server = FakeServer(self.data)
+        patcher = mock.patch.object(obs_stream.http_client, 'get', self.server.get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.obs_client = FakeObsClient()
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        self.checkpoint_file = os.path.join(workdir, 'stream.checkpoint')
+
+    def upload(self, total_size=None):
+        return obs_stream.stream_upload(self.obs_client, 'bucket', 'recording.mp4', 'https://example.com/recording',
+                                        total_size or len(self.data), self.checkpoint_file, part_size=4096)
+
+    def test_upload(self):
+        self.assertTrue(self.upload())
+        self.assertEqual(self.obs_client.objects['recording.mp4'], self.data)
+        self.assertFalse(os.path.exists(self.checkpoint_file))
+
+    def test_resume_after_transfer_error(self):
+        self.obs_client.fail_part = 4
+        self.assertFalse(self.upload())
+        # 保留分段上传任务及断点，下次从第4段继续
+        self.assertTrue(os.path.exists(self.checkpoint_file))
+        self.assertEqual(len(self.obs_client.uploads), 1)
+        self.obs_client.fail_part = None
+        self.obs_client.uploaded_parts = []
+        self.server.requests = []
+        self.assertTrue(self.upload())
+        self.assertEqual(self.server.requests, ['bytes={}-'.format(3 * 4096)])
+        self.assertEqual(self.obs_client.uploaded_parts, [4, 5, 6, 7])
+        self.assertEqual(self.obs_client.objects['recording.mp4'], self.data)
+        self.assertFalse(os.path.exists(self.checkpoint_file))
+
+    def test_resume_without_range(self):
+        self.obs_client.fail_part = 3
+        self.assertFalse(self.upload())
+        self.server.support_range = False
+        self.obs_client.fail_part = None
+        self.assertTrue(self.upload())
+        self.assertEqual(self.obs_client.objects['recording.mp4'], self.data)
+
+    def test_size_mismatch(self):
+        self.assertFalse(self.upload(len(self.data) + 1))
+        # 已上传的分段不可用，取消分段上传任务
+        self.assertEqual(self.obs_client.uploads, {})
+        self.assertFalse(os.path.exists(self.checkpoint_file))
+
+    def test_checkpoint_mismatch(self):
+        self.obs_client.fail_part = 2
+        self.assertFalse(self.upload())
+        self.obs_client.fail_part = None
+        self.data = self.server.data = os.urandom(30011)
+        self.assertTrue(self.upload())
+        self.assertEqual(self.obs_client.uploads, {})
+        self.assertEqual(self.obs_client.objects['recording.mp4'], self.data)
+
+    def test_upload_vanished(self):
+        self.obs_client.fail_part = 2
+        self.assertFalse(self.upload())
+        self.obs_client.uploads.clear()
+        self.obs_client.fail_part = None
+        self.assertTrue(self.upload())
+        self.assertEqual(self.obs_client.objects['recording.mp4'], self.data)
+
+
+class FakeRecordingObsClient(object):
+    """模拟handle_recordings使用的OBS接口，fail_covers中的会议上传封面失败"""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = []
+        self.fail_covers = set()
+
+    def listObjects(self, bucketName, prefix=None, marker=None, max_keys=None):
+        contents = [{'key': key, 'size': size} for key, size in sorted(self.objects.items())
+                    if key.startswith(prefix or '')]
+        return obs_response(200, {'contents': contents, 'is_truncated': False, 'next_marker': None})
+
+    def uploadFile(self, bucketName, objectKey, uploadFile, **kwargs):
+        if objectKey.endswith('.png') and objectKey.split('/')[-2] in self.fail_covers:
+            return obs_response(500)
+        self.uploads.append(objectKey)
+        self.objects[objectKey] = os.path.getsize(uploadFile)
+        return obs_response(200)
+
+
+class HandleRecordingsTestCase(TransactionTestCase):
+    """handle_recordings的测试基类：会议平台、OBS、下载及封面均为模拟，各阶段在独立线程中访问数据库"""
+    SIZE = 20 * 1024 * 1024
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir)
+        self.obs_client = FakeRecordingObsClient()
+        self.zoom_calls = []
+        self.downloads = []
+        self.covers = []
+        patchers = [
+            mock.patch.object(handle_recordings.tempfile, 'gettempdir', return_value=self.workdir),
+            mock.patch.object(handle_recordings.RecordingContext, 'create',
+                              side_effect=lambda transfer_mode: handle_recordings.RecordingContext(
+                                  self.obs_client, 'bucket', 'obs.example.com', transfer_mode)),
+            mock.patch.object(handle_recordings, 'listZoomRecordings', side_effect=self.list_recordings),
+            mock.patch.object(handle_recordings, 'download_recordings', side_effect=self.download),
+            mock.patch.object(handle_recordings.cover_renderer, 'load'),
+            mock.patch.object(handle_recordings.cover_renderer, 'save', side_effect=self.render_cover),
+            mock.patch.object(handle_recordings.participants, 'get_participants',
+                              return_value=(200, {'total_records': 1, 'participants': [{'name': 'u'}]})),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create(gid=1, gitee_id='u', name='u', avatar='avatar', email='u@example.com')
+        self.group = Group.objects.create(name='Infra', members='[]')
+        self.today = datetime.date.today().strftime('%Y-%m-%d')
+        self.start = datetime.datetime.now().replace(hour=2, minute=0, second=0, microsecond=0)
+        self.mids = []
+
+    def create_meeting(self, mid):
+        Meeting.objects.create(topic='topic', sponsor='u', group_name='Infra', mid=mid, user=self.user,
+                               group=self.group, date=self.today, start='10:00', end='11:00', host_id='host')
+        Video.objects.create(mid=mid, topic='topic', group_name='Infra')
+        self.mids.append(mid)
+
+    def object_key(self, mid, extension='mp4'):
+        return 'opengauss/Infra/{}/{}/{}.{}'.format(self.start.strftime('%b').lower(), mid, mid, extension)
+
+    def list_recordings(self, host_id, start_date):
+        self.zoom_calls.append(host_id)
+        recording_file = {
+            'file_extension': 'MP4',
+            'file_size': self.SIZE,
+            'recording_start': self.start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'recording_end': (self.start + datetime.timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'download_url': 'https://zoom.example.com/download'
+        }
+        return 200, [{'id': int(mid), 'total_size': self.SIZE, 'recording_files': [recording_file]}
+                     for mid in self.mids]
+
+    def download(self, url, filename, total_size=None):
+        self.downloads.append(filename)
+        with open(filename, 'wb') as f:
+            f.truncate(self.SIZE)
+        return {}
+
+    def render_cover(self, path, *args):
+        self.covers.append(path)
+        with open(path, 'wb') as f:
+            f.write(b'png')
+
+    @staticmethod
+    def run_command():
+        call_command('handle_recordings', transfer_mode='staged', discover_workers=1, download_workers=1,
+                     cover_workers=1, upload_workers=1)
+
+    @staticmethod
+    def jobs():
+        return list(RecordingJob.objects.order_by('object_key').values_list('object_key', 'status', 'attempts'))
+
+
+class RecordingJobTest(HandleRecordingsTestCase):
+
+    def test_resume_from_uploaded(self):
+        self.create_meeting('1001')
+        self.obs_client.fail_covers.add('1001')
+        self.run_command()
+        job = RecordingJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (recording_jobs.UPLOADED, 1))
+        self.assertIn('fail to upload cover', job.last_error)
+        self.assertIsNone(Video.objects.get(mid='1001').total_size)
+        # 视频已上传，下次运行不再查询会议平台及下载，只上传封面并更新数据库
+        self.obs_client.fail_covers.clear()
+        self.zoom_calls, self.downloads, self.obs_client.uploads = [], [], []
+        self.run_command()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (recording_jobs.PUBLISHED, 2, None))
+        self.assertIsNotNone(job.finish_time)
+        self.assertEqual((self.zoom_calls, self.downloads), ([], []))
+        self.assertEqual(self.obs_client.uploads, [self.object_key('1001', 'png')])
+        self.assertEqual(Video.objects.get(mid='1001').total_size, self.SIZE)
+        self.assertEqual(Record.objects.get(mid='1001', platform='obs').url,
+                         'https://bucket.obs.example.com/' + self.object_key('1001'))
+        # 已发布的会议不再处理
+        self.run_command()
+        self.assertEqual(self.zoom_calls, [])
+        self.assertEqual(self.jobs(), [(self.object_key('1001'), recording_jobs.PUBLISHED, 2)])
+
+    @override_settings(RECORDING_JOB_MAX_ATTEMPTS=2)
+    def test_exhausted(self):
+        self.create_meeting('1001')
+        self.obs_client.fail_covers.add('1001')
+        for _ in range(3):
+            self.run_command()
+        self.assertEqual(self.jobs(), [(self.object_key('1001'), recording_jobs.UPLOADED, 2)])
+        self.assertEqual(recording_jobs.backlog()['exhausted'], 1)
+        self.assertEqual(recording_jobs.unfinished_mids(), set())
+
+    def test_independent_meetings(self):
+        self.create_meeting('1001')
+        self.create_meeting('1002')
+        self.obs_client.fail_covers.add('1002')
+        self.run_command()
+        self.assertEqual(self.jobs(), [(self.object_key('1001'), recording_jobs.PUBLISHED, 1),
+                                       (self.object_key('1002'), recording_jobs.UPLOADED, 1)])
+        self.assertEqual(recording_jobs.finished_mids(['1001', '1002']), {'1001'})
+
+
+class PipelineTest(TestCase):
+
+    def test_run(self):
+        def double(item):
+            if item == 3:
+                raise ValueError(item)
+            return [item * 2]
+
+        results = []
+        stages = [Stage('double', double, 2), Stage('collect', lambda item: results.append(item), 1)]
+        stats = Pipeline(stages).run(range(5))
+        self.assertEqual(sorted(results), [0, 2, 4, 8])
+        self.assertEqual([(x['stage'], x['processed'], x['errors']) for x in stats],
+                         [('double', 5, 1), ('collect', 4, 0)])
+
+
+class RecordingPipelineTest(HandleRecordingsTestCase):
+
+    def test_existing_object_skipped(self):
+        self.create_meeting('1001')
+        self.obs_client.objects[self.object_key('1001')] = self.SIZE
+        self.run_command()
+        self.assertEqual(self.jobs(), [(self.object_key('1001'), recording_jobs.PUBLISHED, 0)])
+        self.assertEqual((self.downloads, self.covers, self.obs_client.uploads), ([], [], []))
+        self.assertEqual(recording_jobs.unfinished_mids(), set())
+
+    def test_finish_once(self):
+        self.create_meeting('1001')
+        with mock.patch.object(handle_recordings, 'update_meeting', side_effect=RuntimeError('db error')) as update:
+            self.run_command()
+        self.assertEqual(update.call_count, 1)
+        job = RecordingJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (recording_jobs.COVER_DONE, 1))
+        self.assertIn('db error', job.last_error)
+        self.run_command()
+        self.assertEqual(self.jobs(), [(self.object_key('1001'), recording_jobs.PUBLISHED, 2)])
+        self.assertEqual(Video.objects.get(mid='1001').total_size, self.SIZE)
+
+    def test_meeting_context(self):
+        recordings = []
+        for job_id in (1, 1, 2):
+            recording = handle_recordings.Recording('1001', 'zoom', '1001.mp4', 'Infra', 'oct')
+            recording.job_id = job_id
+            recordings.append(recording)
+        meeting = handle_recordings.MeetingContext('1001', 'zoom', recordings)
+        self.assertEqual(meeting.recordings, [recordings[0], recordings[2]])
+        self.assertIsNone(meeting.finish(recordings[0], True))
+        self.assertIsNone(meeting.finish(recordings[0], False))
+        self.assertEqual(meeting.remaining, 1)
+        self.assertEqual(meeting.finish(recordings[2], False), [recordings[0]])
+
+
+class SyncSigsTest(TestCase):
+
+    def test_removed_sig(self):
+        sync_sigs.Command.apply({'Infra': ['a', 'b'], 'Old': ['c']})
+        old = Group.objects.get(name='Old')
+        # 只读取了部分sig组时不影响其他sig组
+        self.assertEqual(sync_sigs.Command.apply({'Infra': ['a', 'b', 'd']}), {'Infra': ({'d'}, set())})
+        self.assertTrue(is_member('c', old.id))
+        changes = sync_sigs.Command.apply({'Infra': ['a', 'b', 'd']}, prune=True)
+        self.assertEqual(changes, {'Old': (set(), {'c'})})
+        self.assertFalse(is_member('c', old.id))
+        self.assertEqual(Group.objects.get(name='Old').members, '[]')
+        self.assertEqual(sorted(GroupMember.objects.values_list('gitee_id', flat=True)), ['a', 'b', 'd'])
+
+
+class IsMemberTest(TestCase):
+
+    def test_legacy_members(self):
+        group = Group.objects.create(name='Infra', members="['alice', 'bob']")
+        self.assertTrue(is_member('alice', group.id))
+        self.assertFalse(is_member('ali', group.id))
+        GroupMember.objects.create(group=group, gitee_id='bob')
+        self.assertFalse(is_member('alice', group.id))
+        self.assertTrue(is_member('bob', group.id))
+        invalid = Group.objects.create(name='Invalid', members='alice')
+        self.assertFalse(is_member('alice', invalid.id))
+
+
+class MaillistMappingTest(TestCase):
+
+    def setUp(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        self.path = os.path.join(workdir, 'data', 'maillist_mapping.yaml')
+        patcher = override_settings(MAILLIST_MAPPING_PATH=self.path, MAILLIST_MAPPING_TTL=3600)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.mtime = time.time()
+
+    def publish(self, content):
+        # 连续写入的修改时间可能相同，测试中显式设置
+        result = maillist.publish(content)
+        self.mtime += 1
+        os.utime(self.path, (self.mtime, self.mtime))
+        return result
+
+    def test_reload_after_publish(self):
+        self.assertTrue(self.publish('Infra: infra@example.com\n'))
+        worker = maillist.MaillistMapping()
+        self.assertEqual(worker.get(), {'Infra': 'infra@example.com'})
+        # sync_sigs在其他进程中写入本地副本，worker在文件变化后重新加载
+        self.assertTrue(self.publish('Infra: infra@example.com\nTC: tc@example.com\n'))
+        self.assertEqual(worker.get(), {'Infra': 'infra@example.com', 'TC': 'tc@example.com'})
+        self.assertFalse(self.publish('- infra@example.com\n'))
+        self.assertEqual(worker.get(), {'Infra': 'infra@example.com', 'TC': 'tc@example.com'})
+        with open(self.path, 'w') as f:
+            f.write('Infra: [')
+        os.utime(self.path, (self.mtime + 1, self.mtime + 1))
+        self.assertEqual(worker.get(), {'Infra': 'infra@example.com', 'TC': 'tc@example.com'})
+        self.assertFalse(worker.refreshing)
+
+
+class CoverRenderTest(TestCase):
+
+    def test_font_not_found(self):
+        with mock.patch.object(cover_render, 'FONT_PATHS', []):
+            self.assertRaises(cover_render.FontNotFound, cover_render.CoverRenderer().load)
+
+    @unittest.skipUnless(cover_render.find_font(), 'simsun.ttc is not installed')
+    def test_render(self):
+        image = cover_render.CoverRenderer().render('openGauss 基础设施SIG例会', 'Infra', '2021-01-01', '10:00',
+                                                    '11:00')
+        with Image.open(cover_render.COVER_BACKGROUND) as background:
+            self.assertEqual(image.size, background.size)
+        self.assertEqual(image.mode, 'RGB')
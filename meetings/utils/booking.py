@@ -0,0 +1,48 @@
+import datetime
+import logging
+from django.conf import settings
+from django.db import transaction
+from meetings.models import Host, HostReservation
+from meetings.utils.schedule import MAX_DURATION, busy_hosts, get_search_window
+
+logger = logging.getLogger('log')
+
+
+def reserve_host(platform, host_id, start_at, end_at, mid=None):
+    """
+    锁定host行并检查冲突，无冲突时预留该时段
+    :param platform: 会议平台
+    :param host_id: host_id
+    :param start_at: 会议开始时刻
+    :param end_at: 会议结束时刻
+    :param mid: 修改会议时为会议ID，冲突检测时排除会议自身
+    :return: HostReservation的实例，冲突时返回None
+    """
+    expire_time = datetime.datetime.now() - datetime.timedelta(seconds=settings.HOST_RESERVATION_TTL)
+    Host.objects.get_or_create(host_id=host_id, defaults={'platform': platform})
+    HostReservation.objects.filter(host_id=host_id, create_time__lt=expire_time).delete()
+    search_start, search_end = get_search_window(start_at, end_at)
+    with transaction.atomic():
+        Host.objects.select_for_update().get(host_id=host_id)
+        if busy_hosts(start_at, end_at, host_id=host_id, exclude_mid=mid):
+            return None
+        if HostReservation.objects.filter(host_id=host_id, start_at__gt=search_start - MAX_DURATION,
+                                          start_at__lt=search_end, end_at__gt=search_start,
+                                          create_time__gte=expire_time):
+            return None
+        return HostReservation.objects.create(host_id=host_id, start_at=start_at, end_at=end_at, mid=mid)
+
+
+def reserve_any_host(platform, host_ids, start_at, end_at):
+    """按顺序尝试预留host_ids中的host，返回第一个预留成功的HostReservation或None"""
+    for host_id in host_ids:
+        reservation = reserve_host(platform, host_id, start_at, end_at)
+        if reservation:
+            return reservation
+        logger.info('host {} was taken by a concurrent booking'.format(host_id))
+    return None
+
+
+def release_host(reservation):
+    """会议已写入数据库或调用会议平台失败后释放预留"""
+    HostReservation.objects.filter(id=reservation.id).delete()
@@ -0,0 +1,124 @@
+import datetime
+import hashlib
+import json
+import logging
+import math
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from meetings.models import CalendarVersion, Meeting, Record, User
+
+logger = logging.getLogger('log')
+
+
+def get_record_map(mids):
+    """
+    一次查询出所有会议的录像信息
+    :param mids: 会议ID列表
+    :return: {mid: {'record': bool, 'video_url': str}}
+    """
+    record_map = {}
+    for record in Record.objects.filter(mid__in=mids).order_by('id').values('mid', 'platform', 'url'):
+        item = record_map.setdefault(record['mid'], {'record': True})
+        if record['platform'] == 'bilibili' and 'video_url' not in item:
+            item['video_url'] = record['url']
+    return record_map
+
+
+def get_avatar_map(meetings):
+    """
+    一次查询出所有会议发起人的头像，发起人不存在的会议记录错误日志
+    :return: {user_id: avatar}
+    """
+    user_ids = {meeting.user_id for meeting in meetings}
+    avatar_map = dict(User.objects.filter(id__in=user_ids).values_list('id', 'avatar'))
+    for meeting in meetings:
+        if meeting.user_id not in avatar_map:
+            logger.error('meeting {}: user {} does not exist'.format(meeting.mid, meeting.user_id))
+    return avatar_map
+
+
+def build_time_data(meeting, record_map, avatar_map):
+    """生成日历中单个会议的数据，发起人不存在时头像为空"""
+    records = record_map.get(meeting.mid, {})
+    return {
+        'id': meeting.id,
+        'mid': meeting.mid,
+        'group_name': meeting.group_name,
+        'startTime': meeting.start,
+        'endTime': meeting.end,
+        'duration': math.ceil(float(meeting.end.replace(':', '.'))) - math.floor(
+            float(meeting.start.replace(':', '.'))),
+        'duration_time': meeting.start.split(':')[0] + ':00' + '-' + str(
+            math.ceil(float(meeting.end.replace(':', '.')))) + ':00',
+        'name': meeting.topic,
+        'creator': meeting.sponsor,
+        'detail': meeting.agenda,
+        'url': avatar_map.get(meeting.user_id, ''),
+        'join_url': meeting.join_url,
+        'meeting_id': meeting.mid,
+        'etherpad': meeting.etherpad,
+        'record': records.get('record', False),
+        'platform': meeting.mplatform,
+        'video_url': records.get('video_url', '')
+    }
+
+
+def build_table_data(meetings, dates=None):
+    """
+    单次查询生成日历数据
+    :param meetings: 时间窗口内会议的queryset
+    :param dates: 需要展示的日期集合，默认为会议所在的所有日期
+    :return: tableData
+    """
+    meetings = list(meetings.order_by('id'))
+    record_map = get_record_map([meeting.mid for meeting in meetings])
+    avatar_map = get_avatar_map(meetings)
+    date_map = {}
+    for meeting in meetings:
+        if dates is not None and meeting.date not in dates:
+            continue
+        date_map.setdefault(meeting.date, []).append(build_time_data(meeting, record_map, avatar_map))
+    return [{'date': date, 'timeData': date_map[date]} for date in sorted(date_map.keys())]
+
+
+def get_calendar_window():
+    """日历展示的时间窗口：过去30天至未来14天"""
+    now = datetime.datetime.now()
+    return (now - datetime.timedelta(days=30)).strftime('%Y-%m-%d'), \
+        (now + datetime.timedelta(days=14)).strftime('%Y-%m-%d')
+
+
+def get_calendar_version():
+    """版本保存在数据库中，其他进程及管理命令的变更对所有进程可见"""
+    version = CalendarVersion.objects.filter(id=1).values_list('version', flat=True).first()
+    return version or 0
+
+
+def invalidate_calendar():
+    """会议或录像发生变更后调用，使所有日历快照失效"""
+    if CalendarVersion.objects.filter(id=1).update(version=F('version') + 1):
+        return
+    _, created = CalendarVersion.objects.get_or_create(id=1, defaults={'version': 1})
+    if not created:
+        CalendarVersion.objects.filter(id=1).update(version=F('version') + 1)
+
+
+def get_calendar_snapshot(group_name=None):
+    """
+    获取日历快照，缓存未命中时重新生成
+    :param group_name: sig组名，为空时返回所有sig组的日历
+    :return: (etag, tableData)
+    """
+    date_start, date_end = get_calendar_window()
+    key = 'meetingsdata:{}:{}:{}'.format(get_calendar_version(), date_start, group_name or '')
+    snapshot = cache.get(key)
+    if snapshot is None:
+        meetings = Meeting.objects.filter(is_delete=0, date__gte=date_start, date__lte=date_end)
+        if group_name:
+            meetings = meetings.filter(group_name=group_name)
+        table_data = build_table_data(meetings)
+        etag = '"{}"'.format(hashlib.md5(json.dumps(table_data, sort_keys=True).encode('utf-8')).hexdigest())
+        snapshot = (etag, table_data)
+        cache.set(key, snapshot, settings.CALENDAR_CACHE_TIMEOUT)
+    return snapshot
@@ -0,0 +1,107 @@
+import logging
+import os
+import threading
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger('log')
+
+COVER_BACKGROUND = os.path.join(settings.BASE_DIR, 'meetings', 'images', 'cover.png')
+# 镜像中字体被复制到/usr/share/fonts
+FONT_PATHS = [
+    os.path.join(settings.BASE_DIR, 'deploy', 'fonts', 'simsun.ttc'),
+    '/usr/share/fonts/simsun.ttc'
+]
+# 与html_template.cover_content的排版一致：(字号, 上边距, 下边距, 是否加粗)，每行水平居中
+LAYOUT = [
+    (100, 150, 100, True),
+    (80, 0, 0, False),
+    (60, 0, 0, False),
+]
+TEXT_COLOR = (255, 255, 255)
+
+
+class FontNotFound(Exception):
+    """没有可用的中文字体，默认字体无法绘制中文"""
+
+
+def find_font():
+    for path in FONT_PATHS:
+        if os.path.exists(path):
+            return path
+
+
+class CoverRenderer(object):
+    """
+    在进程内绘制录像封面，背景图及字体只加载一次
+    FreeType字体对象不能被多个线程同时使用，绘制文字时加锁
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.background = None
+        self.fonts = {}
+
+    def load(self):
+        """
+        :raise FontNotFound: 没有找到中文字体
+        """
+        if self.background is not None:
+            return
+        with self.lock:
+            if self.background is not None:
+                return
+            font_path = find_font()
+            if not font_path:
+                raise FontNotFound('simsun.ttc not found in {}'.format(FONT_PATHS))
+            fonts = {size: ImageFont.truetype(font_path, size) for size, _, _, _ in LAYOUT}
+            background = Image.open(COVER_BACKGROUND)
+            background.load()
+            self.fonts = fonts
+            self.background = background
+
+    @staticmethod
+    def wrap(draw, text, font, width):
+        """按宽度折行，优先在空格处断开"""
+        lines = []
+        line = ''
+        for char in text:
+            if draw.textlength(line + char, font=font) <= width or not line:
+                line += char
+                continue
+            if ' ' in line and char != ' ':
+                line, rest = line.rsplit(' ', 1)
+                lines.append(line)
+                line = rest + char
+            else:
+                lines.append(line)
+                line = char.lstrip()
+        lines.append(line)
+        return lines
+
+    def render(self, topic, group_name, date, start_time, end_time):
+        """
+        :return: 封面图片
+        """
+        self.load()
+        image = self.background.copy()
+        texts = [topic, 'SIG: {}'.format(group_name), 'Time: {} {}-{}'.format(date, start_time, end_time)]
+        with self.lock:
+            draw = ImageDraw.Draw(image)
+            y = 0
+            for text, (size, margin_top, margin_bottom, bold) in zip(texts, LAYOUT):
+                font = self.fonts[size]
+                line_height = sum(font.getmetrics())
+                y += margin_top
+                for line in self.wrap(draw, text, font, image.width):
+                    draw.text((image.width / 2, y + line_height / 2), line, font=font, fill=TEXT_COLOR, anchor='mm',
+                              stroke_width=2 if bold else 0, stroke_fill=TEXT_COLOR)
+                    y += line_height
+                y += margin_bottom
+        return image.convert('RGB')
+
+    def save(self, path, topic, group_name, date, start_time, end_time):
+        self.render(topic, group_name, date, start_time, end_time).save(path, 'PNG')
+
+
+cover_renderer = CoverRenderer()
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import stat
+import threading
+import time
+from contextlib import closing
+from multiprocessing.dummy import Pool as ThreadPool
+from django.conf import settings
+from meetings.utils import http_client
+
+logger = logging.getLogger('log')
+
+# 每次从下载流中读取的大小
+CHUNK_SIZE = 1024 * 1024
+# 单个分片下载失败后的重试次数
+SEGMENT_RETRIES = 2
+
+
+class Download(object):
+    """
+    一个下载任务：支持Range时按segment_size分片并行下载，已完成的分片记录在状态文件中，中断后可继续
+    下载中的数据写入filename.part，校验通过后才重命名为filename
+    """
+
+    def __init__(self, url, filename, headers=None, workers=None, segment_size=None):
+        self.url = url
+        self.filename = filename
+        self.headers = headers or {}
+        self.workers = workers or settings.DOWNLOAD_WORKERS
+        self.segment_size = segment_size or settings.DOWNLOAD_SEGMENT_SIZE
+        self.part_file = filename + '.part'
+        self.state_file = filename + '.state'
+        self.lock = threading.Lock()
+        self.total_size = None
+        self.done = set()
+        self.downloaded = 0
+
+    def get(self, headers=None):
+        return http_client.get(self.url, headers=dict(self.headers, **(headers or {})), stream=True)
+
+    def probe(self):
+        """
+        请求第一个字节获取文件大小并判断是否支持Range
+        :return: 不支持Range时返回完整下载的response，否则返回None
+        """
+        response = self.get({'Range': 'bytes=0-0'})
+        if response.status_code == 206:
+            response.close()
+            match = re.match(r'bytes 0-0/(\d+)', response.headers.get('Content-Range', ''))
+            if match:
+                self.total_size = int(match.group(1))
+                return
+            response = self.get()
+        if response.status_code != 200:
+            response.close()
+            raise IOError('download {} failed: {}'.format(self.filename, response.status_code))
+        if response.headers.get('Content-Length'):
+            self.total_size = int(response.headers['Content-Length'])
+        return response
+
+    def load_state(self):
+        """读取上次未完成的下载，文件大小或分片大小变化时重新下载"""
+        if not (os.path.exists(self.state_file) and os.path.exists(self.part_file)):
+            return
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error('failed to load download state {}: {}'.format(self.state_file, e))
+            return
+        if state['total_size'] == self.total_size and state['segment_size'] == self.segment_size and \
+                os.path.getsize(self.part_file) == self.total_size:
+            self.done = set(state['done'])
+
+    def save_state(self):
+        flags = os.O_CREAT | os.O_WRONLY | os.O_TRUNC
+        modes = stat.S_IWUSR | stat.S_IRUSR
+        tmp_path = self.state_file + '.tmp'
+        with os.fdopen(os.open(tmp_path, flags, modes), 'w') as f:
+            json.dump({'total_size': self.total_size, 'segment_size': self.segment_size, 'done': sorted(self.done)},
+                      f)
+        os.replace(tmp_path, self.state_file)
+
+    def fetch_segment(self, index):
+        """
+        下载一个分片并写入part_file的对应位置
+        :return: 下载成功返回True
+        """
+        start = index * self.segment_size
+        end = min(start + self.segment_size, self.total_size) - 1
+        for attempt in range(SEGMENT_RETRIES + 1):
+            received = 0
+            try:
+                with closing(self.get({'Range': 'bytes={}-{}'.format(start, end)})) as response, \
+                        open(self.part_file, 'r+b') as f:
+                    if response.status_code != 206:
+                        raise IOError('unexpected status {}'.format(response.status_code))
+                    f.seek(start)
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        received += len(chunk)
+                if received != end - start + 1:
+                    raise IOError('received {} bytes, expected {}'.format(received, end - start + 1))
+            except Exception as e:
+                logger.error('download {} segment {} failed (attempt {}): {}'.format(
+                    self.filename, index, attempt + 1, e))
+                continue
+            with self.lock:
+                self.done.add(index)
+                self.downloaded += received
+                self.save_state()
+            return True
+        return False
+
+    def fetch_all(self, response):
+        """不支持Range时单线程下载完整文件"""
+        flags = os.O_CREAT | os.O_WRONLY | os.O_TRUNC
+        modes = stat.S_IWUSR | stat.S_IRUSR
+        with closing(response), os.fdopen(os.open(self.part_file, flags, modes), 'wb') as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                self.downloaded += len(chunk)
+        return True
+
+    def run(self, total_size=None):
+        response = self.probe()
+        if total_size is not None and self.total_size is not None and self.total_size != total_size:
+            if response:
+                response.close()
+            logger.error('download {}: size {} does not match {}'.format(self.filename, self.total_size, total_size))
+            return False
+        # 上次已下载完成的文件无需重新下载
+        if os.path.exists(self.filename) and os.path.getsize(self.filename) == self.total_size:
+            if response:
+                response.close()
+            self.cleanup()
+            return True
+        if response:
+            return self.fetch_all(response)
+        self.load_state()
+        if not self.done:
+            flags = os.O_CREAT | os.O_WRONLY | os.O_TRUNC
+            modes = stat.S_IWUSR | stat.S_IRUSR
+            with os.fdopen(os.open(self.part_file, flags, modes), 'wb') as f:
+                f.truncate(self.total_size)
+            self.save_state()
+        segments = [index for index in range((self.total_size + self.segment_size - 1) // self.segment_size)
+                    if index not in self.done]
+        if segments:
+            logger.info('download {}: {} of {} segments left'.format(self.filename, len(segments),
+                                                                     len(segments) + len(self.done)))
+            pool = ThreadPool(min(self.workers, len(segments)))
+            try:
+                results = pool.map(self.fetch_segment, segments)
+            finally:
+                pool.close()
+                pool.join()
+            if not all(results):
+                return False
+        return True
+
+    def verify(self, path, total_size=None, md5=None):
+        """校验下载文件的大小及md5"""
+        size = os.path.getsize(path)
+        for expected in (self.total_size, total_size):
+            if expected is not None and size != expected:
+                logger.error('download {}: size {} does not match {}'.format(self.filename, size, expected))
+                return False
+        if md5:
+            digest = hashlib.md5()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            if digest.hexdigest() != md5.lower():
+                logger.error('download {}: md5 {} does not match {}'.format(self.filename, digest.hexdigest(), md5))
+                return False
+        return True
+
+    def cleanup(self):
+        for path in (self.part_file, self.state_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def download(url, filename, headers=None, total_size=None, md5=None, workers=None, segment_size=None):
+    """
+    下载文件，可断点续传
+    :param url: 下载地址
+    :param filename: 本地保存的文件名
+    :param headers: 请求头
+    :param total_size: 预期的文件大小，不一致时下载失败
+    :param md5: 预期的md5，不一致时下载失败
+    :param workers: 并行下载的分片数，默认为DOWNLOAD_WORKERS
+    :param segment_size: 分片大小，默认为DOWNLOAD_SEGMENT_SIZE
+    :return: 下载成功返回{'size', 'downloaded', 'elapsed', 'throughput'}，失败返回None
+    """
+    job = Download(url, filename, headers, workers, segment_size)
+    t0 = time.time()
+    try:
+        if not job.run(total_size):
+            # 保留已完成的分片，下次继续下载
+            return
+    except Exception as e:
+        logger.error('download {} failed: {}'.format(filename, e))
+        return
+    path = job.part_file if os.path.exists(job.part_file) else filename
+    if not job.verify(path, total_size, md5):
+        job.cleanup()
+        return
+    if path != filename:
+        os.replace(path, filename)
+    job.cleanup()
+    elapsed = time.time() - t0
+    stats = {
+        'size': os.path.getsize(filename),
+        'downloaded': job.downloaded,
+        'elapsed': elapsed,
+        'throughput': job.downloaded / max(elapsed, 1e-6)
+    }
+    logger.info('download {}: {} bytes, {} bytes downloaded in {:.2f}s, {:.2f}MB/s'.format(
+        filename, stats['size'], stats['downloaded'], elapsed, stats['throughput'] / 1024 / 1024))
+    return stats
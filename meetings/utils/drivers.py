@@ -2,23 +2,23 @@ from meetings.models import Meeting
 from meetings.utils import zoom_apis, welink_apis
 
 
-def createMeeting(platform, date, start, end, topic, host, record):
+def createMeeting(platform, start_at, end_at, topic, host, record):
     status, content = (None, None)
     if platform == 'zoom':
-        status, content = zoom_apis.createMeeting(date, start, end, topic, host, record)
+        status, content = zoom_apis.createMeeting(start_at, end_at, topic, host, record)
     elif platform == 'welink':
-        status, content = welink_apis.createMeeting(date, start, end, topic, host, record)
+        status, content = welink_apis.createMeeting(start_at, end_at, topic, host, record)
     return status, content
 
 
-def updateMeeting(mid, date, start, end, topic, record):
+def updateMeeting(mid, start_at, end_at, topic, record):
     status = None
     meeting = Meeting.objects.get(mid=mid)
     platform = meeting.mplatform
     if platform == 'zoom':
-        status = zoom_apis.updateMeeting(mid, date, start, end, topic, record)
+        status = zoom_apis.updateMeeting(mid, start_at, end_at, topic, record)
     elif platform == 'welink':
-        status = welink_apis.updateMeeting(mid, date, start, end, topic, record)
+        status = welink_apis.updateMeeting(mid, start_at, end_at, topic, record)
     return status
 
 
@@ -34,12 +34,12 @@ def cancelMeeting(mid):
     return status
 
 
-def getParticipants(mid):
+def getParticipants(mid, conf_uuids=None):
     meeting = Meeting.objects.get(mid=mid)
     mplatform = meeting.mplatform
     status, res = (None, None)
     if mplatform == 'zoom':
         status, res = zoom_apis.getParticipants(mid)
     elif mplatform == 'welink':
-        status, res = welink_apis.getParticipants(mid)
+        status, res = welink_apis.getParticipants(mid, conf_uuids)
     return status, res
@@ -0,0 +1,141 @@
+import bisect
+import datetime
+import itertools
+import logging
+import secrets
+import threading
+import time
+from django.conf import settings
+from django.db.models import F
+from meetings.models import HostIndexVersion, Meeting
+from meetings.utils.schedule import MAX_DURATION, get_search_window, unfilled_meetings
+
+logger = logging.getLogger('log')
+
+
+class HostAvailabilityIndex(object):
+    """
+    host可用性索引：每个host的预定按开始时刻排序保存，查询某时段的可用host时只需二分查找
+    索引仅包含未结束的会议，其他进程写入后通过数据库中的版本号触发重建
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.bookings = {}
+        self.hosts = {}
+        self.version = None
+        self.built_at = 0
+        self.counters = {}
+
+    def rebuild(self):
+        now = datetime.datetime.now()
+        search_start = get_search_window(now, now)[0]
+        meetings = Meeting.objects.filter(is_delete=0, start_at__gt=search_start - MAX_DURATION,
+                                          end_at__gt=search_start). \
+            values_list('mid', 'host_id', 'start_at', 'end_at')
+        bookings = {}
+        hosts = {}
+        # 起止时刻为空的会议在索引中同样视为占用host
+        unfilled = unfilled_meetings(search_start, datetime.datetime.max - MAX_DURATION)
+        for mid, host_id, start_at, end_at in itertools.chain(meetings, unfilled):
+            bookings.setdefault(host_id, []).append((start_at, end_at, mid))
+            hosts[mid] = host_id
+        for host_bookings in bookings.values():
+            host_bookings.sort()
+        self.bookings = bookings
+        self.hosts = hosts
+        self.built_at = time.time()
+        logger.info('host index rebuilt: {} bookings'.format(len(hosts)))
+
+    @staticmethod
+    def get_version():
+        return HostIndexVersion.objects.filter(id=1).values_list('version', flat=True).first() or 0
+
+    def ensure_fresh(self):
+        version = self.get_version()
+        if version != self.version or time.time() - self.built_at > settings.HOST_INDEX_MAX_AGE:
+            self.rebuild()
+            self.version = version
+
+    def notify(self):
+        """
+        本进程修改索引后版本加1，其他进程下次查询时重建索引
+        修改前索引已是最新且期间没有其他进程修改时，本进程无需重建
+        """
+        version = self.get_version()
+        if not HostIndexVersion.objects.filter(id=1).update(version=F('version') + 1):
+            _, created = HostIndexVersion.objects.get_or_create(id=1, defaults={'version': 1})
+            if not created:
+                HostIndexVersion.objects.filter(id=1).update(version=F('version') + 1)
+        self.version = version + 1 if version == self.version else None
+
+    def add(self, mid, host_id, start_at, end_at):
+        with self.lock:
+            self._remove(mid)
+            bisect.insort(self.bookings.setdefault(host_id, []), (start_at, end_at, mid))
+            self.hosts[mid] = host_id
+            self.notify()
+
+    def remove(self, mid):
+        with self.lock:
+            self._remove(mid)
+            self.notify()
+
+    def _remove(self, mid):
+        host_id = self.hosts.pop(mid, None)
+        if host_id is None:
+            return
+        self.bookings[host_id] = [x for x in self.bookings[host_id] if x[2] != mid]
+
+    def _is_free(self, host_id, search_start, search_end, exclude_mid=None):
+        host_bookings = self.bookings.get(host_id, [])
+        # 开始时刻早于search_end的预定中，只有开始时刻晚于search_start-MAX_DURATION的才可能与该时段重叠
+        index = bisect.bisect_left(host_bookings, (search_end,))
+        while index > 0:
+            index -= 1
+            start_at, end_at, mid = host_bookings[index]
+            if start_at <= search_start - MAX_DURATION:
+                break
+            if end_at > search_start and mid != exclude_mid:
+                return False
+        return True
+
+    def is_free(self, host_id, start_at, end_at, exclude_mid=None):
+        search_start, search_end = get_search_window(start_at, end_at)
+        with self.lock:
+            self.ensure_fresh()
+            return self._is_free(host_id, search_start, search_end, exclude_mid)
+
+    def free_hosts(self, platform, start_at, end_at, exclude_mid=None):
+        """
+        查询某平台在[start_at-30m, end_at+30m]内的可用host
+        :return: 可用的host_id列表，按配置顺序排列
+        """
+        search_start, search_end = get_search_window(start_at, end_at)
+        with self.lock:
+            self.ensure_fresh()
+            return [host_id for host_id in settings.OPENGAUSS_MEETING_HOSTS[platform].keys()
+                    if self._is_free(host_id, search_start, search_end, exclude_mid)]
+
+    def select_host(self, platform, available_host_id):
+        """
+        按HOST_SELECTION_POLICY从可用host中选择一个
+        random: 随机选择; least_loaded: 选择未结束预定最少的host; round_robin: 轮流选择
+        """
+        policy = settings.HOST_SELECTION_POLICY
+        if policy == 'least_loaded':
+            with self.lock:
+                loads = {host_id: len(self.bookings.get(host_id, [])) for host_id in available_host_id}
+            min_load = min(loads.values())
+            return secrets.choice([host_id for host_id in available_host_id if loads[host_id] == min_load])
+        if policy == 'round_robin':
+            host_list = list(settings.OPENGAUSS_MEETING_HOSTS[platform].keys())
+            with self.lock:
+                offset = next(self.counters.setdefault(platform, itertools.count())) % len(host_list)
+            for host_id in host_list[offset:] + host_list[:offset]:
+                if host_id in available_host_id:
+                    return host_id
+        return secrets.choice(available_host_id)
+
+
+host_index = HostAvailabilityIndex()
@@ -0,0 +1,105 @@
+import logging
+import re
+import threading
+import time
+import requests
+from django.conf import settings
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger('log')
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def get_session(url):
+    """获取目标主机的Session，同一主机复用连接池"""
+    parsed = urlparse(url)
+    key = '{}://{}'.format(parsed.scheme, parsed.netloc)
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            # 只对幂等请求重试，避免重复预定会议
+            retry = Retry(total=settings.HTTP_RETRIES, backoff_factor=settings.HTTP_BACKOFF_FACTOR,
+                          status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.HTTP_POOL_MAXSIZE, max_retries=retry)
+            session = requests.Session()
+            # Session被所有调用方共享，只复用连接，不保存任何cookie
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            session.mount(key, adapter)
+            _sessions[key] = session
+    return session
+
+
+def get_endpoint(method, url):
+    """以方法、主机和路径作为统计维度，路径中的数字ID统一替换"""
+    parsed = urlparse(url)
+    return '{} {}{}'.format(method.upper(), parsed.netloc, re.sub(r'/\d+', '/{id}', parsed.path))
+
+
+def record_metric(endpoint, elapsed, status_code):
+    with _metrics_lock:
+        metric = _metrics.setdefault(endpoint, {'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0})
+        metric['count'] += 1
+        metric['total'] += elapsed
+        metric['max'] = max(metric['max'], elapsed)
+        if status_code is None or status_code >= 400:
+            metric['errors'] += 1
+
+
+def get_metrics():
+    """
+    各接口的调用统计
+    :return: {endpoint: {'count', 'errors', 'avg', 'max'}}，耗时单位为秒
+    """
+    with _metrics_lock:
+        return {endpoint: {'count': x['count'], 'errors': x['errors'], 'avg': x['total'] / x['count'],
+                           'max': x['max']} for endpoint, x in _metrics.items()}
+
+
+def request(method, url, **kwargs):
+    """
+    通过连接池发送请求，默认使用HTTP_CONNECT_TIMEOUT/HTTP_READ_TIMEOUT超时
+    :return: requests.Response
+    """
+    kwargs.setdefault('timeout', (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT))
+    endpoint = get_endpoint(method, url)
+    status_code = None
+    t0 = time.time()
+    try:
+        response = get_session(url).request(method, url, **kwargs)
+        status_code = response.status_code
+        return response
+    finally:
+        elapsed = time.time() - t0
+        record_metric(endpoint, elapsed, status_code)
+        if elapsed > settings.HTTP_SLOW_THRESHOLD:
+            logger.warning('slow request: {} took {:.2f}s, status {}'.format(endpoint, elapsed, status_code))
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request('PUT', url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request('PATCH', url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
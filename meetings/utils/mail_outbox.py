@@ -0,0 +1,114 @@
+import datetime
+import json
+import logging
+import smtplib
+from django.conf import settings
+from django.db.models import Q
+from meetings.models import MailOutbox
+from meetings.send_email import build_message as build_invite_message
+from meetings.utils.send_cancel_email import build_message as build_cancel_message
+
+logger = logging.getLogger('log')
+
+PENDING, SENDING, SENT, FAILED = 0, 1, 2, 3
+
+
+def enqueue(kind, meeting, record=None):
+    """
+    将邮件写入发送队列，由send_outbox命令异步发送
+    :param kind: invite或cancel
+    :param meeting: 构造邮件所需的会议信息
+    :param record: 是否录制，仅会议邀请邮件使用
+    :return: MailOutbox
+    """
+    payload = {'meeting': meeting, 'record': record}
+    return MailOutbox.objects.create(mid=meeting['mid'], kind=kind, sequence=meeting['sequence'],
+                                     payload=json.dumps(payload), next_attempt_time=datetime.datetime.now())
+
+
+def build_message(outbox):
+    payload = json.loads(outbox.payload)
+    if outbox.kind == 'cancel':
+        return build_cancel_message(payload['meeting'])
+    return build_invite_message(payload['meeting'], payload['record'])
+
+
+def claim(batch_size):
+    """
+    领取待发送的邮件，发送中超过MAIL_OUTBOX_CLAIM_TIMEOUT的邮件视为上次发送中断，可被重新领取
+    通过带状态条件的update领取，多个worker同时运行时每封邮件只会被一个worker领取
+    """
+    now = datetime.datetime.now()
+    claimable = Q(status=PENDING, next_attempt_time__lte=now) | \
+        Q(status=SENDING, claim_time__lt=now - datetime.timedelta(seconds=settings.MAIL_OUTBOX_CLAIM_TIMEOUT))
+    ids = list(MailOutbox.objects.filter(claimable).order_by('id').values_list('id', flat=True)[:batch_size])
+    claimed = [x for x in ids if MailOutbox.objects.filter(claimable, id=x).update(status=SENDING, claim_time=now)]
+    return list(MailOutbox.objects.filter(id__in=claimed).order_by('id'))
+
+
+def connect():
+    server = smtplib.SMTP(settings.SMTP_SERVER_HOST, settings.SMTP_SERVER_PORT, timeout=settings.SMTP_TIMEOUT)
+    server.ehlo()
+    server.starttls()
+    server.login(settings.GMAIL_USERNAME, settings.GMAIL_PASSWORD)
+    return server
+
+
+def mark_sent(outbox):
+    MailOutbox.objects.filter(id=outbox.id).update(status=SENT, attempts=outbox.attempts + 1, last_error=None,
+                                                   sent_time=datetime.datetime.now())
+
+
+def mark_failed(outbox, error):
+    """发送失败后按指数退避重新排队，超过MAIL_OUTBOX_MAX_ATTEMPTS次后不再重试"""
+    attempts = outbox.attempts + 1
+    status = FAILED if attempts >= settings.MAIL_OUTBOX_MAX_ATTEMPTS else PENDING
+    delay = settings.MAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    MailOutbox.objects.filter(id=outbox.id).update(
+        status=status, attempts=attempts, last_error=str(error),
+        next_attempt_time=datetime.datetime.now() + datetime.timedelta(seconds=delay))
+    logger.error('failed to send {} email of meeting {} (sequence {}, attempt {}): {}'.format(
+        outbox.kind, outbox.mid, outbox.sequence, attempts, error))
+
+
+def deliver(batch):
+    """
+    复用同一个SMTP连接发送一批邮件，无法连接SMTP服务器时整批重新排队
+    :return: (发送成功数, 发送失败数)
+    """
+    sent, failed = 0, 0
+    if not batch:
+        return sent, failed
+    try:
+        server = connect()
+    except OSError as e:
+        for outbox in batch:
+            mark_failed(outbox, e)
+        return sent, len(batch)
+    for outbox in batch:
+        try:
+            sender, toaddrs_list, msg = build_message(outbox)
+        except Exception as e:
+            mark_failed(outbox, e)
+            failed += 1
+            continue
+        try:
+            try:
+                server.sendmail(sender, toaddrs_list, msg.as_string())
+            except smtplib.SMTPServerDisconnected:
+                server = connect()
+                server.sendmail(sender, toaddrs_list, msg.as_string())
+        except OSError as e:
+            # smtplib.SMTPException是OSError的子类
+            mark_failed(outbox, e)
+            failed += 1
+            continue
+        mark_sent(outbox)
+        sent += 1
+        logger.info('{} email of meeting {} (sequence {}) sent to {}'.format(
+            outbox.kind, outbox.mid, outbox.sequence, toaddrs_list))
+    try:
+        server.quit()
+    except OSError:
+        pass
+    return sent, failed
@@ -0,0 +1,125 @@
+import html
+import icalendar
+import os
+import pytz
+import re
+from django.conf import settings
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from meetings.utils.schedule import parse_interval, to_utc
+
+TEMPLATE_DIR = os.path.join(settings.BASE_DIR, 'templates')
+
+
+class CompiledTemplate(object):
+    """
+    预编译的邮件模板：加载时将模板按{{name}}切分为文本片段和变量名，渲染时只需拼接
+    """
+
+    def __init__(self, content, escape=False):
+        self.parts = re.split(r'{{(\w+)}}', content)
+        self.escape = escape
+
+    @classmethod
+    def load(cls, filename, escape=False):
+        with open(os.path.join(TEMPLATE_DIR, filename), 'r', encoding='utf-8') as fp:
+            return cls(fp.read(), escape)
+
+    def render(self, context):
+        chunks = list(self.parts)
+        # 奇数位置为变量名
+        for index in range(1, len(chunks), 2):
+            value = str(context.get(chunks[index]) or '')
+            chunks[index] = html.escape(value) if self.escape else value
+        return ''.join(chunks)
+
+
+def load_invite_templates():
+    """
+    :return: {(是否有议程, 是否录制): (文本模板, html模板)}
+    """
+    templates = {}
+    for summary in (True, False):
+        for record in (True, False):
+            name = 'template_{}_summary_{}_recordings'.format('with' if summary else 'without',
+                                                              'with' if record else 'without')
+            templates[(summary, record)] = (CompiledTemplate.load(name + '.txt'),
+                                            CompiledTemplate.load(name + '.html', escape=True))
+    return templates
+
+
+INVITE_TEMPLATES = load_invite_templates()
+CANCEL_TEMPLATE = CompiledTemplate.load('template_cancel_meeting.txt')
+
+
+def get_context(meeting):
+    context = dict(meeting)
+    context['start_time'] = ' '.join([meeting['date'], meeting['start']])
+    return context
+
+
+def render_invite(meeting, record=None):
+    """
+    渲染会议邀请邮件正文
+    :return: multipart/alternative，包含纯文本及html正文
+    """
+    text_template, html_template = INVITE_TEMPLATES[(bool(meeting.get('summary')), bool(record))]
+    context = get_context(meeting)
+    body = MIMEMultipart('alternative')
+    body.attach(MIMEText(text_template.render(context), 'plain', 'utf-8'))
+    body.attach(MIMEText(html_template.render(context), 'html', 'utf-8'))
+    return body
+
+
+def render_cancel(meeting):
+    """渲染会议取消邮件正文"""
+    return MIMEText(CANCEL_TEMPLATE.render(get_context(meeting)), 'plain', 'utf-8')
+
+
+def render_calendar(meeting, method, attendee, summary):
+    """
+    生成日历附件，会议邀请及会议取消使用同一个uid，邮件客户端据此更新或取消日程
+    :param meeting: 会议信息
+    :param method: REQUEST或CANCEL
+    :param attendee: 参会人
+    :param summary: 日程标题
+    :return: text/calendar
+    """
+    start_at, end_at = parse_interval(meeting['date'], meeting['start'], meeting['end'])
+    dt_start = to_utc(start_at).replace(tzinfo=pytz.utc)
+    dt_end = to_utc(end_at).replace(tzinfo=pytz.utc)
+
+    cal = icalendar.Calendar()
+    cal.add('prodid', '-//opengauss conference calendar')
+    cal.add('version', '2.0')
+    cal.add('method', method)
+
+    event = icalendar.Event()
+    event.add('attendee', attendee)
+    event.add('summary', summary)
+    event.add('dtstart', dt_start)
+    event.add('dtend', dt_end)
+    event.add('dtstamp', dt_start)
+    event.add('uid', meeting['platform'].lower() + str(meeting['mid']))
+    event.add('sequence', meeting['sequence'] + 1)
+
+    if method == 'REQUEST':
+        alarm = icalendar.Alarm()
+        alarm.add('action', 'DISPLAY')
+        alarm.add('description', 'Reminder')
+        alarm.add('TRIGGER;RELATED=START', '-PT15M')
+        event.add_component(alarm)
+
+    cal.add_component(event)
+
+    filename = 'invite.ics' if method == 'REQUEST' else 'cancel.ics'
+    part = MIMEBase('text', 'calendar', method=method, name=filename)
+    part.set_payload(cal.to_ical())
+    encoders.encode_base64(part)
+    part.add_header('Content-Description', filename)
+    part.add_header('Content-class', 'urn:content-classes:calendarmessage')
+    part.add_header('Filename', filename)
+    part.add_header('Path', filename)
+    return part
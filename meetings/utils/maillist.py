@@ -0,0 +1,160 @@
+import logging
+import os
+import stat
+import tempfile
+import threading
+import time
+import yaml
+from django.conf import settings
+from meetings.utils import http_client
+
+logger = logging.getLogger('log')
+
+MAILLIST_MAPPING_URL = 'https://gitee.com/opengauss/tc/raw/master/maillist_mapping.yaml'
+# 随代码发布的映射，还没有本地副本时使用
+MAILLIST_MAPPING_SEED = 'meetings/utils/maillist_mapping.yaml'
+
+
+def parse(content):
+    """
+    :return: 校验后的映射
+    :raise ValueError: 内容不是有效的映射
+    """
+    try:
+        mapping = yaml.safe_load(content)
+    except yaml.YAMLError as e:
+        raise ValueError('invalid maillist mapping: {}'.format(e))
+    if not isinstance(mapping, dict):
+        raise ValueError('unexpected maillist mapping: {}'.format(content[:200]))
+    return mapping
+
+
+def save(content):
+    """原子地覆盖本地副本，各进程在文件变化后重新加载"""
+    path = settings.MAILLIST_MAPPING_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        os.chmod(tmp_path, stat.S_IRUSR | stat.S_IWUSR)
+        os.replace(tmp_path, path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+
+
+def publish(content):
+    """
+    校验映射内容后写入本地副本，供sync_sigs等其他进程使用
+    :return: 是否写入成功
+    """
+    try:
+        parse(content)
+        save(content)
+    except (OSError, ValueError) as e:
+        logger.error('failed to publish maillist mapping: {}'.format(e))
+        return False
+    logger.info('maillist mapping published to {}'.format(settings.MAILLIST_MAPPING_PATH))
+    return True
+
+
+class MaillistMapping(object):
+    """
+    sig组与邮件列表的映射：从本地副本加载，本地副本变化（如sync_sigs写入）后重新加载
+    过期后在后台线程中从gitee刷新，刷新成功后整体替换内存中的映射并覆盖本地副本，刷新失败时继续使用上一份可用的映射
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mapping = None
+        self.mtime = None
+        self.loaded_at = 0
+        self.refreshing = False
+
+    @staticmethod
+    def stat():
+        """
+        :return: 本地副本的路径及修改时间，还没有本地副本时返回随代码发布的映射
+        """
+        for path in (settings.MAILLIST_MAPPING_PATH, MAILLIST_MAPPING_SEED):
+            try:
+                return path, os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+        return None, None
+
+    def load(self, path, mtime):
+        # 内容无效时同样记下修改时间，文件再次变化前不重复加载
+        self.mtime = mtime
+        try:
+            with open(path, 'r') as f:
+                mapping = parse(f.read())
+        except (OSError, ValueError) as e:
+            logger.error('failed to load maillist mapping from {}: {}'.format(path, e))
+            if self.mapping is None:
+                self.mapping = {}
+            return
+        self.mapping = mapping
+        self.loaded_at = max(self.loaded_at, mtime / 1e9)
+        logger.info('maillist mapping loaded from {}: {} sigs'.format(path, len(mapping)))
+
+    def get(self):
+        """
+        :return: {sig_name: maillist}，调用方不应修改返回的字典
+        """
+        with self.lock:
+            path, mtime = self.stat()
+            if path is None:
+                if self.mapping is None:
+                    logger.error('maillist mapping not found: {}'.format(settings.MAILLIST_MAPPING_PATH))
+                    self.mapping = {}
+            elif mtime != self.mtime:
+                self.load(path, mtime)
+            if not self.refreshing and time.time() - self.loaded_at > settings.MAILLIST_MAPPING_TTL:
+                self.refreshing = True
+                threading.Thread(target=self.refresh, daemon=True).start()
+            return self.mapping
+
+    def refresh(self):
+        """
+        从gitee拉取最新的映射
+        :return: 是否刷新成功
+        """
+        try:
+            r = http_client.get(MAILLIST_MAPPING_URL)
+            r.raise_for_status()
+        except Exception as e:
+            logger.warning('failed to refresh maillist mapping, keep the last one: {}'.format(e))
+            self.keep()
+            return False
+        return self.update(r.text)
+
+    def keep(self):
+        """继续使用上一份映射，TTL过后再次刷新"""
+        with self.lock:
+            self.loaded_at = time.time()
+            self.refreshing = False
+
+    def update(self, content):
+        """
+        校验映射内容后原子地替换本地副本及内存中的映射，内容无效或写入失败时继续使用上一份映射
+        :return: 是否更新成功
+        """
+        try:
+            mapping = parse(content)
+            save(content)
+        except (OSError, ValueError) as e:
+            logger.error('failed to update maillist mapping, keep the last one: {}'.format(e))
+            self.keep()
+            return False
+        with self.lock:
+            self.mapping = mapping
+            self.mtime = self.stat()[1]
+            self.loaded_at = time.time()
+            self.refreshing = False
+        logger.info('maillist mapping updated: {} sigs'.format(len(mapping)))
+        return True
+
+
+maillist_mapping = MaillistMapping()
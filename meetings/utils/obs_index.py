@@ -0,0 +1,69 @@
+import logging
+import threading
+
+logger = logging.getLogger('log')
+
+# 每次分页查询的对象数，OBS的上限为1000
+PAGE_SIZE = 1000
+
+
+class ObsObjectIndex(object):
+    """
+    OBS对象索引：按前缀分页列出对象的大小，同一前缀在索引的生命周期内只列出一次
+    一般每次运行创建一个索引，按会议的opengauss/<group>/<month>/<mid>/前缀查询
+    """
+
+    def __init__(self, obs_client, bucketName):
+        self.obs_client = obs_client
+        self.bucketName = bucketName
+        self.lock = threading.Lock()
+        # {prefix: {object_key: size}}
+        self.prefixes = {}
+
+    def list_objects(self, prefix=''):
+        """
+        通过marker分页列出前缀下的所有对象
+        :return: {object_key: size}
+        """
+        objects = {}
+        marker = None
+        while True:
+            res = self.obs_client.listObjects(self.bucketName, prefix=prefix or None, marker=marker,
+                                              max_keys=PAGE_SIZE)
+            if res['status'] >= 300:
+                raise IOError('list objects of {} failed: {} {}'.format(prefix, res['status'], res['errorMessage']))
+            contents = res['body']['contents']
+            objects.update({x['key']: x['size'] for x in contents})
+            if not res['body']['is_truncated'] or not contents:
+                break
+            marker = res['body']['next_marker'] or contents[-1]['key']
+        logger.info('obs index: {} objects under {}'.format(len(objects), prefix or '/'))
+        return objects
+
+    def load(self, prefix=''):
+        """
+        :return: 前缀下的{object_key: size}，已列出过的前缀直接返回缓存
+        """
+        for loaded, objects in list(self.prefixes.items()):
+            if prefix.startswith(loaded):
+                return {k: v for k, v in objects.items() if k.startswith(prefix)}
+        objects = self.list_objects(prefix)
+        with self.lock:
+            self.prefixes.setdefault(prefix, {}).update(objects)
+        return objects
+
+    def get_size(self, object_key):
+        """
+        :return: 对象的大小，对象不存在时返回None
+        """
+        return self.load(object_key.rsplit('/', 1)[0] + '/').get(object_key)
+
+    def exists(self, object_key):
+        return self.get_size(object_key) is not None
+
+    def add(self, object_key, size):
+        """上传对象后更新索引"""
+        with self.lock:
+            for loaded, objects in self.prefixes.items():
+                if object_key.startswith(loaded):
+                    objects[object_key] = size
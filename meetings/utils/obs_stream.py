@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import stat
+import time
+from contextlib import closing
+from django.conf import settings
+from obs import CompleteMultipartUploadRequest, CompletePart
+from meetings.utils import http_client
+
+logger = logging.getLogger('log')
+
+# 每次从下载流中读取的大小
+CHUNK_SIZE = 1024 * 1024
+
+
+class SizeMismatch(Exception):
+    """下载的数据大小与total_size不一致，已上传的分段不可用"""
+
+
+def load_checkpoint(checkpoint_file):
+    if not os.path.exists(checkpoint_file):
+        return
+    try:
+        with open(checkpoint_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error('failed to load checkpoint {}: {}'.format(checkpoint_file, e))
+
+
+def save_checkpoint(checkpoint_file, checkpoint):
+    flags = os.O_CREAT | os.O_WRONLY | os.O_TRUNC
+    modes = stat.S_IWUSR | stat.S_IRUSR
+    tmp_path = checkpoint_file + '.tmp'
+    with os.fdopen(os.open(tmp_path, flags, modes), 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_file)
+
+
+def remove_checkpoint(checkpoint_file):
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+
+def list_completed_parts(obs_client, bucketName, object_key, upload_id, part_size):
+    """
+    查询分段上传任务中已完成的分段
+    :return: 从第1段开始连续且大小为part_size的分段列表[CompletePart]，分段上传任务已不存在时返回None
+    """
+    parts = []
+    marker = None
+    while True:
+        res = obs_client.listParts(bucketName, object_key, upload_id, partNumberMarker=marker)
+        if res['status'] == 404:
+            logger.error('multipart upload {} of {} does not exist'.format(upload_id, object_key))
+            return
+        if res['status'] >= 300:
+            raise IOError('list parts of {} failed: {} {}'.format(object_key, res['status'], res['errorMessage']))
+        parts.extend(res['body']['parts'])
+        if not res['body']['isTruncated']:
+            break
+        marker = res['body']['nextPartNumberMarker']
+    completed = []
+    for part in sorted(parts, key=lambda x: x['partNumber']):
+        # 最后一段可能小于part_size，需要重新上传
+        if part['partNumber'] != len(completed) + 1 or part['size'] != part_size:
+            break
+        completed.append(CompletePart(partNum=part['partNumber'], etag=part['etag']))
+    return completed
+
+
+def abort(obs_client, bucketName, object_key, upload_id, checkpoint_file):
+    """取消分段上传任务并删除断点文件"""
+    try:
+        obs_client.abortMultipartUpload(bucketName, object_key, upload_id)
+    except Exception as e:
+        logger.error('abort multipart upload of {} failed: {}'.format(object_key, e))
+    remove_checkpoint(checkpoint_file)
+
+
+def upload_part(obs_client, bucketName, object_key, upload_id, part_number, content):
+    """
+    :return: CompletePart，上传失败时返回None
+    """
+    res = obs_client.uploadPart(bucketName, object_key, part_number, upload_id, content=content)
+    if res['status'] >= 300:
+        logger.error('upload part {} of {} failed: {} {}'.format(part_number, object_key, res['status'],
+                                                                 res['errorMessage']))
+        return
+    return CompletePart(partNum=part_number, etag=res['body']['etag'])
+
+
+def transfer(obs_client, bucketName, object_key, upload_id, source_url, total_size, part_size, parts):
+    """
+    从parts之后的位置开始下载，按part_size切分后依次上传，内存中最多缓存一个分段
+    :return: 全部分段上传成功时返回True，下载或上传出错时返回False，已上传的分段保留
+    :raise SizeMismatch: 下载的数据大小与total_size不一致
+    """
+    offset = len(parts) * part_size
+    headers = {'Range': 'bytes={}-'.format(offset)} if offset else {}
+    response = http_client.get(source_url, headers=headers, stream=True)
+    with closing(response):
+        if response.status_code == 206:
+            skip = 0
+        elif response.status_code == 200:
+            # 下载地址不支持Range时丢弃已上传的部分
+            skip = offset
+        else:
+            logger.error('download {} failed: {}'.format(object_key, response.status_code))
+            return False
+        received = offset
+        buffer = bytearray()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if skip:
+                if len(chunk) <= skip:
+                    skip -= len(chunk)
+                    continue
+                chunk = chunk[skip:]
+                skip = 0
+            received += len(chunk)
+            if received > total_size:
+                raise SizeMismatch('download {}: received more than total_size {}'.format(object_key, total_size))
+            buffer.extend(chunk)
+            while len(buffer) >= part_size:
+                part = upload_part(obs_client, bucketName, object_key, upload_id, len(parts) + 1,
+                                   bytes(buffer[:part_size]))
+                if not part:
+                    return False
+                parts.append(part)
+                del buffer[:part_size]
+    if received != total_size:
+        raise SizeMismatch('download {}: received {} bytes, total_size is {}'.format(object_key, received, total_size))
+    if buffer:
+        part = upload_part(obs_client, bucketName, object_key, upload_id, len(parts) + 1, bytes(buffer))
+        if not part:
+            return False
+        parts.append(part)
+    return True
+
+
+def stream_upload(obs_client, bucketName, object_key, source_url, total_size, checkpoint_file, metadata=None,
+                  part_size=None):
+    """
+    边下载边以分段上传的方式写入OBS，不在本地保存文件
+    失败时保留分段上传任务及断点文件，再次调用时从最后一个完成的分段继续
+    只有录像信息与断点不一致或下载的数据大小与total_size不一致时才取消分段上传
+    :param source_url: 下载地址
+    :param total_size: 文件大小，下载的数据大小与之不一致时上传失败
+    :param checkpoint_file: 断点文件，记录分段上传任务
+    :param metadata: 对象的metadata
+    :param part_size: 分段大小，默认为RECORDING_PART_SIZE
+    :return: 上传成功返回True
+    """
+    part_size = part_size or settings.RECORDING_PART_SIZE
+    checkpoint = load_checkpoint(checkpoint_file)
+    parts = None
+    if checkpoint:
+        if checkpoint['object_key'] == object_key and checkpoint['total_size'] == total_size and \
+                checkpoint['part_size'] == part_size:
+            try:
+                parts = list_completed_parts(obs_client, bucketName, object_key, checkpoint['upload_id'],
+                                             part_size)
+            except Exception as e:
+                logger.error('{}: {}'.format(object_key, e))
+                return False
+            if parts is None:
+                remove_checkpoint(checkpoint_file)
+        else:
+            abort(obs_client, bucketName, checkpoint['object_key'], checkpoint['upload_id'], checkpoint_file)
+    if parts is None:
+        res = obs_client.initiateMultipartUpload(bucketName, object_key, metadata=metadata)
+        if res['status'] >= 300:
+            logger.error('initiate multipart upload of {} failed: {} {}'.format(object_key, res['status'],
+                                                                                res['errorMessage']))
+            return False
+        checkpoint = {
+            'object_key': object_key,
+            'upload_id': res['body']['uploadId'],
+            'total_size': total_size,
+            'part_size': part_size
+        }
+        save_checkpoint(checkpoint_file, checkpoint)
+        parts = []
+    else:
+        logger.info('{}: resume from part {}'.format(object_key, len(parts) + 1))
+    upload_id = checkpoint['upload_id']
+    resumed_size = len(parts) * part_size
+    t0 = time.time()
+    try:
+        ok = transfer(obs_client, bucketName, object_key, upload_id, source_url, total_size, part_size, parts)
+    except SizeMismatch as e:
+        logger.error(e)
+        abort(obs_client, bucketName, object_key, upload_id, checkpoint_file)
+        return False
+    except Exception as e:
+        logger.error('stream {} failed: {}'.format(object_key, e))
+        ok = False
+    if ok:
+        res = obs_client.completeMultipartUpload(bucketName, object_key, upload_id,
+                                                 CompleteMultipartUploadRequest(parts=parts))
+        if res['status'] >= 300:
+            logger.error('complete multipart upload of {} failed: {} {}'.format(object_key, res['status'],
+                                                                                res['errorMessage']))
+            ok = False
+    if not ok:
+        logger.info('{}: {} parts uploaded, resume on the next attempt'.format(object_key, len(parts)))
+        return False
+    remove_checkpoint(checkpoint_file)
+    elapsed = time.time() - t0
+    logger.info('{}: streamed {} bytes in {} parts, {:.2f}s, {:.2f}MB/s'.format(
+        object_key, total_size, len(parts), elapsed, (total_size - resumed_size) / max(elapsed, 1e-6) / 1024 / 1024))
+    return True
@@ -0,0 +1,42 @@
+import datetime
+import json
+import logging
+from django.conf import settings
+from django.db import transaction
+from meetings.models import Meeting, Participant
+from meetings.utils import drivers
+from meetings.utils.schedule import parse_interval
+
+logger = logging.getLogger('log')
+
+
+def is_finished(meeting):
+    """会议结束PARTICIPANTS_STABLE_DELAY秒后参会人不再变化"""
+    end_at = meeting.end_at or parse_interval(meeting.date, meeting.start, meeting.end)[1]
+    return datetime.datetime.now() >= end_at + datetime.timedelta(seconds=settings.PARTICIPANTS_STABLE_DELAY)
+
+
+def store(mid, participants):
+    with transaction.atomic():
+        Participant.objects.filter(mid=mid).delete()
+        Participant.objects.bulk_create([Participant(mid=mid, name=(x.get('name') or '')[:128], info=json.dumps(x))
+                                         for x in participants])
+
+
+def get_participants(mid, refresh=False, conf_uuids=None):
+    """
+    查询会议的参会人，已结束会议的参会人缓存在Participant表中
+    :param refresh: 是否忽略缓存，重新从会议平台查询
+    :param conf_uuids: WeLink会议的confUUID列表
+    :return: status, {'total_records': 参会人数, 'participants': 参会人列表}，查询失败时返回会议平台的响应
+    """
+    if not refresh:
+        cached = list(Participant.objects.filter(mid=mid).order_by('id').values_list('info', flat=True))
+        if cached:
+            return 200, {'total_records': len(cached), 'participants': [json.loads(x) for x in cached]}
+    meeting = Meeting.objects.get(mid=mid)
+    status, res = drivers.getParticipants(mid, conf_uuids)
+    if status == 200 and res['participants'] and is_finished(meeting):
+        store(mid, res['participants'])
+        logger.info('meeting {}: cached {} participants'.format(mid, len(res['participants'])))
+    return status, res
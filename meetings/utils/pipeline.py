@@ -0,0 +1,104 @@
+import logging
+import queue
+import threading
+import time
+import traceback
+
+logger = logging.getLogger('log')
+
+_STOP = object()
+
+
+class Stage(object):
+    """
+    流水线中的一个阶段：workers个线程从有界队列中取出任务交给func处理
+    func返回交给下一阶段的任务列表，返回空值时该任务到此结束
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=None):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size or workers)
+        self.next_stage = None
+        self.threads = []
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self.max_time = 0.0
+        self.started_at = 0
+        self.finished_at = 0
+
+    def start(self):
+        self.started_at = time.time()
+        self.threads = [threading.Thread(target=self.work, name='{}-{}'.format(self.name, index), daemon=True)
+                        for index in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def work(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            t0 = time.time()
+            failed = False
+            try:
+                results = self.func(item)
+            except Exception:
+                logger.error('stage {}: failed to process {}\n{}'.format(self.name, item, traceback.format_exc()))
+                results = None
+                failed = True
+            elapsed = time.time() - t0
+            with self.lock:
+                self.processed += 1
+                self.errors += failed
+                self.busy_time += elapsed
+                self.max_time = max(self.max_time, elapsed)
+            if results and self.next_stage:
+                for result in results:
+                    self.next_stage.queue.put(result)
+
+    def stop(self):
+        """等待队列中已有的任务处理完后结束所有worker"""
+        for _ in self.threads:
+            self.queue.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+        self.finished_at = time.time()
+
+    def stats(self):
+        wall_time = max(self.finished_at - self.started_at, 1e-6)
+        return {
+            'stage': self.name,
+            'workers': self.workers,
+            'processed': self.processed,
+            'errors': self.errors,
+            'avg': self.busy_time / self.processed if self.processed else 0,
+            'max': self.max_time,
+            'throughput': self.processed / wall_time
+        }
+
+
+class Pipeline(object):
+    """由多个Stage串联的流水线，各阶段并行运行，阶段之间通过有界队列传递任务"""
+
+    def __init__(self, stages):
+        self.stages = stages
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+
+    def run(self, items):
+        """
+        :param items: 交给第一个阶段的任务
+        :return: 各阶段的统计信息
+        """
+        for stage in self.stages:
+            stage.start()
+        for item in items:
+            self.stages[0].queue.put(item)
+        # 上一阶段的worker全部结束后，下一阶段不会再有新任务
+        for stage in self.stages:
+            stage.stop()
+        return [stage.stats() for stage in self.stages]
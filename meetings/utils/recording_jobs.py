@@ -0,0 +1,100 @@
+import datetime
+import json
+import logging
+from django.conf import settings
+from django.db.models import Count, Min
+from meetings.models import RecordingJob
+
+logger = logging.getLogger('log')
+
+DISCOVERED, DOWNLOADING, UPLOADED, COVER_DONE, PUBLISHED = 0, 1, 2, 3, 4
+
+STATUS_NAMES = dict(RecordingJob._meta.get_field('status').choices)
+
+
+def track(mid, platform, object_key, payload, status=DISCOVERED):
+    """
+    记录发现的录像文件，已存在的任务只更新录像信息
+    :param payload: 恢复录像处理所需的信息
+    :return: RecordingJob
+    """
+    now = datetime.datetime.now()
+    job, created = RecordingJob.objects.get_or_create(
+        object_key=object_key,
+        defaults={'mid': mid, 'platform': platform, 'status': status, 'payload': json.dumps(payload),
+                  'update_time': now, 'finish_time': now if status == PUBLISHED else None})
+    if not created:
+        update(job.id, payload=payload)
+    return job
+
+
+def update(job_id, status=None, payload=None, **kwargs):
+    """
+    更新任务的状态及录像信息，进入PUBLISHED时记录发布时间
+    """
+    now = datetime.datetime.now()
+    kwargs['update_time'] = now
+    if status is not None:
+        kwargs['status'] = status
+        if status == PUBLISHED:
+            kwargs['finish_time'] = now
+            kwargs['last_error'] = None
+    if payload is not None:
+        kwargs['payload'] = json.dumps(payload)
+    RecordingJob.objects.filter(id=job_id).update(**kwargs)
+
+
+def publish(job_ids):
+    now = datetime.datetime.now()
+    RecordingJob.objects.filter(id__in=job_ids).update(status=PUBLISHED, update_time=now, finish_time=now,
+                                                       last_error=None)
+
+
+def start(job):
+    """开始一次处理，处理次数加1"""
+    job.attempts += 1
+    update(job.id, attempts=job.attempts)
+
+
+def fail(job_id, error):
+    """记录处理失败的原因，已发布的任务不再记录"""
+    RecordingJob.objects.filter(id=job_id).exclude(status=PUBLISHED). \
+        update(last_error=str(error), update_time=datetime.datetime.now())
+
+
+def is_exhausted(job):
+    """处理次数达到RECORDING_JOB_MAX_ATTEMPTS的任务不再自动重试"""
+    return job.attempts >= settings.RECORDING_JOB_MAX_ATTEMPTS
+
+
+def unfinished_mids():
+    """
+    :return: 仍有未完成且可重试任务的会议id
+    """
+    return set(RecordingJob.objects.exclude(status=PUBLISHED).
+               filter(attempts__lt=settings.RECORDING_JOB_MAX_ATTEMPTS).values_list('mid', flat=True))
+
+
+def finished_mids(mids):
+    """
+    :return: mids中已有任务且所有任务都已发布的会议id
+    """
+    mids = list(mids)
+    tracked = set(RecordingJob.objects.filter(mid__in=mids).values_list('mid', flat=True))
+    unfinished = set(RecordingJob.objects.filter(mid__in=mids).exclude(status=PUBLISHED).
+                     values_list('mid', flat=True))
+    return tracked - unfinished
+
+
+def backlog():
+    """
+    :return: {'status': {状态: 任务数}, 'exhausted': 不再重试的任务数, 'oldest': 最早的未完成任务的创建时间}
+    """
+    unfinished = RecordingJob.objects.exclude(status=PUBLISHED)
+    counts = {STATUS_NAMES[x['status']]: x['count'] for x in
+              RecordingJob.objects.values('status').annotate(count=Count('id')).order_by('status')}
+    return {
+        'status': counts,
+        'exhausted': unfinished.filter(attempts__gte=settings.RECORDING_JOB_MAX_ATTEMPTS).count(),
+        'oldest': unfinished.aggregate(oldest=Min('create_time'))['oldest']
+    }
@@ -0,0 +1,80 @@
+import datetime
+from meetings.models import Meeting
+
+# 会议前后预留的时间
+CONFLICT_BUFFER = datetime.timedelta(minutes=30)
+# 会议的最长时长，用于限定start_at的索引扫描范围
+MAX_DURATION = datetime.timedelta(days=1)
+# 本地时间(Asia/Shanghai)与UTC的时差
+UTC_OFFSET = datetime.timedelta(hours=8)
+
+
+def parse_interval(date, start, end):
+    """
+    将会议日期及起止时间解析为起止时刻，结束时间不晚于开始时间时视为跨天
+    :param date: 会议日期，如2021-01-01
+    :param start: 开始时间，如09:00
+    :param end: 结束时间，如10:00
+    :return: (start_at, end_at)
+    """
+    start_at = datetime.datetime.strptime(' '.join([date, start]), '%Y-%m-%d %H:%M')
+    end_at = datetime.datetime.strptime(' '.join([date, end]), '%Y-%m-%d %H:%M')
+    if end_at <= start_at:
+        end_at += datetime.timedelta(days=1)
+    return start_at, end_at
+
+
+def to_utc(dt):
+    """本地时刻转换为UTC时刻"""
+    return dt - UTC_OFFSET
+
+
+def duration_minutes(start_at, end_at):
+    return int((end_at - start_at).total_seconds() / 60)
+
+
+def get_search_window(start_at, end_at):
+    """冲突检测的时间范围"""
+    return start_at - CONFLICT_BUFFER, end_at + CONFLICT_BUFFER
+
+
+def unfilled_meetings(search_start, search_end):
+    """
+    查询时段内start_at/end_at为空的会议(backfill_meeting_times执行前的历史数据)，起止时刻由日期及起止时间计算
+    :return: [(mid, host_id, start_at, end_at)]，只包含与[search_start, search_end)重叠的会议
+    """
+    meetings = Meeting.objects.filter(is_delete=0, start_at__isnull=True,
+                                      date__gte=(search_start - MAX_DURATION).strftime('%Y-%m-%d'),
+                                      date__lte=search_end.strftime('%Y-%m-%d'))
+    result = []
+    for mid, host_id, date, start, end in meetings.values_list('mid', 'host_id', 'date', 'start', 'end'):
+        try:
+            start_at, end_at = parse_interval(date, start, end)
+        except ValueError:
+            continue
+        if start_at < search_end and end_at > search_start:
+            result.append((mid, host_id, start_at, end_at))
+    return result
+
+
+def busy_hosts(start_at, end_at, host_id=None, exclude_mid=None):
+    """
+    查询[start_at-30m, end_at+30m]内已被占用的host
+    :param start_at: 会议开始时刻
+    :param end_at: 会议结束时刻
+    :param host_id: 只查询指定的host
+    :param exclude_mid: 排除的会议ID，修改会议时排除会议自身
+    :return: 被占用的host_id集合
+    """
+    search_start, search_end = get_search_window(start_at, end_at)
+    meetings = Meeting.objects.filter(is_delete=0, start_at__gt=search_start - MAX_DURATION,
+                                      start_at__lt=search_end, end_at__gt=search_start)
+    if host_id:
+        meetings = meetings.filter(host_id=host_id)
+    if exclude_mid:
+        meetings = meetings.exclude(mid=exclude_mid)
+    hosts = set(meetings.values_list('host_id', flat=True))
+    for mid, busy_host_id, _, _ in unfilled_meetings(search_start, search_end):
+        if mid != exclude_mid and (not host_id or busy_host_id == host_id):
+            hosts.add(busy_host_id)
+    return hosts
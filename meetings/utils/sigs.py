@@ -0,0 +1,106 @@
+import ast
+import logging
+import os
+import threading
+import yaml
+from django.db import transaction
+from meetings.models import Group, GroupMember
+
+logger = logging.getLogger('log')
+
+SIGS_PATH = 'share/openGauss_sigs.yaml'
+
+
+class SigMembershipIndex(object):
+    """
+    sig组成员索引：gitee_id -> 所在的sig组列表
+    由sync_sigs写入的SIGS_PATH构建，文件修改时间变化后重新加载
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.sigs = {}
+
+    def ensure_fresh(self):
+        try:
+            mtime = os.stat(SIGS_PATH).st_mtime
+        except OSError as e:
+            logger.error('failed to stat {}: {}'.format(SIGS_PATH, e))
+            return
+        if mtime == self.mtime:
+            return
+        with self.lock:
+            if mtime == self.mtime:
+                return
+            try:
+                with open(SIGS_PATH, 'r') as f:
+                    content = yaml.safe_load(f)
+            except (OSError, yaml.YAMLError) as e:
+                logger.error('failed to load {}, keep the last index: {}'.format(SIGS_PATH, e))
+                return
+            sigs = {}
+            for sig in content:
+                for gitee_id in sig['sponsors']:
+                    self_sigs = sigs.setdefault(gitee_id, [])
+                    if sig['name'] not in self_sigs:
+                        self_sigs.append(sig['name'])
+            self.sigs = sigs
+            self.mtime = mtime
+            logger.info('sig membership index loaded: {} sigs, {} members'.format(len(content), len(sigs)))
+
+    def get_sigs(self, gitee_id):
+        """
+        :return: 用户所在的sig组名称列表
+        """
+        self.ensure_fresh()
+        return list(self.sigs.get(gitee_id, []))
+
+
+sig_membership = SigMembershipIndex()
+
+
+def is_member(gitee_id, group_id):
+    """
+    GroupMember表中还没有该sig组的成员时（尚未执行migrate_group_members或sync_sigs），使用Group.members中的成员
+    """
+    members = set(GroupMember.objects.filter(group_id=group_id).values_list('gitee_id', flat=True))
+    if members:
+        return gitee_id in members
+    legacy_members = Group.objects.filter(id=group_id).values_list('members', flat=True).first()
+    try:
+        return gitee_id in (ast.literal_eval(legacy_members) if legacy_members else [])
+    except (ValueError, SyntaxError):
+        logger.error('sig {}: invalid members {}'.format(group_id, legacy_members))
+        return False
+
+
+def set_group_members(members, prune=False):
+    """
+    在一个事务中将各sig组的成员更新为给定的成员
+    :param members: {group_id: 成员列表}
+    :param prune: members包含全部sig组时为True，同时删除不在其中的sig组的成员
+    :return: {group_id: (新增的成员集合, 移除的成员集合)}，只包含有变化的sig组
+    """
+    changes = {}
+    with transaction.atomic():
+        queryset = GroupMember.objects.all()
+        if not prune:
+            queryset = queryset.filter(group_id__in=list(members.keys()))
+        existing = {}
+        for group_id, gitee_id in queryset.values_list('group_id', 'gitee_id'):
+            existing.setdefault(group_id, set()).add(gitee_id)
+        targets = dict(members)
+        # 已从sigs.yaml中移除的sig组不再有成员
+        targets.update((group_id, []) for group_id in existing.keys() if group_id not in members)
+        new_members = []
+        for group_id, group_members in targets.items():
+            added = set(group_members) - existing.get(group_id, set())
+            removed = existing.get(group_id, set()) - set(group_members)
+            if removed:
+                GroupMember.objects.filter(group_id=group_id, gitee_id__in=removed).delete()
+            new_members.extend(GroupMember(group_id=group_id, gitee_id=x) for x in added)
+            if added or removed:
+                changes[group_id] = (added, removed)
+        GroupMember.objects.bulk_create(new_members)
+    return changes
@@ -1,22 +1,29 @@
 import datetime
 import logging
 import json
-import os
-import requests
-import subprocess
+import threading
 import time
 from django.conf import settings
 from meetings.models import Meeting
+from meetings.utils import downloader, http_client
+from meetings.utils.schedule import duration_minutes, parse_interval, to_utc
 
 logger = logging.getLogger('log')
 
+_proxy_tokens = {}
+_proxy_token_locks = {}
+_proxy_token_locks_lock = threading.Lock()
 
-def createProxyToken(host_id):
-    """获取代理鉴权token"""
+
+def requestProxyToken(host_id):
+    """
+    使用账号密码登录获取代理鉴权token
+    :return: (token, 有效期秒数)，失败时返回(None, 0)
+    """
     host_dict = settings.WELINK_HOSTS
     if host_id not in host_dict.keys():
         logger.error('host_id {} is invalid'.format(host_id))
-        return None
+        return None, 0
     account = host_dict[host_id]['account']
     pwd = host_dict[host_id]['pwd']
     url = 'https://api.meeting.huaweicloud.com/v1/usg/acs/auth/proxy'
@@ -30,19 +37,38 @@ def createProxyToken(host_id):
         'account': account,
         'pwd': pwd
     }
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = http_client.post(url, headers=headers, data=json.dumps(payload))
     if response.status_code != 200:
         logger.error('Fail to get proxy token, status_code: {}'.format(response.status_code))
-        return None
-    return response.json()['accessToken']
+        return None, 0
+    valid_period = response.json().get('validPeriod') or settings.WELINK_TOKEN_TTL
+    return response.json()['accessToken'], int(valid_period)
+
+
+def createProxyToken(host_id):
+    """获取代理鉴权token，按host_id缓存至过期前WELINK_TOKEN_REFRESH_MARGIN秒，同一host并发获取时只登录一次"""
+    token, refresh_time = _proxy_tokens.get(host_id, (None, 0))
+    if token and time.time() < refresh_time:
+        return token
+    with _proxy_token_locks_lock:
+        lock = _proxy_token_locks.setdefault(host_id, threading.Lock())
+    with lock:
+        token, refresh_time = _proxy_tokens.get(host_id, (None, 0))
+        if token and time.time() < refresh_time:
+            return token
+        token, valid_period = requestProxyToken(host_id)
+        if token:
+            refresh_time = time.time() + max(valid_period - settings.WELINK_TOKEN_REFRESH_MARGIN, 0)
+            _proxy_tokens[host_id] = (token, refresh_time)
+            logger.info('Get proxy token of host {}, valid for {}s'.format(host_id, valid_period))
+        return token
 
 
-def createMeeting(date, start, end, topic, host, record):
+def createMeeting(start_at, end_at, topic, host, record):
     """预定会议"""
     access_token = createProxyToken(host)
-    startTime = (datetime.datetime.strptime(date + start, '%Y-%m-%d%H:%M') - datetime.timedelta(hours=8)).strftime(
-        '%Y-%m-%d %H:%M')
-    length = int((datetime.datetime.strptime(end, '%H:%M') - datetime.datetime.strptime(start, '%H:%M')).seconds / 60)
+    startTime = to_utc(start_at).strftime('%Y-%m-%d %H:%M')
+    length = duration_minutes(start_at, end_at)
     url = 'https://api.meeting.huaweicloud.com/v1/mmc/management/conferences'
     headers = {
         'Content-Type': 'application/json',
@@ -63,7 +89,7 @@ def createMeeting(date, start, end, topic, host, record):
     if record == 'cloud':
         data['isAutoRecord'] = 1
         data['recordType'] = 2
-    response = requests.post(url, headers=headers, data=json.dumps(data))
+    response = http_client.post(url, headers=headers, data=json.dumps(data))
     resp_dict = {}
     if response.status_code != 200:
         logger.error('Fail to create meeting, status_code is {}'.format(response.status_code))
@@ -75,12 +101,11 @@ def createMeeting(date, start, end, topic, host, record):
     return response.status_code, resp_dict
 
 
-def updateMeeting(mid, date, start, end, topic, record):
+def updateMeeting(mid, start_at, end_at, topic, record):
     host = Meeting.objects.get(mid=mid).host_id
     access_token = createProxyToken(host)
-    startTime = (datetime.datetime.strptime(date + start, '%Y-%m-%d%H:%M') - datetime.timedelta(hours=8)).strftime(
-        '%Y-%m-%d %H:%M')
-    length = int((datetime.datetime.strptime(end, '%H:%M') - datetime.datetime.strptime(start, '%H:%M')).seconds / 60)
+    startTime = to_utc(start_at).strftime('%Y-%m-%d %H:%M')
+    length = duration_minutes(start_at, end_at)
     url = 'https://api.meeting.huaweicloud.com/v1/mmc/management/conferences'
     headers = {
         'Content-Type': 'application/json',
@@ -102,7 +127,7 @@ def updateMeeting(mid, date, start, end, topic, record):
     if record == 'cloud':
         data['isAutoRecord'] = 1
         data['recordType'] = 2
-    response = requests.put(url, params=params, headers=headers, data=json.dumps(data))
+    response = http_client.put(url, params=params, headers=headers, data=json.dumps(data))
     return response.status_code
 
 
@@ -117,7 +142,7 @@ def cancelMeeting(mid, host_id):
         'conferenceID': mid,
         'type': 1
     }
-    response = requests.delete(url, headers=headers, params=params)
+    response = http_client.delete(url, headers=headers, params=params)
     print(response.status_code)
     if response.status_code != 200:
         logger.error('Fail to cancel meeting {}'.format(mid))
@@ -127,31 +152,51 @@ def cancelMeeting(mid, host_id):
     return response.status_code
 
 
-def listHisMeetings(host_id):
-    """获取历史会议列表"""
+def getAllPages(url, headers, params, limit):
+    """
+    按offset依次读取所有分页
+    :return: status_code, {'count': 总数, 'data': 所有分页的数据}，失败时返回接口的响应
+    """
+    data = []
+    offset = 0
+    while True:
+        response = http_client.get(url, headers=headers, params=dict(params, offset=offset, limit=limit))
+        if response.status_code != 200:
+            return response.status_code, response.json()
+        page = response.json()
+        data.extend(page.get('data') or [])
+        offset += limit
+        if not page.get('data') or offset >= page.get('count', 0):
+            return response.status_code, {'count': len(data), 'data': data}
+
+
+def listHisMeetings(host_id, days=1):
+    """获取最近days天的历史会议列表"""
     access_token = createProxyToken(host_id)
     tn = int(time.time())
     endDate = tn * 1000
-    startDate = (tn - 3600 * 24) * 1000
+    startDate = (tn - 3600 * 24 * days) * 1000
     url = 'https://api.meeting.huaweicloud.com/v1/mmc/management/conferences/history'
     headers = {
         'X-Access-Token': access_token
     }
     params = {
         'startDate': startDate,
-        'endDate': endDate,
-        'limit': 500
+        'endDate': endDate
     }
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code != 200:
+    status, res = getAllPages(url, headers, params, 500)
+    if status != 200:
         logger.error('Fail to get history meetings list')
-        logger.error(response.json())
+        logger.error(res)
         return {}
-    return response.json()
+    return res
 
 
-def getParticipants(mid):
-    """获取会议参会者"""
+def getParticipants(mid, conf_uuids=None):
+    """
+    获取会议参会者
+    :param conf_uuids: 会议的confUUID列表，未指定时从历史会议列表中查询
+    """
     meeting = Meeting.objects.get(mid=mid)
     host_id = meeting.host_id
     access_token = createProxyToken(host_id)
@@ -159,49 +204,42 @@ def getParticipants(mid):
         'X-Access-Token': access_token
     }
     url = 'https://api.meeting.huaweicloud.com/v1/mmc/management/conferences/history/confAttendeeRecord'
-    meetings_lst = listHisMeetings(host_id)
-    meetings_data = meetings_lst.get('data')
+    if conf_uuids is None:
+        # 历史会议的查询范围需覆盖会议开始的时间
+        start_at = meeting.start_at or parse_interval(meeting.date, meeting.start, meeting.end)[0]
+        days = max((datetime.datetime.now() - start_at).days + 1, 1)
+        meetings_data = listHisMeetings(host_id, days).get('data') or []
+        conf_uuids = [item['confUUID'] for item in meetings_data if item['conferenceID'] == str(mid)]
     participants = {
         'total_records': 0,
         'participants': []
     }
     status = 200
-    for item in meetings_data:
-        if item['conferenceID'] == str(mid):
-            conf_uuid = item['confUUID']
-            params = {
-                'confUUID': conf_uuid,
-                'limit': 500
-            }
-            response = requests.get(url, headers=headers, params=params)
-            if response.status_code == 200:
-                participants['total_records'] += response.json()['count']
-                for participant_info in response.json()['data']:
-                    participants['participants'].append(participant_info)
-            else:
-                status = response.status_code
-                participants = response.json()
-                break
+    for conf_uuid in conf_uuids:
+        status, res = getAllPages(url, headers, {'confUUID': conf_uuid}, 500)
+        if status != 200:
+            participants = res
+            break
+        participants['total_records'] += res['count']
+        participants['participants'].extend(res['data'])
     return status, participants
 
 
-def listRecordings(host_id):
-    """获取录像列表"""
+def listRecordings(host_id, days=1):
+    """获取最近days天的录像列表"""
     access_token = createProxyToken(host_id)
     tn = int(time.time())
     endDate = tn * 1000
-    startDate = (tn - 3600 * 24) * 1000
+    startDate = (tn - 3600 * 24 * days) * 1000
     url = 'https://api.meeting.huaweicloud.com/v1/mmc/management/record/files'
     headers = {
         'X-Access-Token': access_token
     }
     params = {
         'startDate': startDate,
-        'endDate': endDate,
-        'limit': 100
+        'endDate': endDate
     }
-    response = requests.get(url, headers=headers, params=params)
-    return response.status_code, response.json()
+    return getAllPages(url, headers, params, 100)
 
 
 def getDetailDownloadUrl(confUUID, host_id):
@@ -214,13 +252,10 @@ def getDetailDownloadUrl(confUUID, host_id):
     params = {
         'confUUID': confUUID
     }
-    response = requests.get(url, headers=headers, params=params)
+    response = http_client.get(url, headers=headers, params=params)
     return response.status_code, response.json()
 
 
 def downloadHWCloudRecording(token, target_filename, download_url):
     """下载云录制的视频"""
-    if os.path.exists(target_filename):
-        os.remove(target_filename)
-    cmd = 'wget --header="Authorization: {}" -O {} {}'.format(token, target_filename, download_url)
-    subprocess.call(cmd.split())
+    return downloader.download(download_url, target_filename, headers={'Authorization': token})
@@ -1,26 +1,27 @@
-import datetime
 import logging
 import json
 import random
-import requests
+import threading
+import time
 from django.conf import settings
+from django.core.cache import cache
 from obs import ObsClient
+from meetings.utils import http_client
+from meetings.utils.schedule import duration_minutes, to_utc
 
 logger = logging.getLogger('log')
 
+ZOOM_TOKEN_CACHE_KEY = 'zoom:access_token'
+_token_lock = threading.Lock()
+_token_cache = {'token': '', 'refresh_time': 0, 'expire_time': 0}
 
-def createMeeting(date, start, end, topic, host, record):
-    start_time = (datetime.datetime.strptime(date + start, '%Y-%m-%d%H:%M') - datetime.timedelta(hours=8)).strftime(
-        '%Y-%m-%dT%H:%M:%SZ')
-    end_time = (datetime.datetime.strptime(date + end, '%Y-%m-%d%H:%M') - datetime.timedelta(hours=8)).strftime(
-        '%Y-%m-%dT%H:%M:%SZ')
-    duration = int((datetime.datetime.strptime(end_time, '%Y-%m-%dT%H:%M:%SZ') -
-                    datetime.datetime.strptime(start_time, '%Y-%m-%dT%H:%M:%SZ')).seconds / 60)
+
+def createMeeting(start_at, end_at, topic, host, record):
+    start_time = to_utc(start_at).strftime('%Y-%m-%dT%H:%M:%SZ')
+    duration = duration_minutes(start_at, end_at)
     password = str(random.randint(100000, 999999))
-    token = getOauthToken()
     headers = {
-        "content-type": "application/json",
-        "authorization": "Bearer {}".format(token)
+        "content-type": "application/json"
     }
     payload = {
         'start_time': start_time,
@@ -35,7 +36,7 @@ def createMeeting(date, start, end, topic, host, record):
         }
     }
     url = "https://api.zoom.us/v2/users/{}/meetings".format(host)
-    response = requests.post(url, data=json.dumps(payload), headers=headers)
+    response = sendRequest('POST', url, data=json.dumps(payload), headers=headers)
     resp_dict = {}
     if response.status_code != 201:
         return response.status_code, resp_dict
@@ -46,61 +47,73 @@ def createMeeting(date, start, end, topic, host, record):
     return response.status_code, resp_dict
 
 
-def updateMeeting(mid, date, start, end, topic, record):
-    # start_time拼接
-    if int(start.split(':')[0]) >= 8:
-        start_time = date + 'T' + ':'.join([str(int(start.split(':')[0]) - 8), start.split(':')[1], '00Z'])
-    else:
-        d = datetime.datetime.strptime(date, '%Y-%m-%d') - datetime.timedelta(days=1)
-        d2 = datetime.datetime.strftime(d, '%Y-%m-%d %H%M%S')[:10]
-        start_time = d2 + 'T' + ':'.join([str(int(start.split(':')[0]) + 16), start.split(':')[1], '00Z'])
-    # 计算duration
-    duration = (int(end.split(':')[0]) - int(start.split(':')[0])) * 60 + (
-            int(end.split(':')[1]) - int(start.split(':')[1]))
+def updateMeeting(mid, start_at, end_at, topic, record):
+    start_time = to_utc(start_at).strftime('%Y-%m-%dT%H:%M:%SZ')
+    duration = duration_minutes(start_at, end_at)
 
     # 准备好调用zoom api的data
     new_data = {'settings': {}, 'start_time': start_time, 'duration': duration, 'topic': topic}
     new_data['settings']['waiting_room'] = False
     new_data['settings']['auto_recording'] = record
-    token = getOauthToken()
     headers = {
-        "content-type": "application/json",
-        "authorization": "Bearer {}".format(token)
+        "content-type": "application/json"
     }
     url = "https://api.zoom.us/v2/meetings/{}".format(mid)
     # 发送patch请求，修改会议
-    response = requests.patch(url, data=json.dumps(new_data), headers=headers)
+    response = sendRequest('PATCH', url, data=json.dumps(new_data), headers=headers)
     return response.status_code
 
 
 def cancelMeeting(mid):
     url = "https://api.zoom.us/v2/meetings/{}".format(mid)
-    token = getOauthToken()
-    headers = {
-        "authorization": "Bearer {}".format(token)
-    }
-    response = requests.request("DELETE", url, headers=headers)
+    response = sendRequest('DELETE', url)
     return response.status_code
 
 
 def getParticipants(mid):
-    url = "https://api.zoom.us/v2/past_meetings/{}/participants?page_size=300".format(mid)
-    token = getOauthToken()
-    headers = {
-        "authorization": "Bearer {}".format(token)}
+    """获取会议参会者，依次读取next_page_token指向的分页"""
+    url = "https://api.zoom.us/v2/past_meetings/{}/participants".format(mid)
     logger.info(url)
-    logger.info(headers)
-    r = requests.get(url, headers=headers)
-    if r.status_code == 200:
-        total_records = r.json()['total_records']
-        participants = r.json()['participants']
-        resp = {'total_records': total_records, 'participants': participants}
-        return r.status_code, resp
-    else:
-        return r.status_code, r.json()
-
-
-def getOauthToken():
+    params = {'page_size': 300}
+    participants = []
+    while True:
+        r = sendRequest('GET', url, params=params)
+        if r.status_code != 200:
+            return r.status_code, r.json()
+        participants.extend(r.json()['participants'])
+        next_page_token = r.json().get('next_page_token')
+        if not next_page_token:
+            break
+        params['next_page_token'] = next_page_token
+    resp = {'total_records': len(participants), 'participants': participants}
+    return r.status_code, resp
+
+
+def listRecordings(host_id, start_date):
+    """
+    查询host自start_date起的所有云录制，依次读取next_page_token指向的分页
+    :param host_id: host
+    :param start_date: 开始日期，格式为%Y-%m-%d
+    :return: status_code, 会议录像列表
+    """
+    url = 'https://api.zoom.us/v2/users/{}/recordings'.format(host_id)
+    params = {'from': start_date, 'page_size': 300}
+    meetings = []
+    while True:
+        response = sendRequest('GET', url, params=params)
+        if response.status_code != 200:
+            logger.error('list recordings of {}: {} {}'.format(host_id, response.status_code,
+                                                               response.json().get('message')))
+            return response.status_code, meetings
+        meetings.extend(response.json()['meetings'])
+        next_page_token = response.json().get('next_page_token')
+        if not next_page_token:
+            return response.status_code, meetings
+        params['next_page_token'] = next_page_token
+
+
+def fetchOauthToken():
+    """从OBS对象的元数据中读取zoom token"""
     access_key_id = settings.DEFAULT_CONF.get('ACCESS_KEY_ID_2')
     secret_access_key = settings.DEFAULT_CONF.get('SECRET_ACCESS_KEY_2')
     endpoint = settings.DEFAULT_CONF.get('OBS_ENDPOINT_2')
@@ -118,3 +131,49 @@ def getOauthToken():
             break
     logger.info('Get zoom token successfully')
     return token
+
+
+def getOauthToken(invalid_token=None):
+    """
+    获取zoom token，进程内及Django缓存中缓存ZOOM_TOKEN_TTL秒，到期前ZOOM_TOKEN_REFRESH_MARGIN秒主动刷新
+    :param invalid_token: 被zoom拒绝的token，与缓存中的token相同时强制刷新
+    :return: token
+    """
+    now = time.time()
+    token = _token_cache['token']
+    if token and token != invalid_token and now < _token_cache['refresh_time']:
+        return token
+    with _token_lock:
+        now = time.time()
+        token = _token_cache['token']
+        if token and token != invalid_token and now < _token_cache['refresh_time']:
+            return token
+        refresh_after = settings.ZOOM_TOKEN_TTL - settings.ZOOM_TOKEN_REFRESH_MARGIN
+        shared_token = cache.get(ZOOM_TOKEN_CACHE_KEY)
+        if shared_token and shared_token != token and shared_token != invalid_token:
+            _token_cache.update(token=shared_token, refresh_time=now + refresh_after,
+                                expire_time=now + settings.ZOOM_TOKEN_TTL)
+            return shared_token
+        new_token = fetchOauthToken()
+        if not new_token:
+            # 刷新失败时继续使用未过期的旧token
+            if token and token != invalid_token and now < _token_cache['expire_time']:
+                return token
+            return new_token
+        _token_cache.update(token=new_token, refresh_time=now + refresh_after,
+                            expire_time=now + settings.ZOOM_TOKEN_TTL)
+        cache.set(ZOOM_TOKEN_CACHE_KEY, new_token, refresh_after)
+        return new_token
+
+
+def sendRequest(method, url, **kwargs):
+    """携带zoom token发送请求，返回401时刷新token并重试一次"""
+    headers = dict(kwargs.pop('headers', None) or {})
+    token = getOauthToken()
+    headers['authorization'] = 'Bearer {}'.format(token)
+    response = http_client.request(method, url, headers=headers, **kwargs)
+    if response.status_code == 401:
+        logger.warning('zoom token was rejected, refreshing')
+        headers['authorization'] = 'Bearer {}'.format(getOauthToken(invalid_token=token))
+        response = http_client.request(method, url, headers=headers, **kwargs)
+    return response
@@ -1,28 +1,30 @@
 import datetime
 import json
 import logging
-import math
-import requests
 import secrets
 import time
-import yaml
 from django.conf import settings
 from django.middleware.csrf import get_token
 from django.http import JsonResponse
 from django.shortcuts import redirect
+from django.utils.cache import get_conditional_response
 from rest_framework.filters import SearchFilter
 from rest_framework.generics import GenericAPIView
 from rest_framework.mixins import ListModelMixin, CreateModelMixin, UpdateModelMixin, RetrieveModelMixin, \
     DestroyModelMixin
-from multiprocessing import Process
 from rest_framework.response import Response
-from meetings.send_email import sendmail
-from meetings.models import Meeting, Video, User, Group, Record
+from meetings.models import Meeting, Video, User, Group
 from meetings.serializers import MeetingsSerializer, MeetingUpdateSerializer, MeetingDeleteSerializer, \
     MeetingDetailSerializer, GroupsSerializer, AllMeetingsSerializer
 from meetings.utils import cryptos
 from meetings.permissions import QueryPermission
-from meetings.utils import drivers
+from meetings.utils import drivers, http_client, mail_outbox, participants
+from meetings.utils.host_index import host_index
+from meetings.utils.booking import release_host, reserve_any_host, reserve_host
+from meetings.utils.schedule import get_search_window, parse_interval
+from meetings.utils.sigs import is_member, sig_membership
+from meetings.utils.calendar_builder import build_table_data, get_calendar_snapshot, get_calendar_window, \
+    invalidate_calendar
 
 logger = logging.getLogger('log')
 
@@ -96,12 +98,12 @@ class GiteeBackView(GenericAPIView, ListModelMixin):
         client_id = settings.GITEE_OAUTH_CLIENT_ID
         client_secret = settings.GITEE_OAUTH_CLIENT_SECRET
         redirect_uri = settings.GITEE_OAUTH_REDIRECT
-        r = requests.post(
+        r = http_client.post(
             'https://gitee.com/oauth/token?grant_type=authorization_code&code={}&client_id={}&redirect_uri={}&client_secret={}'.format(
                 code, client_id, redirect_uri, client_secret))
         if r.status_code == 200:
             access_token = r.json()['access_token']
-            r = requests.get('https://gitee.com/api/v5/user?access_token={}'.format(access_token))
+            r = http_client.get('https://gitee.com/api/v5/user?access_token={}'.format(access_token))
             if r.status_code == 200:
                 gid = r.json()['id']
                 gitee_id = r.json()['login']
@@ -132,7 +134,7 @@ class LoginView(GenericAPIView):
         client_id = settings.GITEE_OAUTH_CLIENT_ID
         client_secret = settings.GITEE_OAUTH_CLIENT_SECRET
         redirect_uri = settings.GITEE_OAUTH_REDIRECT
-        r = requests.post(
+        r = http_client.post(
             'https://gitee.com/oauth/token?grant_type=authorization_code&code={}&client_id={}&redirect_uri={}&client_secret={}'.format(
                 code, client_id, redirect_uri, client_secret))
         if r.status_code != 200:
@@ -143,7 +145,7 @@ class LoginView(GenericAPIView):
             resp.status_code = 400
             return resp
         access_token = r.json()['access_token']
-        r = requests.get('https://gitee.com/api/v5/user?access_token={}'.format(access_token))
+        r = http_client.get('https://gitee.com/api/v5/user?access_token={}'.format(access_token))
         gid = r.json()['id']
         gitee_id = r.json()['login']
         name = r.json()['name']
@@ -202,12 +204,7 @@ class UserInfoView(GenericAPIView):
                 return JsonResponse({'code': 400, 'msg': 'The user does not exist'})
             user = User.objects.get(id=user_id)
             gitee_id = user.gitee_id
-            with open('share/openGauss_sigs.yaml', 'r') as f:
-                sigs = yaml.safe_load(f)
-            self_sigs = []
-            for sig in sigs:
-                if gitee_id in sig['sponsors']:
-                    self_sigs.append(sig['name'])
+            self_sigs = sig_membership.get_sigs(gitee_id)
             data = {
                 'user': {
                     'id': user.id,
@@ -261,12 +258,12 @@ class CreateMeetingView(GenericAPIView, CreateModelMixin):
         except Exception:
             logger.error('Invalid group_name')
             return JsonResponse({'code': 400, 'msg': '错误的SIG组名', 'en_msg': 'Invalid SIG name'})
-        if User.objects.get(id=user_id).gitee_id not in Group.objects.get(name=group_name).members:
+        if not is_member(User.objects.get(id=user_id).gitee_id, group_id):
             logger.error('user is not member of {}'.format(group_name))
             return JsonResponse(
                 {'code': 400, 'msg': '用户未在该组', 'en_msg': 'The user is not member of {}'.format(group_name)})
-        start_time = ' '.join([date, start])
-        if start_time < datetime.datetime.now().strftime('%Y-%m-%d %H:%M'):
+        start_at, end_at = parse_interval(date, start, end)
+        if start_at < datetime.datetime.now().replace(second=0, microsecond=0):
             logger.warning('The start time should not be earlier than the current time.')
             return JsonResponse({'code': 1005, 'msg': '请输入正确的开始时间',
                                  'en_msg': 'The start time should not be earlier than the current time'})
@@ -277,40 +274,31 @@ class CreateMeetingView(GenericAPIView, CreateModelMixin):
         if date > (datetime.datetime.today() + datetime.timedelta(days=14)).strftime('%Y-%m-%d'):
             logger.warning('The date is more than 14.')
             return JsonResponse({'code': 1002, 'msg': '预定时间不能超过当前14天', 'en_msg': 'The scheduled time cannot exceed 14'})
-        start_search = datetime.datetime.strftime(
-            (datetime.datetime.strptime(start, '%H:%M') - datetime.timedelta(minutes=30)),
-            '%H:%M')
-        end_search = datetime.datetime.strftime(
-            (datetime.datetime.strptime(end, '%H:%M') + datetime.timedelta(minutes=30)),
-            '%H:%M')
         # 查询待创建的会议与现有的预定会议是否冲突
-        unavailable_host_id = []
-        available_host_id = []
-        meetings = Meeting.objects.filter(is_delete=0, date=date, end__gt=start_search, start__lt=end_search).values()
-        try:
-            for meeting in meetings:
-                host_id = meeting['host_id']
-                unavailable_host_id.append(host_id)
-            logger.info('unavilable_host_id:{}'.format(unavailable_host_id))
-        except KeyError:
-            pass
-        host_list = list(host_dict.keys())
-        logger.info('host_list:{}'.format(host_list))
-        for host_id in host_list:
-            if host_id not in unavailable_host_id:
-                available_host_id.append(host_id)
+        available_host_id = host_index.free_hosts(platform, start_at, end_at)
         logger.info('avilable_host_id:{}'.format(available_host_id))
         if len(available_host_id) == 0:
             logger.warning('暂无可用host')
             return JsonResponse({'code': 1000, 'msg': '时间冲突，请调整时间预定会议', 'en_msg': 'Schedule time conflict'})
-        # 从available_host_id中随机生成一个host_id,并在host_dict中取出
-        host_id = secrets.choice(available_host_id)
+        # 按选择策略从available_host_id中选出一个host_id，预留该host的时段后在host_dict中取出
+        host_id = host_index.select_host(platform, available_host_id)
+        candidates = [host_id] + [x for x in available_host_id if x != host_id]
+        reservation = reserve_any_host(platform, candidates, start_at, end_at)
+        if not reservation:
+            logger.warning('暂无可用host')
+            return JsonResponse({'code': 1000, 'msg': '时间冲突，请调整时间预定会议', 'en_msg': 'Schedule time conflict'})
+        host_id = reservation.host_id
         host = host_dict[host_id]
         logger.info('host_id:{}'.format(host_id))
         logger.info('host:{}'.format(host))
 
-        status, content = drivers.createMeeting(platform, date, start, end, topic, host, record)
+        try:
+            status, content = drivers.createMeeting(platform, start_at, end_at, topic, host, record)
+        except Exception:
+            release_host(reservation)
+            raise
         if status not in [200, 201]:
+            release_host(reservation)
             return JsonResponse({'code': 400, 'msg': 'Bad Request'})
         mid = content['mid']
         start_url = content['start_url']
@@ -328,6 +316,8 @@ class CreateMeetingView(GenericAPIView, CreateModelMixin):
             date=date,
             start=start,
             end=end,
+            start_at=start_at,
+            end_at=end_at,
             etherpad=etherpad,
             emaillist=emaillist,
             timezone=timezone,
@@ -339,6 +329,9 @@ class CreateMeetingView(GenericAPIView, CreateModelMixin):
             group_id=group_id,
             mplatform=platform
         )
+        release_host(reservation)
+        host_index.add(mid, host_id, start_at, end_at)
+        invalidate_calendar()
         logger.info('{} has created a meeting which mid is {}.'.format(data['sponsor'], mid))
         logger.info('meeting info: {},{}-{},{}'.format(date, start, end, topic))
         # 如果开启录制功能，则在Video表中创建一条数据
@@ -367,8 +360,7 @@ class CreateMeetingView(GenericAPIView, CreateModelMixin):
             'summary': summary,
             'sequence': sequence
         }
-        p1 = Process(target=sendmail, args=(m, record))
-        p1.start()
+        mail_outbox.enqueue('invite', m, record)
         Meeting.objects.filter(mid=mid).update(sequence=sequence + 1)
 
         # 返回请求数据
@@ -422,8 +414,8 @@ class UpdateMeetingView(GenericAPIView, UpdateModelMixin, DestroyModelMixin, Ret
         group_id = Group.objects.get(name=group_name).id
 
         # 根据时间判断冲突
-        start_time = ' '.join([date, start])
-        if start_time < datetime.datetime.now().strftime('%Y-%m-%d %H:%M'):
+        start_at, end_at = parse_interval(date, start, end)
+        if start_at < datetime.datetime.now().replace(second=0, microsecond=0):
             logger.warning('The start time should not be earlier than the current time.')
             return JsonResponse({'code': 1005, 'msg': '请输入正确的开始时间',
                                  'en_msg': 'The start time should not be earlier than the current time'})
@@ -431,33 +423,24 @@ class UpdateMeetingView(GenericAPIView, UpdateModelMixin, DestroyModelMixin, Ret
             logger.warning('The end time must be greater than the start time.')
             return JsonResponse(
                 {'code': 1001, 'msg': '请输入正确的结束时间', 'en_msg': 'The end time must be greater than the start time'})
-        start_search = datetime.datetime.strftime(
-            (datetime.datetime.strptime(start, '%H:%M') - datetime.timedelta(minutes=30)),
-            '%H:%M')
-        end_search = datetime.datetime.strftime(
-            (datetime.datetime.strptime(end, '%H:%M') + datetime.timedelta(minutes=30)),
-            '%H:%M')
         # 查询待创建的会议与现有的预定会议是否冲突
         meeting = Meeting.objects.get(mid=mid)
         host_id = meeting.host_id
-        if Meeting.objects.filter(date=date, is_delete=0, host_id=host_id, end__gt=start_search, start__lt=end_search).exclude(mid=mid):
-            logger.info('会议冲突！主持人在{}-{}已经创建了会议'.format(start_search, end_search))
-            return JsonResponse({'code': 400, 'msg': '会议冲突！主持人在{}-{}已经创建了会议'.format(start_search, end_search),
+        reservation = reserve_host(meeting.mplatform, host_id, start_at, end_at, mid=mid)
+        if not reservation:
+            search_start, search_end = [x.strftime('%H:%M') for x in get_search_window(start_at, end_at)]
+            logger.info('会议冲突！主持人在{}-{}已经创建了会议'.format(search_start, search_end))
+            return JsonResponse({'code': 400, 'msg': '会议冲突！主持人在{}-{}已经创建了会议'.format(search_start, search_end),
                                  'en_msg': 'Schedule time conflict'})
-        # start_time拼接
-        if int(start.split(':')[0]) >= 8:
-            start_time = date + 'T' + ':'.join([str(int(start.split(':')[0]) - 8), start.split(':')[1], '00Z'])
-        else:
-            d = datetime.datetime.strptime(date, '%Y-%m-%d') - datetime.timedelta(days=1)
-            d2 = datetime.datetime.strftime(d, '%Y-%m-%d %H%M%S')[:10]
-            start_time = d2 + 'T' + ':'.join([str(int(start.split(':')[0]) + 16), start.split(':')[1], '00Z'])
-        # 计算duration
-        duration = (int(end.split(':')[0]) - int(start.split(':')[0])) * 60 + (
-                int(end.split(':')[1]) - int(start.split(':')[1]))
 
         update_topic = '[Update] ' + topic
-        status = drivers.updateMeeting(mid, date, start, end, update_topic, record)
+        try:
+            status = drivers.updateMeeting(mid, start_at, end_at, update_topic, record)
+        except Exception:
+            release_host(reservation)
+            raise
         if status not in [200, 204]:
+            release_host(reservation)
             return JsonResponse({'code': 400, 'msg': '修改会议失败', 'en_msg': 'Fail to update.'})
 
         # 数据库更新数据
@@ -468,12 +451,17 @@ class UpdateMeetingView(GenericAPIView, UpdateModelMixin, DestroyModelMixin, Ret
             date=date,
             start=start,
             end=end,
+            start_at=start_at,
+            end_at=end_at,
             etherpad=etherpad,
             emaillist=emaillist,
             agenda=summary,
             user_id=user_id,
             group_id=group_id
         )
+        release_host(reservation)
+        host_index.add(mid, host_id, start_at, end_at)
+        invalidate_calendar()
         logger.info('{} has updated a meeting which mid is {}.'.format(sponsor, mid))
         logger.info('meeting info: {},{}-{},{}'.format(date, start, end, topic))
         # 如果开启录制功能，则在Video表中创建一条数据
@@ -506,8 +494,7 @@ class UpdateMeetingView(GenericAPIView, UpdateModelMixin, DestroyModelMixin, Ret
             'summary': summary,
             'sequence': sequence
         }
-        p1 = Process(target=sendmail, args=(m, record))
-        p1.start()
+        mail_outbox.enqueue('invite', m, record)
         Meeting.objects.filter(mid=mid).update(sequence=sequence + 1)
         # 返回请求数据
         access_token = refresh_token(user_id)
@@ -543,9 +530,10 @@ class DeleteMeetingView(GenericAPIView, UpdateModelMixin):
         drivers.cancelMeeting(mid)
         # 数据库软删除数据
         Meeting.objects.filter(mid=mid).update(is_delete=1)
+        host_index.remove(mid)
+        invalidate_calendar()
         user = User.objects.get(id=user_id)
         logger.info('{} has canceled meeting {}'.format(user.gitee_id, mid))
-        from meetings.utils.send_cancel_email import sendmail
         meeting = Meeting.objects.get(mid=mid)
         date = meeting.date
         start = meeting.start
@@ -567,7 +555,7 @@ class DeleteMeetingView(GenericAPIView, UpdateModelMixin):
             'platform': platform,
             'sequence': sequence
         }
-        sendmail(m)
+        mail_outbox.enqueue('cancel', m)
         Meeting.objects.filter(mid=mid).update(sequence=sequence + 1)
         access_token = refresh_token(user_id)
         response = JsonResponse({'code': 204, 'msg': '已删除会议{}'.format(mid), 'en_msg': 'Delete successfully'})
@@ -607,75 +595,23 @@ class MeetingsDataView(GenericAPIView, ListModelMixin):
     search_fields = ['group_name']
 
     def get(self, request, *args, **kwargs):
-        self.queryset = self.queryset.filter(
-            date__gte=(datetime.datetime.now() - datetime.timedelta(days=30)).strftime('%Y-%m-%d'),
-            date__lte=(datetime.datetime.now() + datetime.timedelta(days=14)).strftime('%Y-%m-%d'))
         sig_name = self.request.GET.get('group')
-        if Group.objects.filter(name=sig_name):
+        if not Group.objects.filter(name=sig_name):
+            sig_name = None
+        if not self.request.GET.get('search'):
+            etag, tableData = get_calendar_snapshot(sig_name)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = Response({'tableData': tableData})
+            response['ETag'] = etag
+            return response
+        date_start, date_end = get_calendar_window()
+        self.queryset = self.queryset.filter(date__gte=date_start, date__lte=date_end)
+        if sig_name:
             self.queryset = self.queryset.filter(group_name=sig_name)
-        queryset = self.filter_queryset(self.get_queryset()).values()
-        tableData = []
-        date_list = []
-        for query in queryset:
-            date_list.append(query.get('date'))
-        date_list = sorted(list(set(date_list)))
-        if Group.objects.filter(name=sig_name):
-            for date in date_list:
-                tableData.append(
-                    {
-                        'date': date,
-                        'timeData': [{
-                            'id': meeting.id,
-                            'mid': meeting.mid,
-                            'group_name': meeting.group_name,
-                            'startTime': meeting.start,
-                            'endTime': meeting.end,
-                            'duration': math.ceil(float(meeting.end.replace(':', '.'))) - math.floor(
-                                float(meeting.start.replace(':', '.'))),
-                            'duration_time': meeting.start.split(':')[0] + ':00' + '-' + str(
-                                math.ceil(float(meeting.end.replace(':', '.')))) + ':00',
-                            'name': meeting.topic,
-                            'creator': meeting.sponsor,
-                            'detail': meeting.agenda,
-                            'url': User.objects.get(id=meeting.user_id).avatar,
-                            'join_url': meeting.join_url,
-                            'meeting_id': meeting.mid,
-                            'etherpad': meeting.etherpad,
-                            'record': True if Record.objects.filter(mid=meeting.mid) else False,
-                            'platform': meeting.mplatform,
-                            'video_url': '' if not Record.objects.filter(mid=meeting.mid, platform='bilibili') else
-                            Record.objects.filter(mid=meeting.mid, platform='bilibili').values()[0]['url']
-                        } for meeting in Meeting.objects.filter(is_delete=0, date=date, group_name=sig_name)]
-                    }
-                )
-            return Response({'tableData': tableData})
-        for date in date_list:
-            tableData.append(
-                {
-                    'date': date,
-                    'timeData': [{
-                        'id': meeting.id,
-                        'mid': meeting.mid,
-                        'group_name': meeting.group_name,
-                        'startTime': meeting.start,
-                        'endTime': meeting.end,
-                        'duration': math.ceil(float(meeting.end.replace(':', '.'))) - math.floor(
-                            float(meeting.start.replace(':', '.'))),
-                        'duration_time': meeting.start.split(':')[0] + ':00' + '-' + str(
-                            math.ceil(float(meeting.end.replace(':', '.')))) + ':00',
-                        'name': meeting.topic,
-                        'creator': meeting.sponsor,
-                        'detail': meeting.agenda,
-                        'url': User.objects.get(id=meeting.user_id).avatar,
-                        'join_url': meeting.join_url,
-                        'meeting_id': meeting.mid,
-                        'etherpad': meeting.etherpad,
-                        'record': True if Record.objects.filter(mid=meeting.mid) else False,
-                        'platform': meeting.mplatform,
-                        'video_url': '' if not Record.objects.filter(mid=meeting.mid, platform='bilibili') else
-                        Record.objects.filter(mid=meeting.mid, platform='bilibili').values()[0]['url']
-                    } for meeting in Meeting.objects.filter(is_delete=0, date=date)]
-                })
+        meetings = self.get_queryset()
+        dates = set(self.filter_queryset(meetings).values_list('date', flat=True))
+        tableData = build_table_data(meetings, dates)
         return Response({'tableData': tableData})
 
 
@@ -698,13 +634,14 @@ class AllMeetingsView(GenericAPIView, ListModelMixin):
 
 class ParticipantsView(GenericAPIView, RetrieveModelMixin):
     """
-    List all participants info of a meeting
+    List all participants info of a meeting, ?refresh=1 to bypass the cache
     """
     permission_classes = (QueryPermission,)
 
     def get(self, request, *args, **kwargs):
         mid = kwargs.get('mid')
-        status, res = drivers.getParticipants(mid)
+        refresh = request.GET.get('refresh') in ['1', 'true']
+        status, res = participants.get_participants(mid, refresh)
         if status == 200:
             return JsonResponse(res)
         else:
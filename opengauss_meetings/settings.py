@@ -139,6 +139,15 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': DEFAULT_CONF.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': DEFAULT_CONF.get('CACHE_LOCATION', 'opengauss-meetings'),
+    }
+}
+
+CALENDAR_CACHE_TIMEOUT = int(DEFAULT_CONF.get('CALENDAR_CACHE_TIMEOUT', 300))
+
 OPENGAUSS_MEETING_HOSTS = {
     'zoom': {
         DEFAULT_CONF.get('ZOOM_HOST_FIRST'): DEFAULT_CONF.get('ZOOM_ACCOUNT_FIRST'),
@@ -149,6 +158,14 @@ OPENGAUSS_MEETING_HOSTS = {
     }
 }
 
+# random, least_loaded or round_robin
+HOST_SELECTION_POLICY = DEFAULT_CONF.get('HOST_SELECTION_POLICY', 'random')
+
+HOST_INDEX_MAX_AGE = int(DEFAULT_CONF.get('HOST_INDEX_MAX_AGE', 60))
+
+# 预留的有效期(秒)，应大于调用会议平台预定会议的最长耗时
+HOST_RESERVATION_TTL = int(DEFAULT_CONF.get('HOST_RESERVATION_TTL', 600))
+
 WELINK_HOSTS = {
     DEFAULT_CONF.get('WELINK_HOST_1'): {
         'account': DEFAULT_CONF.get('WELINK_HOST_1_ACCOUNT'),
@@ -156,6 +173,32 @@ WELINK_HOSTS = {
     }
 }
 
+# 对外HTTP请求的连接池、超时(秒)及重试配置
+HTTP_CONNECT_TIMEOUT = float(DEFAULT_CONF.get('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(DEFAULT_CONF.get('HTTP_READ_TIMEOUT', 30))
+HTTP_RETRIES = int(DEFAULT_CONF.get('HTTP_RETRIES', 3))
+HTTP_BACKOFF_FACTOR = float(DEFAULT_CONF.get('HTTP_BACKOFF_FACTOR', 0.5))
+HTTP_POOL_MAXSIZE = int(DEFAULT_CONF.get('HTTP_POOL_MAXSIZE', 10))
+HTTP_SLOW_THRESHOLD = float(DEFAULT_CONF.get('HTTP_SLOW_THRESHOLD', 5))
+
+# 录像传输方式：stream为边下载边分段上传OBS，staged为先下载到本地再上传
+RECORDING_TRANSFER_MODE = DEFAULT_CONF.get('RECORDING_TRANSFER_MODE', 'stream')
+# 流式传输的分段大小(字节)，每个下载线程最多缓存一个分段
+RECORDING_PART_SIZE = int(DEFAULT_CONF.get('RECORDING_PART_SIZE', 1024 * 1024 * 10))
+# 录像下载时每个文件并行下载的分片数及分片大小(字节)
+DOWNLOAD_WORKERS = int(DEFAULT_CONF.get('DOWNLOAD_WORKERS', 4))
+DOWNLOAD_SEGMENT_SIZE = int(DEFAULT_CONF.get('DOWNLOAD_SEGMENT_SIZE', 1024 * 1024 * 8))
+
+# 录像处理任务的最大处理次数，超过后需人工处理
+RECORDING_JOB_MAX_ATTEMPTS = int(DEFAULT_CONF.get('RECORDING_JOB_MAX_ATTEMPTS', 5))
+
+# 会议结束多久(秒)后缓存参会人
+PARTICIPANTS_STABLE_DELAY = int(DEFAULT_CONF.get('PARTICIPANTS_STABLE_DELAY', 3600))
+
+# WeLink代理鉴权token的默认有效期及提前刷新时间(秒)
+WELINK_TOKEN_TTL = int(DEFAULT_CONF.get('WELINK_TOKEN_TTL', 3600))
+WELINK_TOKEN_REFRESH_MARGIN = int(DEFAULT_CONF.get('WELINK_TOKEN_REFRESH_MARGIN', 300))
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -266,11 +309,24 @@ GMAIL_USERNAME = DEFAULT_CONF.get('GMAIL_USERNAME')
 GMAIL_PASSWORD = DEFAULT_CONF.get('GMAIL_PASSWORD')
 SMTP_SERVER_HOST = DEFAULT_CONF.get('SMTP_SERVER_HOST')
 SMTP_SERVER_PORT = 25
+SMTP_TIMEOUT = int(DEFAULT_CONF.get('SMTP_TIMEOUT', 30))
+# 邮件发送队列：每批发送数量、最大发送次数、重试的基础间隔(秒)及发送中断后重新领取的超时(秒)
+MAIL_OUTBOX_BATCH_SIZE = int(DEFAULT_CONF.get('MAIL_OUTBOX_BATCH_SIZE', 50))
+MAIL_OUTBOX_MAX_ATTEMPTS = int(DEFAULT_CONF.get('MAIL_OUTBOX_MAX_ATTEMPTS', 5))
+MAIL_OUTBOX_RETRY_DELAY = int(DEFAULT_CONF.get('MAIL_OUTBOX_RETRY_DELAY', 60))
+MAIL_OUTBOX_CLAIM_TIMEOUT = int(DEFAULT_CONF.get('MAIL_OUTBOX_CLAIM_TIMEOUT', 600))
+# sig组邮件列表映射的刷新间隔(秒)
+MAILLIST_MAPPING_TTL = int(DEFAULT_CONF.get('MAILLIST_MAPPING_TTL', 3600))
+# sig组邮件列表映射的本地副本，由sync_sigs及刷新线程写入，各进程在文件变化后重新加载
+MAILLIST_MAPPING_PATH = DEFAULT_CONF.get('MAILLIST_MAPPING_PATH',
+                                         os.path.join(BASE_DIR, 'data', 'maillist_mapping.yaml'))
 CSRF_COOKIE_AGE = 1800
 CSRF_COOKIE_NAME = 'meeting-csrftoken'
 CSRF_COOKIE_SECURE = True
 CSRF_COOKIE_SAMESITE = 'strict'
 COOKIE_EXPIRE = timedelta(minutes=30)
 ACCESS_TOKEN_NAME = 'meeting-accesstoken'
+ZOOM_TOKEN_TTL = int(DEFAULT_CONF.get('ZOOM_TOKEN_TTL', 1800))
+ZOOM_TOKEN_REFRESH_MARGIN = int(DEFAULT_CONF.get('ZOOM_TOKEN_REFRESH_MARGIN', 300))
 ZOOM_AUTH_URL = DEFAULT_CONF.get('ZOOM_AUTH_URL')
 ZOOM_AUTH_HEADER = DEFAULT_CONF.get('ZOOM_AUTH_HEADER')
\ No newline at end of file